@@ -0,0 +1,8 @@
+"""End-to-end benchmarks for the tool endpoints.
+
+Run from ``fastapi_app/``::
+
+    python -m benchmarks.run --output bench.json
+
+Fixtures are generated into ``benchmarks/.fixtures`` on first use.
+"""
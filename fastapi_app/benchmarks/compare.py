@@ -0,0 +1,61 @@
+"""Compare two benchmark reports.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+
+Prints the p50/p95 latency and throughput change per scenario and
+concurrency level, and exits non-zero when any p95 or throughput figure
+regresses by more than ``--threshold`` percent.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Tuple
+
+
+def _index(report: dict) -> Dict[Tuple[str, int], dict]:
+    return {(result["scenario"], result["concurrency"]): result for result in report["results"]}
+
+
+def _change(before: float, after: float) -> float:
+    if not before:
+        return 0.0
+    return (after - before) / before * 100
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = _index(json.load(f))
+    with open(args.candidate) as f:
+        candidate = _index(json.load(f))
+
+    regressions = 0
+    print(f"{'scenario':<32} {'c':>3} {'p50 ms':>18} {'p95 ms':>18} {'rps':>16}")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key], candidate[key]
+        p50 = _change(before["latency_ms"]["p50"], after["latency_ms"]["p50"])
+        p95 = _change(before["latency_ms"]["p95"], after["latency_ms"]["p95"])
+        rps = _change(before["throughput_rps"], after["throughput_rps"])
+        regressed = p95 > args.threshold or rps < -args.threshold
+        regressions += regressed
+        print(
+            f"{key[0]:<32} {key[1]:>3} "
+            f"{after['latency_ms']['p50']:>9.1f} {p50:>+7.1f}% "
+            f"{after['latency_ms']['p95']:>9.1f} {p95:>+7.1f}% "
+            f"{after['throughput_rps']:>7.2f} {rps:>+7.1f}%"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    for key in sorted(baseline.keys() - candidate.keys()):
+        print(f"{key[0]:<32} {key[1]:>3} missing from candidate")
+
+    print(f"{regressions} regression(s) over {args.threshold:g}%")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""Deterministic fixture corpus for the benchmarks.
+
+Every fixture is generated from a fixed seed, so two runs on the same
+machine benchmark byte-identical inputs.  PDFs are written directly, with no
+PDF library involved.  Images use PIL.  Audio and video use ffmpeg's lavfi
+sources with bit-exact flags; without ffmpeg, WAV is still produced with the
+``wave`` module and the MP3/MP4 fixtures are skipped.
+
+Generated files are reused while their spec is unchanged; ``manifest.json``
+records each fixture's spec, size and SHA-256.
+"""
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import wave
+import zlib
+from array import array
+from typing import Callable, Dict, List, Optional
+
+FIXTURES_VERSION = 1
+SEED = 20240601
+
+FFMPEG = os.getenv("FFMPEG", shutil.which("ffmpeg") or "ffmpeg")
+BITEXACT = ["-fflags", "+bitexact", "-flags:v", "+bitexact", "-flags:a", "+bitexact", "-map_metadata", "-1"]
+
+WORDS = (
+    "invoice amount total tax section clause agreement party tenant landlord payment "
+    "schedule annexure certificate income property registration document signature "
+    "witness district court notice period date number account bank branch address"
+).split()
+
+
+# PDF
+
+def _pdf(objects: List[bytes]) -> bytes:
+    """Serialize numbered objects (1..n, object 1 is the catalog) with an xref table"""
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def _stream(data: bytes, dictionary: bytes = b"", deflate: bool = True) -> bytes:
+    if deflate:
+        data = zlib.compress(data, 6)
+        dictionary += b" /Filter /FlateDecode"
+    return b"<< /Length %d%s >>\nstream\n" % (len(data), dictionary) + data + b"\nendstream"
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _escape_pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def text_pdf(path: str, pages: int, seed: int = SEED) -> None:
+    """Letter-size pages of Helvetica text, one content stream per page"""
+    rng = random.Random(seed)
+    # 1 catalog, 2 page tree, 3 font, then (page, content) pairs
+    objects = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for number in range(pages):
+        lines = [f"Page {number + 1} of {pages}"] + [_paragraph(rng, 12) for _ in range(45)]
+        content = "BT /F1 10 Tf 14 TL 56 740 Td " + " ".join(
+            f"({_escape_pdf_text(line)}) '" for line in lines
+        ) + " ET"
+        page_ref = len(objects) + 1
+        kids.append(b"%d 0 R" % page_ref)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (page_ref + 1)
+        )
+        objects.append(_stream(content.encode("latin-1")))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % pages
+    with open(path, "wb") as f:
+        f.write(_pdf(objects))
+
+
+def _scan_page(rng: random.Random, number: int, width: int = 1275, height: int = 1650) -> bytes:
+    """A grayscale 150 dpi 'scan': dark text on slightly uneven paper, JPEG encoded"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    paper = Image.linear_gradient("L").resize((width, height)).point(lambda v: 235 + v // 24)
+    draw = ImageDraw.Draw(paper)
+    try:
+        font = ImageFont.load_default(size=22)
+    except TypeError:
+        font = ImageFont.load_default()
+    y = 90
+    draw.text((90, y), f"SCANNED DOCUMENT - PAGE {number}", fill=20, font=font)
+    while y < height - 140:
+        y += 34
+        draw.text((90 + rng.randint(0, 6), y), _paragraph(rng, 9), fill=rng.randint(10, 60), font=font)
+    buffer = io.BytesIO()
+    paper.rotate(rng.uniform(-0.6, 0.6), fillcolor=240).save(buffer, "JPEG", quality=75)
+    return buffer.getvalue()
+
+
+def scanned_pdf(path: str, pages: int, seed: int = SEED) -> None:
+    """Image-only pages (no text layer), like the output of a document scanner"""
+    rng = random.Random(seed)
+    objects = [b"", b""]
+    kids = []
+    for number in range(pages):
+        jpeg = _scan_page(rng, number + 1)
+        page_ref = len(objects) + 1
+        kids.append(b"%d 0 R" % page_ref)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>" % (page_ref + 1, page_ref + 2)
+        )
+        objects.append(_stream(
+            jpeg,
+            b" /Type /XObject /Subtype /Image /Width 1275 /Height 1650 /ColorSpace /DeviceGray"
+            b" /BitsPerComponent 8 /Filter /DCTDecode",
+            deflate=False,
+        ))
+        objects.append(_stream(b"q 612 0 0 792 0 0 cm /Im0 Do Q"))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % pages
+    with open(path, "wb") as f:
+        f.write(_pdf(objects))
+
+
+# Images
+
+def _photo(width: int, height: int, seed: int, mode: str = "RGB"):
+    """Smooth gradients plus seeded shapes, so encoders see both flat and busy areas"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    red = Image.linear_gradient("L").resize((width, height))
+    green = Image.radial_gradient("L").resize((width, height))
+    blue = red.transpose(Image.Transpose.ROTATE_180) if hasattr(Image, "Transpose") else red.rotate(180)
+    image = Image.merge("RGB", (red, green, blue))
+    draw = ImageDraw.Draw(image)
+    for _ in range(400):
+        x, y = rng.randrange(width), rng.randrange(height)
+        size = rng.randint(width // 200 + 1, width // 12 + 2)
+        colour = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        if rng.random() < 0.5:
+            draw.ellipse((x, y, x + size, y + size), fill=colour)
+        else:
+            draw.rectangle((x, y, x + size, y + size // 2), outline=colour, width=max(1, size // 20))
+    if mode == "RGBA":
+        alpha = Image.radial_gradient("L").resize((width, height)).point(lambda v: 255 - v)
+        image.putalpha(alpha)
+    return image
+
+
+def jpeg(path: str, width: int, height: int, seed: int = SEED) -> None:
+    _photo(width, height, seed).save(path, "JPEG", quality=92)
+
+
+def png_alpha(path: str, width: int, height: int, seed: int = SEED) -> None:
+    _photo(width, height, seed, mode="RGBA").save(path, "PNG")
+
+
+# Audio / video
+
+def _ffmpeg(args: List[str]) -> None:
+    subprocess.run([FFMPEG, "-nostdin", "-y", "-loglevel", "error"] + args, check=True)
+
+
+def has_ffmpeg() -> bool:
+    return shutil.which(FFMPEG) is not None or os.path.exists(FFMPEG)
+
+
+def _stereo_tone(seconds: int) -> str:
+    # Two tones with a slow tremolo and a silent gap every 20 s (exercises silence-remove)
+    gate = "gte(mod(t,20),1)"
+    return (
+        f"aevalsrc=0.4*sin(2*PI*440*t)*(0.75+0.25*sin(2*PI*0.5*t))*{gate}|"
+        f"0.4*sin(2*PI*554.37*t)*(0.75+0.25*sin(2*PI*0.3*t))*{gate}:s=44100:d={seconds}"
+    )
+
+
+def wav(path: str, seconds: int) -> None:
+    if has_ffmpeg():
+        _ffmpeg(["-f", "lavfi", "-i", _stereo_tone(seconds), "-c:a", "pcm_s16le"] + BITEXACT + [path])
+        return
+    # One second of 440/880 Hz tone repeats seamlessly
+    rate = 44100
+    second = array("h")
+    for i in range(rate):
+        t = i / rate
+        second.append(int(13000 * math.sin(2 * math.pi * 440 * t)))
+        second.append(int(13000 * math.sin(2 * math.pi * 880 * t)))
+    with wave.open(path, "wb") as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        frames = second.tobytes()
+        for _ in range(seconds):
+            out.writeframes(frames)
+
+
+def mp3(path: str, seconds: int) -> None:
+    _ffmpeg(["-f", "lavfi", "-i", _stereo_tone(seconds), "-c:a", "libmp3lame", "-b:a", "192k"] + BITEXACT + [path])
+
+
+def mp4(path: str, seconds: int, size: str = "1280x720") -> None:
+    _ffmpeg([
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=30:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=1000:sample_rate=44100:duration={seconds}",
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-threads", "1",
+        "-c:a", "aac", "-shortest",
+    ] + BITEXACT + [path])
+
+
+# Corpus
+
+class Fixture:
+    def __init__(self, name: str, build: Callable[[str], None], spec: dict, needs_ffmpeg: bool = False):
+        self.name = name
+        self.build = build
+        self.spec = {"version": FIXTURES_VERSION, **spec}
+        self.needs_ffmpeg = needs_ffmpeg
+
+
+def corpus(scale: float = 1.0) -> List[Fixture]:
+    """The fixture set; ``scale`` shrinks page counts and durations for quick runs"""
+    def n(value: int, minimum: int = 1) -> int:
+        return max(minimum, int(value * scale))
+
+    pages, scans, minutes = n(300, 5), n(40, 2), n(180, 10)
+    return [
+        Fixture("document.pdf", lambda p: text_pdf(p, pages), {"kind": "text_pdf", "pages": pages}),
+        Fixture("document_short.pdf", lambda p: text_pdf(p, 20, seed=SEED + 1), {"kind": "text_pdf", "pages": 20}),
+        Fixture("scanned.pdf", lambda p: scanned_pdf(p, scans), {"kind": "scanned_pdf", "pages": scans}),
+        Fixture("scanned_short.pdf", lambda p: scanned_pdf(p, 3, seed=SEED + 1), {"kind": "scanned_pdf", "pages": 3}),
+        Fixture("photo_24mp.jpg", lambda p: jpeg(p, 6000, 4000), {"kind": "jpeg", "size": [6000, 4000]}),
+        Fixture("photo_2mp.jpg", lambda p: jpeg(p, 1920, 1080, seed=SEED + 1), {"kind": "jpeg", "size": [1920, 1080]}),
+        Fixture("photo_small.jpg", lambda p: jpeg(p, 640, 480, seed=SEED + 2), {"kind": "jpeg", "size": [640, 480]}),
+        Fixture("alpha.png", lambda p: png_alpha(p, 2048, 2048), {"kind": "png_rgba", "size": [2048, 2048]}),
+        Fixture("tone.wav", lambda p: wav(p, minutes), {"kind": "wav", "seconds": minutes}),
+        Fixture("tone.mp3", lambda p: mp3(p, minutes), {"kind": "mp3", "seconds": minutes}, needs_ffmpeg=True),
+        Fixture("tone_short.mp3", lambda p: mp3(p, 30), {"kind": "mp3", "seconds": 30}, needs_ffmpeg=True),
+        Fixture("clip.mp4", lambda p: mp4(p, 10), {"kind": "mp4", "seconds": 10, "size": "1280x720"}, needs_ffmpeg=True),
+    ]
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ensure_fixtures(directory: str, scale: float = 1.0, log: Optional[Callable[[str], None]] = None) -> Dict[str, dict]:
+    """Generate missing or stale fixtures and return the manifest"""
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, "manifest.json")
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    ffmpeg = has_ffmpeg()
+    for fixture in corpus(scale):
+        path = os.path.join(directory, fixture.name)
+        entry = manifest.get(fixture.name)
+        if entry and entry.get("spec") == fixture.spec and os.path.exists(path):
+            continue
+        if fixture.needs_ffmpeg and not ffmpeg:
+            manifest.pop(fixture.name, None)
+            if log:
+                log(f"skipping {fixture.name}: ffmpeg not found")
+            continue
+        if log:
+            log(f"generating {fixture.name} {fixture.spec}")
+        fixture.build(path)
+        manifest[fixture.name] = {
+            "path": path,
+            "spec": fixture.spec,
+            "bytes": os.path.getsize(path),
+            "sha256": _sha256(path),
+        }
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
@@ -0,0 +1,287 @@
+"""In-process benchmark driver.
+
+Requests go straight into the ASGI app through ``core.asgi.call_app``: no
+sockets and no HTTP client, so the numbers cover routing, form parsing, the
+executor pools and the tools themselves.  Each scenario's multipart body is
+built once on disk and streamed for every request, just as a real upload
+would be.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from core.asgi import call_app
+from core.cache import CACHE_HEADER
+
+from benchmarks.scenarios import Scenario
+
+PERCENTILES = (50, 90, 95, 99)
+RSS_SAMPLE_SECONDS = float(os.getenv("BENCH_RSS_SAMPLE_SECONDS", "0.05"))
+ERROR_SNIPPET = 300
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run the app's startup and shutdown hooks around the benchmark"""
+    inbox: asyncio.Queue = asyncio.Queue()
+    outbox: asyncio.Queue = asyncio.Queue()
+    scope = {"type": "lifespan", "asgi": {"version": "3.0", "spec_version": "2.0"}}
+    task = asyncio.create_task(app(scope, inbox.get, outbox.put))
+
+    await inbox.put({"type": "lifespan.startup"})
+    message = await outbox.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"Application startup failed: {message.get('message', '')}")
+    try:
+        yield
+    finally:
+        await inbox.put({"type": "lifespan.shutdown"})
+        await outbox.get()
+        await task
+
+
+# Request bodies
+
+def _boundary(scenario: Scenario) -> str:
+    return "bench" + hashlib.sha1(scenario.name.encode()).hexdigest()[:24]
+
+
+def write_multipart(path: str, scenario: Scenario, fixtures_dir: str) -> str:
+    """Write the scenario's form body to ``path`` and return its Content-Type"""
+    boundary = _boundary(scenario)
+    with open(path, "wb") as out:
+        for name, value in scenario.data.items():
+            out.write(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            )
+        for field, fixture in scenario.files:
+            out.write(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{fixture}"\r\n'
+                f"Content-Type: application/octet-stream\r\n\r\n".encode()
+            )
+            with open(os.path.join(fixtures_dir, fixture), "rb") as f:
+                shutil.copyfileobj(f, out, 1024 * 1024)
+            out.write(b"\r\n")
+        out.write(f"--{boundary}--\r\n".encode())
+    return f"multipart/form-data; boundary={boundary}"
+
+
+# Peak memory
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def _process_tree(root: int) -> List[int]:
+    parents: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields resume after ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [root]
+    while pending:
+        pid = pending.pop()
+        tree.append(pid)
+        pending.extend(parents.get(pid, []))
+    return tree
+
+
+class RssSampler:
+    """Tracks the peak resident set of this process plus its pool workers and ffmpeg children.
+
+    Falls back to ``getrusage`` peaks where ``/proc`` is unavailable; those
+    are per-process maxima and miss children that are still running.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.peak_kb = 0
+        self._proc = os.path.isdir("/proc/self")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> int:
+        if not self._proc:
+            usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            return usage + children
+        return sum(_rss_kb(pid) for pid in _process_tree(os.getpid()))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_kb = max(self.peak_kb, self.sample())
+
+    def __enter__(self) -> "RssSampler":
+        self.peak_kb = self.sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="bench-rss", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak_kb = max(self.peak_kb, self.sample())
+
+
+# Statistics
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def summarize(latencies: List[float]) -> dict:
+    ordered = sorted(latencies)
+    summary = {f"p{pct}": round(percentile(ordered, pct) * 1000, 3) for pct in PERCENTILES}
+    summary["min"] = round(ordered[0] * 1000, 3) if ordered else 0.0
+    summary["max"] = round(ordered[-1] * 1000, 3) if ordered else 0.0
+    summary["mean"] = round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0
+    return summary
+
+
+# Driving requests
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> str:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def _remove_output(status: int, headers: List[Tuple[bytes, bytes]], output_path: str) -> None:
+    """Delete what the request left under downloads/ so runs do not fill the disk"""
+    names = []
+    disposition = _header(headers, b"content-disposition")
+    if "filename=" in disposition:
+        names.append(disposition.split("filename=", 1)[1].strip('"; '))
+    if status < 400 and _header(headers, b"content-type").startswith("application/json"):
+        try:
+            with open(output_path) as f:
+                url = json.load(f).get("download_url") or ""
+        except (OSError, ValueError, AttributeError):
+            url = ""
+        if url.startswith("/downloads/"):
+            names.append(url[len("/downloads/"):])
+    for name in names:
+        path = os.path.join("downloads", os.path.basename(name))
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+class Runner:
+    def __init__(self, app, fixtures_dir: str, use_cache: bool = False, work_dir: Optional[str] = None):
+        self.app = app
+        self.fixtures_dir = fixtures_dir
+        self.use_cache = use_cache
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="tool_bench_")
+        self._bodies: Dict[str, Tuple[str, str]] = {}
+
+    def _body(self, scenario: Scenario) -> Tuple[str, str]:
+        if scenario.name not in self._bodies:
+            path = os.path.join(self.work_dir, f"{scenario.name}.body")
+            self._bodies[scenario.name] = (path, write_multipart(path, scenario, self.fixtures_dir))
+        return self._bodies[scenario.name]
+
+    def _headers(self, scenario: Scenario) -> List[Tuple[bytes, bytes]]:
+        body_path, content_type = self._body(scenario)
+        headers = [
+            (b"host", b"benchmark"),
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(os.path.getsize(body_path)).encode()),
+        ]
+        if not self.use_cache:
+            headers.append((CACHE_HEADER.lower().encode(), b"bypass"))
+        return headers
+
+    async def request(self, scenario: Scenario, slot: int) -> Tuple[int, float, int, str]:
+        """One request; returns (status, seconds, response bytes, error snippet)"""
+        body_path, _ = self._body(scenario)
+        output_path = os.path.join(self.work_dir, f"response_{slot}")
+        started = time.perf_counter()
+        status, headers = await call_app(self.app, "POST", scenario.route, self._headers(scenario), body_path, output_path)
+        elapsed = time.perf_counter() - started
+
+        size = os.path.getsize(output_path)
+        error = ""
+        if status >= 400:
+            with open(output_path, "rb") as f:
+                error = f.read(ERROR_SNIPPET).decode("utf-8", "replace")
+        if not self.use_cache:
+            _remove_output(status, headers, output_path)
+        return status, elapsed, size, error
+
+    async def run(self, scenario: Scenario, concurrency: int, requests: int, warmup: int = 1) -> dict:
+        """Send ``requests`` requests with ``concurrency`` in flight and summarize them"""
+        for slot in range(warmup):
+            await self.request(scenario, slot)
+
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+        sizes: List[int] = []
+        errors: List[str] = []
+        remaining = requests
+
+        async def worker(slot: int) -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                status, elapsed, size, error = await self.request(scenario, slot)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status < 400:
+                    latencies.append(elapsed)
+                    sizes.append(size)
+                elif error and len(errors) < 3:
+                    errors.append(error)
+
+        with RssSampler() as rss:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(slot) for slot in range(concurrency)))
+            wall = time.perf_counter() - started
+
+        return {
+            "scenario": scenario.name,
+            "route": scenario.route,
+            "category": scenario.category,
+            "concurrency": concurrency,
+            "requests": requests,
+            "ok": len(latencies),
+            "errors": requests - len(latencies),
+            "status": statuses,
+            "wall_seconds": round(wall, 4),
+            "throughput_rps": round(len(latencies) / wall, 3) if wall > 0 else 0.0,
+            "latency_ms": summarize(latencies),
+            "response_bytes_mean": int(sum(sizes) / len(sizes)) if sizes else 0,
+            "peak_rss_mb": round(rss.peak_kb / 1024, 1),
+            "error_samples": errors,
+        }
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.work_dir, ignore_errors=True)
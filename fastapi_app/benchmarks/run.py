@@ -0,0 +1,140 @@
+"""Run the benchmark suite and write a JSON report.
+
+    cd fastapi_app
+    python -m benchmarks.run --concurrency 1,4,16 --output bench.json
+    python -m benchmarks.run --category image --requests 10 --scale 0.1
+    python -m benchmarks.compare baseline.json bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from typing import List
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FIXTURES = os.path.join(APP_DIR, "benchmarks", ".fixtures")
+
+
+def _log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="End-to-end tool endpoint benchmarks")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="fixture directory (generated on demand)")
+    parser.add_argument("--scale", type=float, default=1.0, help="shrink page counts and durations, e.g. 0.1")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured requests before each measurement")
+    parser.add_argument("--only", help="regex matched against scenario names")
+    parser.add_argument("--category", action="append", help="pdf, image, audio or government (repeatable)")
+    parser.add_argument("--cache", action="store_true", help="let the result cache answer repeated requests")
+    parser.add_argument("--output", default="-", help="JSON report path, '-' for stdout")
+    return parser.parse_args(argv)
+
+
+def select_scenarios(args: argparse.Namespace, manifest: dict):
+    from benchmarks.scenarios import SCENARIOS
+
+    selected = []
+    for scenario in SCENARIOS:
+        if args.only and not re.search(args.only, scenario.name):
+            continue
+        if args.category and scenario.category not in args.category:
+            continue
+        missing = [fixture for fixture in scenario.fixtures if fixture not in manifest]
+        if missing:
+            _log(f"skipping {scenario.name}: missing fixtures {', '.join(missing)}")
+            continue
+        selected.append(scenario.bind(manifest))
+    return selected
+
+
+async def run_suite(args: argparse.Namespace, manifest: dict) -> List[dict]:
+    from benchmarks.harness import Runner, lifespan
+    from main import app
+
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    runner = Runner(app, args.fixtures, use_cache=args.cache)
+    results = []
+    try:
+        async with lifespan(app):
+            for scenario in select_scenarios(args, manifest):
+                for concurrency in levels:
+                    requests = args.requests
+                    if scenario.max_requests is not None:
+                        requests = min(requests, scenario.max_requests)
+                    requests = max(requests, concurrency)
+                    result = await runner.run(scenario, concurrency, requests, warmup=args.warmup)
+                    results.append(result)
+                    latency = result["latency_ms"]
+                    _log(
+                        f"{scenario.name:<32} c={concurrency:<3} ok={result['ok']}/{requests} "
+                        f"p50={latency['p50']:.1f}ms p95={latency['p95']:.1f}ms "
+                        f"rps={result['throughput_rps']:.2f} rss={result['peak_rss_mb']:.0f}MB"
+                    )
+                    for error in result["error_samples"][:1]:
+                        _log(f"    error: {error[:200]}")
+    finally:
+        runner.cleanup()
+    return results
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    args.fixtures = os.path.abspath(args.fixtures)
+    output = args.output if args.output == "-" else os.path.abspath(args.output)
+
+    from benchmarks.fixtures import ensure_fixtures
+
+    manifest = ensure_fixtures(args.fixtures, args.scale, log=_log)
+
+    # The app resolves uploads/ and downloads/ relative to the working directory
+    os.chdir(APP_DIR)
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+
+    started = time.time()
+    results = asyncio.run(run_suite(args, manifest))
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started)),
+            "duration_seconds": round(time.time() - started, 2),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "git_commit": _git_commit(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("fixtures", "output")},
+        },
+        "fixtures": {
+            name: {key: entry[key] for key in ("spec", "bytes", "sha256")} for name, entry in sorted(manifest.items())
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if output == "-":
+        print(text)
+    else:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+        _log(f"wrote {output}")
+    return 1 if any(result["errors"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
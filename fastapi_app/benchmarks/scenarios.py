@@ -0,0 +1,137 @@
+"""Benchmark scenarios: one request shape per tool endpoint.
+
+Heavy endpoints cap their request count with ``max_requests`` so a full run
+stays within minutes; pure-Python per-pixel tools (sepia) get the small
+image.  Form values that depend on a fixture (page ranges of ``document.pdf``,
+whose length follows ``--scale``) are functions of the fixture manifest,
+filled in by ``Scenario.bind``.
+"""
+import json
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+Value = Union[str, Callable[[dict], str]]
+
+
+class Scenario:
+    def __init__(self, name: str, route: str, files: Optional[List[Tuple[str, str]]] = None,
+                 data: Optional[Dict[str, Value]] = None, max_requests: Optional[int] = None):
+        self.name = name
+        self.route = route
+        self.files = files or []
+        self.data = data or {}
+        self.max_requests = max_requests
+
+    @property
+    def category(self) -> str:
+        return self.route.split("/")[2]
+
+    @property
+    def fixtures(self) -> List[str]:
+        return [fixture for _, fixture in self.files]
+
+    def bind(self, manifest: dict) -> "Scenario":
+        """This scenario with its manifest-dependent form values filled in"""
+        data = {key: value(manifest) if callable(value) else value for key, value in self.data.items()}
+        return Scenario(self.name, self.route, self.files, data, self.max_requests)
+
+
+def _file(fixture: str) -> List[Tuple[str, str]]:
+    return [("file", fixture)]
+
+
+def _files(*fixtures: str) -> List[Tuple[str, str]]:
+    return [("files", fixture) for fixture in fixtures]
+
+
+def _page_range(manifest: dict) -> Tuple[int, int]:
+    """A stretch of ``document.pdf`` in from its start: pages 10-60 of the full-size 300"""
+    pages = manifest["document.pdf"]["spec"]["pages"]
+    first = max(1, pages // 30)
+    return first, max(first, pages // 5)
+
+
+def _pages_step(manifest: dict) -> str:
+    first, last = _page_range(manifest)
+    return json.dumps([{"op": "pages", "start_page": first, "end_page": last},
+                       {"op": "rotate", "rotation": 90}, {"op": "compress"}], separators=(",", ":"))
+
+
+SCENARIOS = [
+    # PDF
+    Scenario("pdf_merge", "/api/pdf/merge", _files("document.pdf", "document_short.pdf")),
+    Scenario("pdf_split", "/api/pdf/split", _file("document.pdf"), {
+        "start_page": lambda manifest: str(_page_range(manifest)[0]),
+        "end_page": lambda manifest: str(_page_range(manifest)[1]),
+    }),
+    Scenario("pdf_compress", "/api/pdf/compress", _file("scanned.pdf"), {"quality": "60"}),
+    Scenario("pdf_protect", "/api/pdf/protect", _file("document.pdf"), {"password": "bench"}),
+    Scenario("pdf_ocr", "/api/pdf/ocr", _file("scanned_short.pdf"), max_requests=4),
+    Scenario("pdf_to_images", "/api/pdf/to-images", _file("document_short.pdf"), {"dpi": "100"}, max_requests=8),
+    Scenario("pdf_size_optimizer", "/api/pdf/size-optimizer", _file("document.pdf")),
+    Scenario("pdf_remove_background", "/api/pdf/remove-background", _file("document_short.pdf")),
+
+    # Image
+    Scenario("image_resize_24mp", "/api/image/resize", _file("photo_24mp.jpg"), {"width": "1920", "height": "1280"}),
+    Scenario("image_compress_24mp", "/api/image/compress", _file("photo_24mp.jpg"), {"quality": "70"}),
+    Scenario("image_convert_png_to_webp", "/api/image/convert", _file("alpha.png"), {"output_format": "webp"}),
+    Scenario("image_rotate", "/api/image/rotate", _file("photo_2mp.jpg"), {"angle": "90"}),
+    Scenario("image_smart_crop", "/api/image/smart-crop", _file("photo_24mp.jpg"),
+             {"x": "1000", "y": "1000", "width": "2000", "height": "1500"}),
+    Scenario("image_grayscale", "/api/image/grayscale", _file("photo_24mp.jpg")),
+    Scenario("image_sepia", "/api/image/sepia", _file("photo_small.jpg")),
+    Scenario("image_blur", "/api/image/blur", _file("photo_2mp.jpg"), {"blur_radius": "4"}),
+    Scenario("image_sharpen", "/api/image/sharpen", _file("photo_2mp.jpg")),
+    Scenario("image_photo_frame", "/api/image/photo-frame", _file("alpha.png")),
+    Scenario("image_vintage", "/api/image/vintage", _file("photo_2mp.jpg")),
+    Scenario("image_upscaler", "/api/image/upscaler", _file("photo_small.jpg"), {"scale_factor": "4"}),
+    Scenario("image_noise_reduction", "/api/image/noise-reduction", _file("photo_2mp.jpg")),
+
+    # Audio / video
+    Scenario("audio_convert_wav_to_mp3", "/api/audio/convert", _file("tone.wav"), {"output_format": "mp3"}, max_requests=8),
+    Scenario("audio_trim", "/api/audio/trim", _file("tone.mp3"), {"start_time": "30", "duration": "60"}),
+    Scenario("audio_merge", "/api/audio/merge", _files("tone_short.mp3", "tone_short.mp3"), max_requests=8),
+    Scenario("audio_extract", "/api/audio/extract", _file("clip.mp4"), {"output_format": "mp3"}),
+    Scenario("video_convert", "/api/audio/video-convert", _file("clip.mp4"), {"output_format": "mkv"}, max_requests=4),
+    Scenario("audio_enhance", "/api/audio/enhance", _file("tone_short.mp3")),
+    Scenario("audio_speed_changer", "/api/audio/speed-changer", _file("tone_short.mp3"), {"speed_factor": "1.5"}),
+    Scenario("audio_equalizer", "/api/audio/equalizer", _file("tone_short.mp3"), {"bass": "6", "treble": "-3"}),
+    Scenario("audio_reverb", "/api/audio/reverb", _file("tone_short.mp3")),
+    Scenario("audio_fade", "/api/audio/fade", _file("tone_short.mp3")),
+    Scenario("audio_normalize", "/api/audio/normalize", _file("tone_short.mp3")),
+    Scenario("audio_pitch_shift", "/api/audio/pitch-shift", _file("tone_short.mp3"), {"semitones": "3"}),
+    Scenario("audio_info", "/api/audio/audio-info", _file("tone.mp3")),
+    Scenario("audio_voice_changer", "/api/audio/voice-changer", _file("tone_short.mp3")),
+    Scenario("audio_silence_remove", "/api/audio/silence-remove", _file("tone.mp3"), max_requests=8),
+    Scenario("audio_loop", "/api/audio/loop", _file("tone_short.mp3")),
+    Scenario("audio_stereo_split", "/api/audio/stereo-split", _file("tone_short.mp3")),
+
+    # Pipelines (compare with the sum of the matching single-tool scenarios)
+    Scenario("pipeline_image_web", "/api/pipeline/image", _file("photo_24mp.jpg"), {"steps": (
+        '[{"op":"resize","width":1920,"height":1280},{"op":"sharpen"},'
+        '{"op":"convert","output_format":"webp"},{"op":"compress","quality":80}]'
+    )}),
+    Scenario("pipeline_pdf_extract", "/api/pipeline/pdf", _file("document.pdf"), {"steps": _pages_step}),
+    Scenario("pipeline_audio_chain", "/api/pipeline/audio", _file("tone_short.mp3"), {"steps": (
+        '[{"op":"enhance"},{"op":"equalizer","bass":6,"treble":-3},{"op":"fade","fade_in":1,"fade_out":1}]'
+    )}),
+
+    # Government (no files: measures framework and form parsing overhead)
+    Scenario("gov_pan_validate", "/api/government/pan-validate", data={"pan_number": "ABCDE1234F"}),
+    Scenario("gov_aadhaar_mask", "/api/government/aadhaar-mask", data={"aadhaar_number": "1234 5678 9012"}),
+    Scenario("gov_gst_calculate", "/api/government/gst-calculate", data={"amount": "15000", "gst_rate": "18"}),
+    Scenario("gov_ifsc_lookup", "/api/government/ifsc-lookup", data={"ifsc_code": "SBIN0000001"}),
+    Scenario("gov_emi_calculate", "/api/government/emi-calculate",
+             data={"principal": "2500000", "rate": "8.5", "tenure": "240"}),
+    Scenario("gov_tds_calculate", "/api/government/tds-calculate", data={"salary": "1800000"}),
+    Scenario("gov_property_tax", "/api/government/property-tax-calculate", data={"property_value": "9500000"}),
+    Scenario("gov_professional_tax", "/api/government/professional-tax-calculate", data={"monthly_salary": "60000"}),
+    Scenario("gov_legal_notice", "/api/government/legal-notice-generator",
+             data={"sender_name": "A Sharma", "recipient_name": "B Verma", "issue_description": "Unpaid rent"}),
+    Scenario("gov_affidavit", "/api/government/affidavit-generator",
+             data={"deponent_name": "A Sharma", "father_name": "R Sharma", "address": "Pune", "statement": "Name change"}),
+    Scenario("gov_vehicle_registration", "/api/government/vehicle-registration-check", data={"vehicle_number": "MH12AB1234"}),
+    Scenario("gov_driving_license", "/api/government/driving-license-validator", data={"dl_number": "MH1220110012345"}),
+    Scenario("gov_voter_id", "/api/government/voter-id-validator", data={"voter_id": "ABC1234567"}),
+    Scenario("gov_stamp_duty", "/api/government/stamp-duty-calculator", data={"property_value": "9500000"}),
+    Scenario("gov_court_fee", "/api/government/court-fee-calculator", data={"case_value": "500000"}),
+]
@@ -0,0 +1,26 @@
+"""Access control for operator endpoints.
+
+Operator endpoints (changing admission budgets and the like) require the
+``X-Admin-Token`` header to match ``ADMIN_TOKEN``.  With no ``ADMIN_TOKEN``
+configured they are disabled.
+"""
+import hmac
+import os
+
+from fastapi import HTTPException, Request
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+ADMIN_HEADER = "x-admin-token"
+
+
+def is_admin(request: Request) -> bool:
+    token = request.headers.get(ADMIN_HEADER, "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def require_admin(request: Request) -> None:
+    """Dependency for operator endpoints"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Operator endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
@@ -0,0 +1,266 @@
+"""Cost-aware admission control for tool routes.
+
+Every tool route belongs to a tool class (cheap, moderate or heavy) and has
+a weight within it.  A class has a concurrency budget in weight units: a
+request is admitted once its weight fits next to what is already running,
+otherwise it waits in the class's FIFO queue.  When the queue is full, or a
+request has waited ``max_wait`` seconds, the request is rejected with 429
+and a ``Retry-After`` estimated from recent hold times.
+
+Admission happens before the request body is read, so an overloaded box
+does not spool uploads it cannot process.  Requests replayed by job workers
+and batch items wait without a bound: they have already been accepted.
+
+Budgets start from the environment (``ADMISSION_<CLASS>_BUDGET``,
+``_QUEUE`` and ``_WAIT``), can be changed at runtime through
+``PUT /api/admission/{tool_class}``, and are exported in ``/metrics``.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from core import metrics
+from core.batch import current_batch
+from core.jobs import current_job
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") != "0"
+
+CPUS = os.cpu_count() or 2
+
+CHEAP = "cheap"
+MODERATE = "moderate"
+HEAVY = "heavy"
+
+# Default (budget, queue size, max wait in seconds) per tool class
+DEFAULTS = {
+    CHEAP: (64, 256, 5.0),
+    MODERATE: (2 * CPUS, 64, 30.0),
+    HEAVY: (max(2, CPUS), 32, 60.0),
+}
+
+# (tool class, weight) per route prefix (longest prefix wins)
+ROUTE_COSTS: Dict[str, Tuple[str, int]] = {
+    "/api/government": (CHEAP, 1),
+    "/api/image": (MODERATE, 1),
+    "/api/image/upscaler": (MODERATE, 2),
+    "/api/image/batch-resize": (MODERATE, 2),
+    "/api/image/collage-maker": (MODERATE, 2),
+    "/api/pdf": (MODERATE, 1),
+    "/api/pdf/merge": (MODERATE, 2),
+    "/api/pdf/compress": (HEAVY, 1),
+    "/api/pdf/to-images": (HEAVY, 4),
+    "/api/pdf/ocr": (HEAVY, 4),
+    "/api/audio": (HEAVY, 1),
+    "/api/audio/audio-info": (MODERATE, 1),
+    # libx264 spreads over several cores
+    "/api/audio/video-convert": (HEAVY, 4),
+    "/api/pipeline/image": (MODERATE, 2),
+    "/api/pipeline/pdf": (MODERATE, 2),
+    "/api/pipeline/audio": (HEAVY, 1),
+}
+
+RETRY_AFTER_MAX = 300
+
+
+def cost_for(path: str) -> Tuple[str, int]:
+    best = None
+    for prefix in ROUTE_COSTS:
+        if path == prefix or path.startswith(prefix + "/"):
+            if best is None or len(prefix) > len(best):
+                best = prefix
+    return ROUTE_COSTS[best] if best else (MODERATE, 1)
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ToolClass:
+    """Weighted semaphore with a bounded FIFO wait queue"""
+
+    def __init__(self, name: str, budget: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.budget = budget
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_use = 0
+        # [weight, future] in arrival order
+        self._waiters: deque = deque()
+        self._avg_hold = 1.0
+        self.admitted = 0
+        self.rejected = 0
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.ADMISSION_BUDGET.set(self.name, value=self.budget)
+        metrics.ADMISSION_IN_USE.set(self.name, value=self.in_use)
+        metrics.ADMISSION_QUEUED.set(self.name, value=len(self._waiters))
+
+    def _grant(self, weight: int) -> int:
+        # A weight above the budget would never fit; it gets the whole budget instead
+        granted = min(weight, self.budget)
+        self.in_use += granted
+        self.admitted += 1
+        return granted
+
+    def _wake(self) -> None:
+        # Strict FIFO: a heavy request at the head is not overtaken by lighter ones
+        while self._waiters:
+            weight, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.in_use + min(weight, self.budget) > self.budget:
+                break
+            self._waiters.popleft()
+            future.set_result(self._grant(weight))
+        self._publish()
+
+    def retry_after(self) -> int:
+        queued = sum(min(weight, self.budget) for weight, _ in self._waiters)
+        estimate = self._avg_hold * (1 + queued / max(1, self.budget))
+        return max(1, min(RETRY_AFTER_MAX, math.ceil(estimate)))
+
+    def _reject(self, reason: str) -> Rejected:
+        self.rejected += 1
+        metrics.ADMISSION_REJECTED.inc(self.name, reason)
+        return Rejected(reason, self.retry_after())
+
+    async def acquire(self, weight: int, bounded: bool = True) -> int:
+        """Wait for ``weight`` units; returns the units to hand back to ``release``"""
+        if not self._waiters and self.in_use + min(weight, self.budget) <= self.budget:
+            metrics.ADMISSION_WAIT.observe(self.name, value=0.0)
+            granted = self._grant(weight)
+            self._publish()
+            return granted
+        if bounded and len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [weight, future]
+        self._waiters.append(entry)
+        self._publish()
+        started = time.monotonic()
+        try:
+            await asyncio.wait({future}, timeout=self.max_wait if bounded else None)
+        except asyncio.CancelledError:
+            # Client went away while queued, or just after being granted
+            if future.done():
+                self.release(future.result(), 0.0)
+            else:
+                self._abandon(entry)
+            raise
+        metrics.ADMISSION_WAIT.observe(self.name, value=time.monotonic() - started)
+        if not future.done():
+            self._abandon(entry)
+            raise self._reject("timeout")
+        return future.result()
+
+    def _abandon(self, entry: list) -> None:
+        entry[1].cancel()
+        self._waiters.remove(entry)
+        # The head may have been the one blocking smaller requests behind it
+        self._wake()
+
+    def release(self, granted: int, held: float) -> None:
+        self.in_use -= granted
+        if held > 0:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+        self._wake()
+
+    def configure(self, budget: Optional[int] = None, max_queue: Optional[int] = None,
+                  max_wait: Optional[float] = None) -> None:
+        if budget is not None:
+            if budget < 1:
+                raise ValueError("budget must be at least 1")
+            self.budget = budget
+        if max_queue is not None:
+            if max_queue < 0:
+                raise ValueError("max_queue cannot be negative")
+            self.max_queue = max_queue
+        if max_wait is not None:
+            if max_wait < 0:
+                raise ValueError("max_wait cannot be negative")
+            self.max_wait = max_wait
+        # A larger budget may admit queued requests straight away
+        self._wake()
+
+    def stats(self) -> dict:
+        return {
+            "budget": self.budget,
+            "in_use": self.in_use,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "max_wait": self.max_wait,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_hold_seconds": round(self._avg_hold, 3),
+        }
+
+
+def _from_env(name: str) -> ToolClass:
+    budget, max_queue, max_wait = DEFAULTS[name]
+    prefix = f"ADMISSION_{name.upper()}"
+    return ToolClass(
+        name,
+        int(os.getenv(f"{prefix}_BUDGET", str(budget))),
+        int(os.getenv(f"{prefix}_QUEUE", str(max_queue))),
+        float(os.getenv(f"{prefix}_WAIT", str(max_wait))),
+    )
+
+
+tool_classes: Dict[str, ToolClass] = {name: _from_env(name) for name in DEFAULTS}
+
+
+def stats() -> dict:
+    return {"enabled": ADMISSION_ENABLED, "classes": {name: c.stats() for name, c in tool_classes.items()}}
+
+
+class AdmissionMiddleware:
+    """Hold a tool class slot for the whole request, response body included"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not ADMISSION_ENABLED
+            or scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(metrics.TOOL_PREFIXES)
+        ):
+            return await self.app(scope, receive, send)
+
+        name, weight = cost_for(scope["path"])
+        tool_class = tool_classes[name]
+        try:
+            granted = await tool_class.acquire(weight, bounded=current_job() is None and current_batch() is None)
+        except Rejected as e:
+            return await self._reject(send, tool_class, e)
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            tool_class.release(granted, time.monotonic() - started)
+
+    @staticmethod
+    async def _reject(send, tool_class: ToolClass, rejection: Rejected):
+        reason = "queue is full" if rejection.reason == "queue_full" else "no capacity within the wait limit"
+        body = ('{"detail":"Server busy: %s tool %s. Retry later."}' % (tool_class.name, reason)).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(rejection.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
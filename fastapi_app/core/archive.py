@@ -0,0 +1,195 @@
+"""Streaming ZIP assembly for tools with several outputs.
+
+``ArchiveWriter`` writes a ZIP to a path or to any writable stream: the
+response pipe behind ``STREAM_OUTPUT``, or an ``ArchiveStream`` feeding a
+response body from the event loop (see ``stream_archive``).  Outputs are
+encoded straight into their entries, with no temp file per output and no
+buffered archive::
+
+    with ArchiveWriter(output) as archive:
+        for i, image in enumerate(images):
+            with archive.open(f"page_{i + 1}.png") as entry:
+                image.save(entry, "PNG")
+
+On a stream that cannot seek, entries are followed by data descriptors
+instead of having their headers rewritten.  Formats that are already
+compressed (PNG, JPEG, MP3, ...) are stored; text and everything else is
+deflated.
+"""
+import asyncio
+import shutil
+import time
+import zipfile
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, List, Optional, Union
+
+CHUNK_SIZE = 1024 * 1024
+
+STORED_EXTENSIONS = {
+    "png", "jpg", "jpeg", "webp", "gif", "mp3", "m4a", "aac", "ogg", "opus", "flac",
+    "mp4", "mov", "mkv", "webm", "zip", "gz", "pdf",
+}
+
+# Archive bytes an ArchiveStream buffers for a slow reader before writers block
+STREAM_CHUNK_SIZE = 256 * 1024
+STREAM_BUFFER_CHUNKS = 16
+
+
+def compression_for(name: str) -> int:
+    extension = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    return zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def unique_names(names: List[str]) -> List[str]:
+    """Entry names for ``names``, with a counter added to repeats (``a.png``, ``a_2.png``)"""
+    seen = set()
+    unique = []
+    for name in names:
+        stem, dot, extension = name.rpartition(".") if "." in name else (name, "", "")
+        candidate, count = name, 1
+        while candidate in seen:
+            count += 1
+            candidate = f"{stem}_{count}{dot}{extension}"
+        seen.add(candidate)
+        unique.append(candidate)
+    return unique
+
+
+class _WriteOnly:
+    """Hides ``tell``/``seek`` so zipfile streams instead of seeking back"""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def write(self, data) -> int:
+        return self._raw.write(data)
+
+    def flush(self) -> None:
+        self._raw.flush()
+
+
+class ArchiveWriter:
+    def __init__(self, output: Union[str, BinaryIO]):
+        self._file = None
+        if isinstance(output, str):
+            output = self._file = open(output, "wb")
+        elif not (hasattr(output, "seekable") and output.seekable()):
+            output = _WriteOnly(output)
+        self._zip = zipfile.ZipFile(output, "w")
+        self.names = []
+
+    def _info(self, name: str) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = compression_for(name)
+        self.names.append(name)
+        return info
+
+    def open(self, name: str):
+        """Writable file object for a new entry; close it before opening the next"""
+        # The size is not known up front, so allow entries over 2 GiB
+        return self._zip.open(self._info(name), "w", force_zip64=True)
+
+    def add_file(self, path: str, name: str) -> None:
+        with open(path, "rb") as source, self.open(name) as entry:
+            shutil.copyfileobj(source, entry, CHUNK_SIZE)
+
+    def add_stream(self, source: BinaryIO, name: str) -> None:
+        with self.open(name) as entry:
+            shutil.copyfileobj(source, entry, CHUNK_SIZE)
+
+    def add_bytes(self, data: bytes, name: str) -> None:
+        self._zip.writestr(self._info(name), data)
+
+    def close(self) -> None:
+        self._zip.close()
+        if self._file is not None:
+            self._file.close()
+
+    def abandon(self) -> None:
+        """Drop the archive unfinished, e.g. when the reader is gone and nothing more may be written"""
+        self._zip.fp = None
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abandon()
+
+
+class ArchiveStream:
+    """Bounded pipe from an ArchiveWriter on pool threads to a response body on the loop"""
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue(STREAM_BUFFER_CHUNKS)
+        self._buffer = bytearray()
+        self.aborted = False
+
+    # Writer side (pool threads)
+    def write(self, data) -> int:
+        if self.aborted:
+            raise BrokenPipeError("Archive reader went away")
+        self._buffer += data
+        if len(self._buffer) >= STREAM_CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self) -> None:
+        if self._buffer:
+            chunk = bytes(self._buffer)
+            self._buffer.clear()
+            asyncio.run_coroutine_threadsafe(self._queue.put(chunk), self._loop).result()
+
+    # Reader side (event loop)
+    async def end(self) -> None:
+        await self._queue.put(None)
+
+    def abort(self) -> None:
+        # Unblocks a writer waiting for room; its next write fails
+        self.aborted = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    async def chunks(self):
+        while True:
+            chunk: Optional[bytes] = await self._queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+
+async def stream_archive(fill: Callable[["ArchiveWriter"], Awaitable[None]]) -> AsyncIterator[bytes]:
+    """The ZIP that ``await fill(archive)`` writes, yielded while it is being written.
+
+    ``fill`` runs on the loop and must write from pool threads (the stream
+    blocks writers while the reader catches up).  If it fails, what was
+    written is yielded and then its error is raised, so the transfer aborts.
+    """
+    stream = ArchiveStream()
+
+    async def run() -> None:
+        archive = ArchiveWriter(stream)
+        try:
+            await fill(archive)
+            await asyncio.to_thread(archive.close)
+        except BaseException:
+            archive.abandon()
+            raise
+        finally:
+            if not stream.aborted:
+                await stream.end()
+
+    task = asyncio.ensure_future(run())
+    try:
+        async for chunk in stream.chunks():
+            yield chunk
+        await task
+    finally:
+        if not task.done():
+            stream.abort()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
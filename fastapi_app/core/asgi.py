@@ -0,0 +1,84 @@
+"""Minimal in-process ASGI client.
+
+Used to replay a spooled tool request against the application without a
+network hop (job workers, benchmarks).  The request body is streamed from
+a file and the response body is streamed to a file, so neither side is
+held in memory.
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+import aiofiles
+
+CHUNK_SIZE = 1024 * 1024
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+async def call_app(
+    app,
+    method: str,
+    path: str,
+    headers: Headers,
+    body_path: Optional[str],
+    output_path: str,
+    query_string: bytes = b"",
+) -> Tuple[int, Headers]:
+    """Send one request through ``app`` and write the response body to ``output_path``"""
+    response_done = asyncio.Event()
+    status = 500
+    response_headers: Headers = []
+
+    body_file = await aiofiles.open(body_path, "rb") if body_path else None
+    output_file = await aiofiles.open(output_path, "wb")
+
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            chunk = await body_file.read(CHUNK_SIZE) if body_file is not None else b""
+            if chunk:
+                return {"type": "http.request", "body": chunk, "more_body": True}
+            body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Only report a disconnect once the app has finished responding
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = list(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            if body:
+                await output_file.write(body)
+            if not message.get("more_body", False):
+                response_done.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string,
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+    }
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        response_done.set()
+        if body_file is not None:
+            await body_file.close()
+        await output_file.close()
+
+    return status, response_headers
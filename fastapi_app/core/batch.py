@@ -0,0 +1,366 @@
+"""Batch execution: one single-file tool over many uploads.
+
+A batch upload is parsed as it arrives: every file part is written straight
+to disk as the multipart body of a request to the tool route, so inputs are
+never held in memory however many there are.  The other form fields are the
+tool's parameters and are appended to every item's body.
+
+Items are replayed against the tool route in-process (see ``core.asgi``),
+up to ``BATCH_CONCURRENCY`` at a time, so each one gets the route's own
+validation, result cache, admission and pool, and a failing item only fails
+itself.  Results go into a ZIP that is streamed to the client in completion
+order through a bounded buffer; the last entry, ``batch_report.json``, has
+the status and timing of every item.
+"""
+import asyncio
+import contextvars
+import glob
+import json
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from core import metrics
+from core.archive import ArchiveStream, ArchiveWriter
+from core.asgi import Headers, call_app
+from core.executor import CPU_WORKERS, IO, run_in_pool
+from core.jobs import read_error
+from core.streaming import MODE_HEADER, STREAM
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    from multipart.multipart import MultipartParser, parse_options_header
+
+BATCH_DIR = "uploads/batch"
+os.makedirs(BATCH_DIR, exist_ok=True)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(CPU_WORKERS)))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "10000"))
+MAX_FIELDS = 100
+MAX_FIELD_BYTES = 64 * 1024
+
+REPORT_NAME = "batch_report.json"
+
+# Request headers carried over to every item request
+FORWARDED_HEADERS = (b"x-tool-cache", b"x-session-id")
+
+# States
+QUEUED = "queued"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Batch whose items are being run in this context (admission lets them queue without a bound)
+_current_batch: contextvars.ContextVar = contextvars.ContextVar("current_batch", default=None)
+
+
+def current_batch() -> Optional["Batch"]:
+    return _current_batch.get()
+
+
+class BatchError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class BatchItem:
+    index: int
+    filename: str
+    body_path: str
+    input_bytes: int = 0
+    state: str = QUEUED
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    output: Optional[str] = None
+    output_bytes: int = 0
+    queued_seconds: Optional[float] = None
+    seconds: Optional[float] = None
+
+    def report(self) -> dict:
+        report = asdict(self)
+        del report["body_path"]
+        return report
+
+
+def _spool_path(batch_id: str, index: int, kind: str) -> str:
+    return os.path.join(BATCH_DIR, f"{batch_id}_{index}.{kind}")
+
+
+def _remove_spool(batch_id: str) -> None:
+    for path in glob.glob(os.path.join(BATCH_DIR, f"{batch_id}_*")):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _quote(value: str) -> str:
+    # As browsers do: quotes and line breaks cannot appear in a quoted header parameter
+    return value.replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+class _UploadReader:
+    """Multipart parser callbacks that spool each file part as an item request body"""
+
+    def __init__(self, batch_id: str, boundary: str, max_file_bytes: int):
+        self.batch_id = batch_id
+        self.boundary = boundary
+        self.max_file_bytes = max_file_bytes
+        self.items: List[BatchItem] = []
+        self.fields: List[Tuple[str, str]] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._file = None
+        self._item: Optional[BatchItem] = None
+        self._field_name: Optional[str] = None
+        self._field_value = bytearray()
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        if filename is None:
+            if len(self.fields) >= MAX_FIELDS:
+                raise BatchError(400, f"Too many form fields (maximum {MAX_FIELDS})")
+            self._field_name = name
+            self._field_value = bytearray()
+            return
+
+        if len(self.items) >= BATCH_MAX_FILES:
+            raise BatchError(400, f"Too many files (maximum {BATCH_MAX_FILES})")
+        filename = os.path.basename(filename.decode("utf-8", "replace")) or f"file_{len(self.items) + 1}"
+        content_type = self._headers.get(b"content-type", b"").decode("latin-1") or "application/octet-stream"
+        self._item = BatchItem(len(self.items), filename, _spool_path(self.batch_id, len(self.items), "body"))
+        self.items.append(self._item)
+        self._file = open(self._item.body_path, "wb")
+        self._file.write((
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{_quote(filename)}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode())
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._file is not None:
+            self._item.input_bytes += end - start
+            if self._item.input_bytes > self.max_file_bytes:
+                raise BatchError(413, f"{self._item.filename} is too large. Maximum size is {self.max_file_bytes // (1024 * 1024)} MB")
+            self._file.write(data[start:end])
+        else:
+            self._field_value += data[start:end]
+            if len(self._field_value) > MAX_FIELD_BYTES:
+                raise BatchError(400, f"Form field {self._field_name} is too large")
+
+    def on_part_end(self):
+        if self._file is not None:
+            self._file.write(b"\r\n")
+            self._file.close()
+            self._file = None
+            self._item = None
+        else:
+            self.fields.append((self._field_name, self._field_value.decode("utf-8", "replace")))
+
+    def finish(self) -> None:
+        """Append the tool parameters and the closing delimiter to every item body"""
+        trailer = "".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{_quote(name)}"\r\n\r\n{value}\r\n'
+            for name, value in self.fields
+        ) + f"--{self.boundary}--\r\n"
+        trailer = trailer.encode()
+        for item in self.items:
+            with open(item.body_path, "ab") as f:
+                f.write(trailer)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _response_filename(headers: Headers) -> Optional[str]:
+    for name, value in headers:
+        if name.lower() == b"content-disposition":
+            _, options = parse_options_header(value)
+            filename = options.get(b"filename")
+            if filename:
+                return os.path.basename(filename.decode("utf-8", "replace"))
+    return None
+
+
+class Batch:
+    """One tool route run over the items of one upload"""
+
+    def __init__(self, app, batch_id: str, route: str, items: List[BatchItem], boundary: str,
+                 headers: Headers, concurrency: int = BATCH_CONCURRENCY):
+        self.id = batch_id
+        self.app = app
+        self.route = route
+        self.tool = metrics.tool_id(route)
+        self.items = items
+        self.boundary = boundary
+        self.headers = headers
+        self.concurrency = max(1, min(concurrency, len(items)))
+        self.started = time.monotonic()
+        self._names: set = set()
+        self._archive_lock = asyncio.Lock()
+
+    def _archive_name(self, item: BatchItem, output_name: str) -> str:
+        stem = item.filename.rsplit(".", 1)[0] if "." in item.filename else item.filename
+        extension = "." + output_name.rsplit(".", 1)[-1] if "." in output_name else ""
+        name = f"{stem}{extension}"
+        if name in self._names:
+            name = f"{stem}_{item.index + 1}{extension}"
+        self._names.add(name)
+        return name
+
+    async def _process(self, item: BatchItem, archive: ArchiveWriter) -> None:
+        result_path = _spool_path(self.id, item.index, "result")
+        started = time.monotonic()
+        item.queued_seconds = round(started - self.started, 4)
+        try:
+            headers = self.headers + [
+                (b"content-type", f"multipart/form-data; boundary={self.boundary}".encode()),
+                (b"content-length", str(os.path.getsize(item.body_path)).encode()),
+            ]
+            status, response_headers = await call_app(self.app, "POST", self.route, headers, item.body_path, result_path)
+            item.status_code = status
+            if status >= 400:
+                item.state = FAILED
+                item.error = read_error(result_path)
+                return
+
+            # Streamed tools answer with the output itself, the others with a JSON payload
+            output_path, output_name = result_path, _response_filename(response_headers) or item.filename
+            if dict(response_headers).get(b"content-type", b"").startswith(b"application/json"):
+                with open(result_path, "rb") as f:
+                    payload = json.load(f)
+                download = os.path.join("downloads", payload.get("filename") or "")
+                if payload.get("download_url") and os.path.isfile(download):
+                    output_path, output_name = download, payload["filename"]
+                else:
+                    output_name = item.filename + ".json"
+
+            async with self._archive_lock:
+                item.output = self._archive_name(item, output_name)
+                await run_in_pool(IO, archive.add_file, output_path, item.output)
+            item.output_bytes = os.path.getsize(output_path)
+            item.state = SUCCEEDED
+        except Exception as e:
+            item.state = FAILED
+            item.error = item.error or str(e)
+        finally:
+            item.seconds = round(time.monotonic() - started, 4)
+            metrics.BATCH_ITEMS.inc(self.tool, item.state)
+            for path in (item.body_path, result_path):
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    async def _worker(self, pending, archive: ArchiveWriter) -> None:
+        # Items share one iterator: each worker takes the next one when it is free
+        for item in pending:
+            await self._process(item, archive)
+
+    def report(self) -> dict:
+        succeeded = sum(1 for item in self.items if item.state == SUCCEEDED)
+        return {
+            "batch_id": self.id,
+            "tool": self.route,
+            "total": len(self.items),
+            "succeeded": succeeded,
+            "failed": len(self.items) - succeeded,
+            "concurrency": self.concurrency,
+            "seconds": round(time.monotonic() - self.started, 4),
+            "items": [item.report() for item in self.items],
+        }
+
+    async def run(self, stream: ArchiveStream) -> None:
+        archive = ArchiveWriter(stream)
+        token = _current_batch.set(self)
+        try:
+            pending = iter(self.items)
+            await asyncio.gather(*(self._worker(pending, archive) for _ in range(self.concurrency)))
+            report = json.dumps(self.report(), indent=2).encode()
+            await run_in_pool(IO, archive.add_bytes, report, REPORT_NAME)
+            await run_in_pool(IO, archive.close)
+        except Exception as e:
+            # Headers are long gone: the client sees a truncated archive
+            print(f"Batch {self.id} failed: {e}")
+        finally:
+            _current_batch.reset(token)
+            if stream.aborted:
+                archive.abandon()
+            else:
+                await stream.end()
+
+    async def response_body(self):
+        """The archive, as a response body; the batch runs while it is consumed"""
+        stream = ArchiveStream()
+        task = asyncio.ensure_future(self.run(stream))
+        try:
+            async for chunk in stream.chunks():
+                yield chunk
+        finally:
+            if not task.done():
+                stream.abort()
+                task.cancel()
+            task.add_done_callback(lambda _: self.cleanup())
+
+    def cleanup(self) -> None:
+        _remove_spool(self.id)
+
+
+async def receive(request, route: str, max_file_bytes: int) -> Batch:
+    """Spool a batch upload to per-item request bodies for ``route``"""
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise BatchError(400, "Expected a multipart/form-data upload")
+
+    batch_id = uuid.uuid4().hex
+    boundary = uuid.uuid4().hex
+    reader = _UploadReader(batch_id, boundary, max_file_bytes)
+    parser = MultipartParser(options[b"boundary"], reader.callbacks())
+    try:
+        async for chunk in request.stream():
+            # Callbacks write to disk
+            await asyncio.to_thread(parser.write, chunk)
+        parser.finalize()
+        if not reader.items:
+            raise BatchError(400, "No files uploaded")
+        await asyncio.to_thread(reader.finish)
+    except BaseException:
+        reader.close()
+        _remove_spool(batch_id)
+        raise
+
+    headers = [(name, value) for name, value in request.headers.raw if name in FORWARDED_HEADERS]
+    headers.append((MODE_HEADER.encode(), STREAM.encode()))
+    return Batch(request.app, batch_id, route, reader.items, boundary, headers)
@@ -0,0 +1,334 @@
+"""Content-addressed result cache.
+
+Tool outputs are keyed by (tool id, normalized parameters, SHA-256 of every
+input) and kept under ``downloads/cache/<key>/<filename>`` with a JSON
+sidecar describing how to answer a hit.  A hit never touches PIL, pypdf,
+tesseract or ffmpeg: it returns the stored JSON payload or streams the
+stored file.
+
+The cache is bounded by ``CACHE_MAX_MB`` and evicts least recently used
+entries.  Clients opt out per request with ``X-Tool-Cache: bypass`` or
+``Cache-Control: no-cache``; every cached route answers with an
+``X-Tool-Cache: HIT|MISS|SHARED|BYPASS`` header.
+
+The same key drives single-flight deduplication (``core.singleflight``): a
+miss for a key that another request is already computing waits for that
+request and answers with its output (``SHARED``) instead of running the
+tool again.  This works with the cache disabled too; ``SINGLE_FLIGHT=0``
+turns it off, and a bypassing client always gets its own computation.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Union
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from core.executor import io_bound, run_tool
+from core.singleflight import Flight, SingleFlight
+from core.streaming import stream_requested
+from core.timing import stage
+from core.uploads import SpooledUpload
+
+CACHE_DIR = "downloads/cache"
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_MB", "1024")) * 1024 * 1024
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") != "0"
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") != "0"
+
+CACHE_HEADER = "X-Tool-Cache"
+
+HIT = "HIT"
+MISS = "MISS"
+SHARED = "SHARED"
+BYPASS = "BYPASS"
+
+
+class CacheEntry:
+    def __init__(self, key: str, filename: str, size: int, media_type: Optional[str] = None,
+                 payload: Optional[dict] = None, created_at: Optional[float] = None):
+        self.key = key
+        self.filename = filename
+        self.size = size
+        self.media_type = media_type
+        self.payload = payload
+        self.created_at = created_at or time.time()
+
+    @property
+    def directory(self) -> str:
+        return f"{CACHE_DIR}/{self.key}"
+
+    @property
+    def path(self) -> str:
+        return f"{self.directory}/{self.filename}"
+
+    @property
+    def url(self) -> str:
+        return f"/{self.path}"
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "filename": self.filename,
+            "size": self.size,
+            "media_type": self.media_type,
+            "payload": self.payload,
+            "created_at": self.created_at,
+        }
+
+
+class ResultCache:
+    """LRU index over the cached artifacts on disk"""
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(tool_id: str, params: dict, input_hashes: Iterable[str]) -> str:
+        normalized = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+        material = "\n".join([tool_id, normalized, *input_hashes])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def load(self) -> None:
+        """Rebuild the index from disk (oldest first, so LRU order is approximate)"""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for key in os.listdir(self.directory):
+            meta_path = f"{self.directory}/{key}/entry.json"
+            try:
+                with open(meta_path) as f:
+                    entry = CacheEntry(**json.load(f))
+                if os.path.exists(entry.path):
+                    entries.append(entry)
+                    continue
+            except (OSError, ValueError, TypeError):
+                pass
+            shutil.rmtree(f"{self.directory}/{key}", ignore_errors=True)
+
+        self._entries.clear()
+        self.total_bytes = 0
+        for entry in sorted(entries, key=lambda e: e.created_at):
+            self._entries[entry.key] = entry
+            self.total_bytes += entry.size
+        self._evict()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if not os.path.exists(entry.path):
+            self._drop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    async def put(self, entry: CacheEntry, source_path: str) -> CacheEntry:
+        if entry.size > self.max_bytes:
+            return entry
+        await run_tool(_store_artifact, source_path, entry.directory, entry.filename, entry.to_dict())
+        if entry.key in self._entries:
+            self.total_bytes -= self._entries[entry.key].size
+        self._entries[entry.key] = entry
+        self.total_bytes += entry.size
+        self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._drop(key)
+            self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+            shutil.rmtree(entry.directory, ignore_errors=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": CACHE_ENABLED,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def metric_samples(self):
+        """Samples for ``core.metrics.register_collector``"""
+        return [
+            ("tool_cache_hits_total", "counter", "Result cache hits", self.hits),
+            ("tool_cache_misses_total", "counter", "Result cache misses", self.misses),
+            ("tool_cache_bypasses_total", "counter", "Requests that bypassed the result cache", self.bypasses),
+            ("tool_cache_evictions_total", "counter", "Result cache entries evicted", self.evictions),
+            ("tool_cache_entries", "gauge", "Entries in the result cache", len(self._entries)),
+            ("tool_cache_bytes", "gauge", "Bytes held by the result cache", self.total_bytes),
+            ("tool_singleflight_in_flight", "gauge", "Distinct tool computations other requests can attach to", flights.in_flight),
+            ("tool_singleflight_shared_total", "counter", "Requests answered with another request's output", flights.shared),
+            ("tool_singleflight_failed_leaders_total", "counter", "Leaders that ended without a result", flights.failed),
+        ]
+
+
+@io_bound
+def _store_artifact(source_path: str, directory: str, filename: str, meta: dict) -> None:
+    os.makedirs(directory, exist_ok=True)
+    target = f"{directory}/{filename}"
+    if os.path.exists(target):
+        os.unlink(target)
+    try:
+        # Same filesystem: share the bytes with the original download
+        os.link(source_path, target)
+    except OSError:
+        shutil.copyfile(source_path, target)
+    with open(f"{directory}/entry.json", "w") as f:
+        json.dump(meta, f)
+
+
+result_cache = ResultCache()
+flights = SingleFlight()
+
+
+def _bypass_requested(request: Request) -> bool:
+    if request.headers.get(CACHE_HEADER.lower(), "").lower() == "bypass":
+        return True
+    cache_control = request.headers.get("cache-control", "").lower()
+    return "no-cache" in cache_control or "no-store" in cache_control
+
+
+class ToolCache:
+    """Per-request cache handle injected into tool handlers"""
+
+    def __init__(self, tool_id: str, enabled: bool, response: Response, stream: bool = False,
+                 single_flight: bool = False):
+        self.tool_id = tool_id
+        self.enabled = enabled
+        self.single_flight = single_flight
+        # Streaming clients want the bytes, not the JSON that points at them
+        self.stream = stream
+        self.status = MISS if enabled else BYPASS
+        self.key: Optional[str] = None
+        self._flight: Optional[Flight] = None
+        self._response = response
+        self._set_status(self.status)
+
+    @property
+    def headers(self) -> dict:
+        return {CACHE_HEADER: self.status}
+
+    def _set_status(self, status: str) -> None:
+        self.status = status
+        self._response.headers[CACHE_HEADER] = status
+
+    async def lookup(self, uploads: Union[SpooledUpload, Iterable[SpooledUpload]],
+                     **params) -> Optional[Union[dict, FileResponse]]:
+        """Return the cached or shared response for these inputs, or None if the caller must run the tool"""
+        if not self.enabled:
+            result_cache.bypasses += 1
+            if not self.single_flight:
+                return None
+
+        if isinstance(uploads, SpooledUpload):
+            uploads = [uploads]
+        # The extension is part of the key: several tools pick the output format from it
+        inputs = [f"{upload.sha256}.{upload.extension}" for upload in uploads]
+        self.key = result_cache.make_key(self.tool_id, params, inputs)
+
+        while True:
+            if self.enabled:
+                entry = result_cache.get(self.key)
+                if entry is not None:
+                    self._set_status(HIT)
+                    return self._respond(entry.path, entry.filename, entry.media_type, entry.payload)
+            if not self.single_flight:
+                return None
+
+            if self.stream:
+                # A streamed response leaves no artifact to share, so it never leads
+                flight = flights.watch(self.key)
+                if flight is None:
+                    return None
+            else:
+                flight, leader = flights.join(self.key)
+                if leader:
+                    self._flight = flight
+                    return None
+
+            shared = await flights.wait(flight)
+            if shared is not None and os.path.exists(shared["path"]):
+                self._set_status(SHARED)
+                return self._respond(**shared)
+            # The leader failed: check again, and lead if nobody else has taken over
+
+    def _respond(self, path: str, filename: str, media_type: Optional[str],
+                 payload: Optional[dict]) -> Union[dict, FileResponse]:
+        if payload is not None and not self.stream:
+            return dict(payload)
+        return FileResponse(
+            path,
+            media_type=media_type,
+            filename=filename,
+            headers={"Content-Disposition": f"attachment; filename={filename}", **self.headers}
+        )
+
+    async def store(self, output_path: str, payload: Optional[dict] = None,
+                    media_type: Optional[str] = None, filename: Optional[str] = None) -> Optional[dict]:
+        """Cache a freshly produced artifact and hand it to waiting requests; returns ``payload`` unchanged"""
+        if self.key is None:
+            return payload
+
+        filename = filename or os.path.basename(output_path)
+        shared = {"path": output_path, "filename": filename, "media_type": media_type, "payload": payload}
+        if self.enabled:
+            entry = CacheEntry(self.key, filename, os.path.getsize(output_path), media_type)
+            if payload is not None:
+                # A hit is served from the cache copy, which outlives the original download
+                entry.payload = {**payload, "download_url": entry.url} if "download_url" in payload else dict(payload)
+            try:
+                with stage("persist"):
+                    await result_cache.put(entry, output_path)
+                if result_cache._entries.get(self.key) is entry:
+                    shared.update(path=entry.path, payload=entry.payload)
+            except OSError:
+                pass
+
+        if self._flight is not None:
+            flights.complete(self._flight, shared)
+            self._flight = None
+        return payload
+
+    def release(self) -> None:
+        """End of request: a flight led without producing a result is failed over to its followers"""
+        if self._flight is not None:
+            flights.fail(self._flight)
+            self._flight = None
+
+
+def tool_cache(tool_id: str):
+    """Dependency factory: ``cache: ToolCache = Depends(tool_cache("pdf_compress"))``"""
+    async def dependency(request: Request, response: Response):
+        bypass = _bypass_requested(request)
+        cache = ToolCache(tool_id, CACHE_ENABLED and not bypass, response, stream_requested(request),
+                          single_flight=SINGLE_FLIGHT and not bypass)
+        try:
+            yield cache
+        finally:
+            cache.release()
+    return dependency
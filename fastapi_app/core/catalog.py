@@ -0,0 +1,132 @@
+"""The ``/api/tools`` catalogue.
+
+Built once from the routes the app actually registers, so it cannot list a
+tool that does not exist.  Each tool's name is its route ``summary`` and its
+description the first line of the handler docstring; ids are the same tool
+ids used by ``/metrics`` and the usage table.
+
+The catalogue is serialized once, together with gzip (and brotli, when
+installed) variants and a strong ETag per variant.  A request is answered
+from those bytes, or with a bodyless 304 when ``If-None-Match`` matches.
+"""
+import gzip
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from core import metrics
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+IDENTITY = "identity"
+CACHE_CONTROL = "public, no-cache"
+
+
+def _entry(route: APIRoute) -> dict:
+    slug = route.path.rsplit("/", 1)[-1]
+    description = (route.description or "").strip().split("\n", 1)[0]
+    return {
+        "id": metrics.tool_id(route.path),
+        "name": route.summary or slug.replace("-", " ").title(),
+        "route": route.path,
+        "description": description,
+    }
+
+
+def build_catalog(routes) -> Dict[str, List[dict]]:
+    """Tools grouped by category, in registration order"""
+    catalog = {f"{prefix.split('/')[2]}_tools": [] for prefix in metrics.TOOL_PREFIXES}
+    seen = set()
+    for route in routes:
+        if not isinstance(route, APIRoute) or "POST" not in route.methods:
+            continue
+        if not route.path.startswith(metrics.TOOL_PREFIXES) or "{" in route.path:
+            continue
+        # A path registered twice is served by the first handler only
+        if route.path in seen:
+            continue
+        seen.add(route.path)
+        catalog[f"{route.path.split('/')[2]}_tools"].append(_entry(route))
+    return catalog
+
+
+def _accepted(header: str) -> Dict[str, float]:
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+class ToolCatalog:
+    """Serialized catalogue with precompressed variants"""
+
+    def __init__(self):
+        self.tools: Optional[Dict[str, List[dict]]] = None
+        # Content-Encoding -> (body, ETag), best compression first
+        self._variants: Dict[str, Tuple[bytes, str]] = {}
+        self.etags = set()
+
+    def build(self, app) -> None:
+        self.tools = build_catalog(app.routes)
+        body = json.dumps(self.tools, separators=(",", ":")).encode()
+        digest = hashlib.sha256(body).hexdigest()[:32]
+
+        variants = {}
+        if HAS_BROTLI:
+            variants["br"] = brotli.compress(body, quality=11)
+        # mtime=0 keeps the gzip bytes identical across restarts
+        variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        variants[IDENTITY] = body
+
+        # Each encoding is a different representation and needs its own strong ETag
+        self._variants = {
+            coding: (data, f'"{digest}"' if coding == IDENTITY else f'"{digest}-{coding}"')
+            for coding, data in variants.items()
+        }
+        self.etags = {etag for _, etag in self._variants.values()}
+
+    def _select(self, accept_encoding: str) -> str:
+        accepted = _accepted(accept_encoding)
+        for coding in self._variants:
+            if coding != IDENTITY and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+                return coding
+        return IDENTITY
+
+    def _not_modified(self, if_none_match: str) -> bool:
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses weak comparison
+        tags = {tag.strip().replace("W/", "", 1) for tag in if_none_match.split(",")}
+        return bool(tags & self.etags)
+
+    def response(self, request: Request) -> Response:
+        if self.tools is None:
+            self.build(request.app)
+        coding = self._select(request.headers.get("accept-encoding", ""))
+        body, etag = self._variants[coding]
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+        if self._not_modified(request.headers.get("if-none-match", "")):
+            return Response(status_code=304, headers=headers)
+        if coding != IDENTITY:
+            headers["Content-Encoding"] = coding
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+tool_catalog = ToolCatalog()
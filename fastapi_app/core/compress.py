@@ -0,0 +1,203 @@
+"""PDF compression by downsampling embedded images.
+
+Scanned and photo-heavy PDFs are mostly image data, which rewriting the
+object structure does not shrink.  ``recompress_images`` finds every image
+drawn on a page and works out its effective resolution from the largest
+place it is drawn at.  An image above ``COMPRESS_DPI_TOLERANCE`` times the
+target DPI is downsampled to it, and every candidate is re-encoded as JPEG
+at the requested quality.  Images are shared out to the CPU pool in runs of
+``COMPRESS_RUN_IMAGES``, with no more than ``COMPRESS_CONCURRENCY`` runs of
+a request in flight; a worker decodes one image at a time (JPEGs at a
+reduced scale straight away) and keeps the result, as a temporary file,
+only when it is smaller than the stream it replaces.
+
+``rewrite`` then swaps the new streams in and saves the document with
+unused objects removed and streams deflated.
+
+Left alone: bilevel images (JBIG2, CCITT and 1-bit images are smaller than
+any JPEG of them), stencil masks, images with a soft or colour-key mask,
+inline images and images under ``COMPRESS_MIN_IMAGE_BYTES``.  Without
+PyMuPDF there is nothing to recompress and the document is only rewritten.
+"""
+import asyncio
+import io
+import math
+import os
+import uuid
+from collections import deque
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
+
+from core import engines, metrics
+from core.executor import CPU_WORKERS, cpu_bound, run_tool
+from core.jobs import report_progress
+from core.timing import stage
+from core.uploads import UPLOAD_DIR
+
+fitz = engines.fitz
+
+MIN_DPI, MAX_DPI = 36, 600
+COMPRESS_CONCURRENCY = int(os.getenv("COMPRESS_CONCURRENCY", str(CPU_WORKERS)))
+COMPRESS_RUN_IMAGES = int(os.getenv("COMPRESS_RUN_IMAGES", "4"))
+COMPRESS_MIN_IMAGE_BYTES = int(os.getenv("COMPRESS_MIN_IMAGE_BYTES", "8192"))
+COMPRESS_DPI_TOLERANCE = float(os.getenv("COMPRESS_DPI_TOLERANCE", "1.1"))
+
+SKIPPED_FILTERS = {"/JBIG2Decode", "/CCITTFaxDecode"}
+SAVE_OPTIONS = {"garbage": 4, "deflate": True, "clean": True}
+
+# (xref, scale): an image to re-encode, and how much to shrink it by
+Job = Tuple[int, float]
+# (xref, JPEG file, width, height, colour space): a stream to swap in
+Replacement = Tuple[int, str, int, int, str]
+
+
+def _key(doc, xref: int, key: str) -> Optional[str]:
+    kind, value = doc.xref_get_key(xref, key)
+    return None if kind == "null" else value
+
+
+def _recompressible(doc, xref: int) -> bool:
+    if _key(doc, xref, "ImageMask") == "true" or _key(doc, xref, "BitsPerComponent") == "1":
+        return False
+    if _key(doc, xref, "SMask") or _key(doc, xref, "Mask"):
+        return False
+    filters = _key(doc, xref, "Filter") or ""
+    if any(name in filters for name in SKIPPED_FILTERS):
+        return False
+    return len(doc.xref_stream_raw(xref) or b"") >= COMPRESS_MIN_IMAGE_BYTES
+
+
+@cpu_bound
+def find_images(input_path: str, dpi: int) -> List[Job]:
+    """Images worth re-encoding, with the scale that brings them down to ``dpi``"""
+    with stage("decode"):
+        doc = fitz.open(input_path)
+    with doc:
+        if doc.needs_pass:
+            raise ValueError("Password-protected PDFs cannot be compressed; unlock them first")
+        # Lowest effective DPI of each image: its largest placement decides
+        lowest: Dict[int, float] = {}
+        for page in doc:
+            for info in page.get_image_info(xrefs=True):
+                xref = info["xref"]
+                a, b, c, d, _, _ = info["transform"]
+                # Side lengths in inches, whatever the rotation
+                width, height = math.hypot(a, b) / 72, math.hypot(c, d) / 72
+                if not xref or not width or not height:
+                    continue
+                effective = min(info["width"] / width, info["height"] / height)
+                lowest[xref] = min(effective, lowest.get(xref, effective))
+
+        jobs = []
+        for xref, effective in lowest.items():
+            if _recompressible(doc, xref):
+                scale = dpi / effective if effective > dpi * COMPRESS_DPI_TOLERANCE else 1.0
+                jobs.append((xref, scale))
+    return jobs
+
+
+def _decode(doc, xref: int, scale: float):
+    """Pillow image (L or RGB) of an image XObject, at roughly ``scale`` or larger"""
+    width, height = int(_key(doc, xref, "Width")), int(_key(doc, xref, "Height"))
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    if _key(doc, xref, "Filter") == "/DCTDecode" and not _key(doc, xref, "Decode"):
+        # Pillow decodes a JPEG at 1/2, 1/4 or 1/8 scale directly
+        image = engines.Image.open(io.BytesIO(doc.xref_stream_raw(xref)))
+        if image.mode in ("L", "RGB"):
+            if scale < 1:
+                image.draft(image.mode, size)
+            return image, size
+
+    pixmap = fitz.Pixmap(doc, xref)
+    if pixmap.alpha:
+        pixmap = fitz.Pixmap(pixmap, 0)
+    if pixmap.n not in (1, 3):
+        pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+    mode = "L" if pixmap.n == 1 else "RGB"
+    return engines.Image.frombytes(mode, (pixmap.width, pixmap.height), pixmap.samples), size
+
+
+@cpu_bound
+def recompress_run(input_path: str, jobs: List[Job], quality: int) -> List[Optional[Replacement]]:
+    """Re-encode images as JPEG; None for those that would not get smaller"""
+    with stage("decode"):
+        doc = fitz.open(input_path)
+    results = []
+    with doc:
+        for xref, scale in jobs:
+            original_size = len(doc.xref_stream_raw(xref))
+            with stage("decode"):
+                image, size = _decode(doc, xref, scale)
+                if image.size != size:
+                    image = image.resize(size, engines.Image.LANCZOS, reducing_gap=3.0)
+            output = io.BytesIO()
+            with stage("encode"):
+                image.save(output, "JPEG", quality=quality, optimize=True)
+            if output.tell() >= original_size:
+                results.append(None)
+                continue
+            path = f"{UPLOAD_DIR}/temp_{uuid.uuid4()}.jpg"
+            with stage("persist"):
+                with open(path, "wb") as f:
+                    f.write(output.getbuffer())
+            colorspace = "/DeviceGray" if image.mode == "L" else "/DeviceRGB"
+            results.append((xref, path, image.width, image.height, colorspace))
+    return results
+
+
+async def recompress_images(input_path: str, quality: int = 85, dpi: int = 150) -> List[Replacement]:
+    """Smaller JPEG streams for the images of a PDF; ``discard`` them when done"""
+    if not (fitz.available and engines.Image.available):
+        return []
+    jobs = await run_tool(find_images, input_path, dpi)
+    # Images shrunk the most tend to be the largest: start them first
+    jobs.sort(key=lambda job: job[1])
+    runs = [jobs[i:i + COMPRESS_RUN_IMAGES] for i in range(0, len(jobs), COMPRESS_RUN_IMAGES)]
+    replacements: List[Replacement] = []
+    in_flight = deque()
+    submitted = done = 0
+    try:
+        while submitted < len(runs) or in_flight:
+            while submitted < len(runs) and len(in_flight) < COMPRESS_CONCURRENCY:
+                in_flight.append(asyncio.ensure_future(run_tool(recompress_run, input_path, runs[submitted], quality)))
+                submitted += 1
+            for result in await in_flight.popleft():
+                metrics.COMPRESS_IMAGES.inc("skipped" if result is None else "recompressed")
+                if result is not None:
+                    replacements.append(result)
+            # Rewriting the document is the last tenth of the work
+            done += 1
+            report_progress(0.9 * done / len(runs))
+    except BaseException:
+        for task in in_flight:
+            task.cancel()
+        results = await asyncio.gather(*in_flight, return_exceptions=True)
+        discard(replacements + [item for result in results if isinstance(result, list) for item in result if item])
+        raise
+    return replacements
+
+
+def discard(replacements: Iterable[Replacement]) -> None:
+    for _, path, *_ in replacements:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+@cpu_bound
+def rewrite(input_path: str, output: Union[str, BinaryIO], replacements: Iterable[Replacement] = ()) -> None:
+    """Save a PDF with ``replacements`` swapped in, unused objects dropped and streams deflated"""
+    with stage("decode"):
+        doc = fitz.open(input_path)
+    with doc:
+        for xref, path, width, height, colorspace in replacements:
+            with open(path, "rb") as f:
+                doc.update_stream(xref, f.read(), compress=False)
+            for key, value in (("Filter", "/DCTDecode"), ("Width", str(width)), ("Height", str(height)),
+                               ("ColorSpace", colorspace), ("BitsPerComponent", "8"),
+                               ("DecodeParms", "null"), ("Decode", "null")):
+                doc.xref_set_key(xref, key, value)
+        with stage("encode"):
+            if isinstance(output, str):
+                doc.save(output, **SAVE_OPTIONS)
+            else:
+                # MuPDF seeks while it writes, and takes a stream's ``name`` for a path
+                output.write(doc.tobytes(**SAVE_OPTIONS))
@@ -0,0 +1,92 @@
+"""PDF rendering and OCR engines kept warm inside CPU pool workers.
+
+``render_pages`` rasterises a PDF in-process with PyMuPDF, so no
+``pdftoppm`` is started per request (pdf2image remains the fallback).
+``ocr`` reuses one tesseract instance per language and worker when
+tesserocr is installed, so the language data is loaded once instead of
+by a fresh ``tesseract`` process per page; without it, it falls back to
+pytesseract, which needs the ``tesseract`` binary on the path.
+
+``warm_up`` runs as the pool worker initializer: it binds the lazy
+modules, registers Pillow's codec plugins and loads the tesseract
+languages in ``OCR_LANGUAGES`` before the worker takes its first job.
+"""
+import os
+import shutil
+from typing import Dict, Iterator
+
+from core import lazy
+from core.lazy import LazyModule
+
+fitz = LazyModule("fitz")
+Image = LazyModule("PIL.Image")
+pdf2image = LazyModule("pdf2image")
+pytesseract = LazyModule("pytesseract")
+tesserocr = LazyModule("tesserocr")
+
+# Languages loaded by every worker at start; others are loaded on first use
+OCR_LANGUAGES = [lang for lang in os.getenv("OCR_LANGUAGES", "eng").split(",") if lang]
+DEFAULT_DPI = 200
+
+HAS_RENDERER = (fitz.available and Image.available) or pdf2image.available
+HAS_OCR = tesserocr.available or (pytesseract.available and shutil.which("tesseract") is not None)
+
+# tesserocr API per language, owned by this process
+_tesseract: Dict[str, object] = {}
+
+
+def page_count(input_path: str) -> int:
+    if fitz.available:
+        with fitz.open(input_path) as doc:
+            return doc.page_count
+    return pdf2image.pdfinfo_from_path(input_path)["Pages"]
+
+
+def render_pages(input_path: str, dpi: int = DEFAULT_DPI) -> Iterator:
+    """PIL images of the pages of a PDF, one at a time"""
+    if not (fitz.available and Image.available):
+        yield from pdf2image.convert_from_path(input_path, dpi=dpi)
+        return
+
+    with fitz.open(input_path) as doc:
+        for page in doc:
+            yield render_page(page, dpi)
+
+
+def render_page(page, dpi: int = DEFAULT_DPI):
+    """PIL image of one PyMuPDF page"""
+    pixmap = page.get_pixmap(dpi=dpi)
+    return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def _tesseract_api(lang: str):
+    api = _tesseract.get(lang)
+    if api is None:
+        api = _tesseract[lang] = tesserocr.PyTessBaseAPI(lang=lang)
+    return api
+
+
+def ocr(image, lang: str = "eng") -> str:
+    """Text of a PIL image"""
+    try:
+        if tesserocr.available:
+            api = _tesseract_api(lang)
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        return pytesseract.image_to_string(image, lang=lang)
+    except Exception as e:
+        # Runs in a pool worker: engine errors such as TesseractNotFoundError
+        # cannot be pickled back, and one that fails to unpickle breaks the pool
+        raise RuntimeError(str(e)) from None
+
+
+def warm_up() -> None:
+    lazy.preload()
+    if Image.available:
+        Image.init()
+    if tesserocr.available:
+        for lang in OCR_LANGUAGES:
+            try:
+                _tesseract_api(lang)
+            except Exception as e:
+                print(f"Loading tesseract language {lang} failed: {e}")
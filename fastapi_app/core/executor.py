@@ -0,0 +1,209 @@
+"""Execution layer that keeps blocking tool work off the event loop.
+
+Tool functions declare a cost class with the ``cpu_bound`` / ``io_bound``
+decorators.  ``run_tool`` sends CPU work (PIL, pypdf, PyMuPDF, tesseract)
+to a process pool and blocking I/O (subprocesses, file copies) to a thread
+pool, so a request handler only ever awaits.
+
+CPU workers are forked from a forkserver that has already imported the tool
+modules and the heavy libraries (``WARM_MODULES``), and each runs
+``engines.warm_up`` before its first job, so no request pays for imports,
+codec registration or loading tesseract languages.  Jobs reach the workers
+as pickled calls over the executor's pipes; inputs and outputs travel as
+file paths, never as file contents.
+
+A worker that has run ``TOOL_WORKER_MAX_TASKS`` jobs or grown past
+``TOOL_WORKER_MAX_RSS_MB`` asks to be recycled.  The pool is then replaced:
+new work goes to fresh workers while the old ones finish what they were
+given and exit, so leaks in native codecs stay bounded.  (The executor's own
+``max_tasks_per_child`` can hang the pool on Python 3.11 when a worker is
+replaced, so it is not used.)
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from core import metrics, timing
+
+# Cost classes
+CPU = "cpu"
+IO = "io"
+
+# Pool sizes (configurable through the environment)
+CPU_WORKERS = int(os.getenv("TOOL_CPU_WORKERS", str(os.cpu_count() or 2)))
+IO_WORKERS = int(os.getenv("TOOL_IO_WORKERS", "16"))
+
+# Worker recycling; 0 disables a limit
+WORKER_MAX_TASKS = int(os.getenv("TOOL_WORKER_MAX_TASKS", "500"))
+WORKER_MAX_RSS_MB = int(os.getenv("TOOL_WORKER_MAX_RSS_MB", "1536"))
+
+# "fork" skips the forkserver, e.g. where it is unavailable
+WORKER_START_METHOD = os.getenv("TOOL_WORKER_START_METHOD", "forkserver")
+
+# Imported once by the forkserver and inherited by every worker
+WARM_MODULES = [
+    "fitz", "PIL.Image", "pypdf", "pdf2image", "pytesseract", "tesserocr",
+    "routers.pdf_tools", "routers.image_tools", "routers.pipeline",
+]
+
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+_io_pool: Optional[ThreadPoolExecutor] = None
+
+# Worker-side state
+_is_worker = False
+_tasks_done = 0
+
+
+def cost_class(cost: str) -> Callable:
+    """Mark a tool function with the pool it should run on"""
+    if cost not in (CPU, IO):
+        raise ValueError(f"Unknown cost class: {cost}")
+
+    def decorator(fn: Callable) -> Callable:
+        fn.cost_class = cost
+        return fn
+
+    return decorator
+
+
+cpu_bound = cost_class(CPU)
+io_bound = cost_class(IO)
+
+
+def _get_pool(cost: str):
+    global _cpu_pool, _io_pool
+
+    if cost == CPU:
+        if _cpu_pool is None:
+            context = multiprocessing.get_context(WORKER_START_METHOD)
+            if WORKER_START_METHOD == "forkserver":
+                # Modules that fail to import are skipped by the forkserver
+                context.set_forkserver_preload(WARM_MODULES)
+            _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=context, initializer=_start_worker)
+        return _cpu_pool
+
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="tool-io")
+    return _io_pool
+
+
+async def run_tool(fn: Callable, *args, **kwargs) -> Any:
+    """Run a tool function on the pool matching its cost class"""
+    return await run_in_pool(getattr(fn, "cost_class", IO), fn, *args, **kwargs)
+
+
+async def run_in_pool(cost: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run ``fn`` on the pool for ``cost``, whatever ``fn`` itself declares"""
+    loop = asyncio.get_running_loop()
+    timings = timing.current.get()
+    profile = timings is not None and timings.profile
+    call = functools.partial(_timed, functools.partial(fn, *args, **kwargs), profile)
+
+    submitted = time.time()
+    pool = _get_pool(cost)
+    try:
+        started, result, work, recycle = await loop.run_in_executor(pool, call)
+    except BrokenProcessPool:
+        # A worker died (OOM, segfault in a native codec); replace the pool once
+        _reset_cpu_pool(pool)
+        pool = _get_pool(cost)
+        started, result, work, recycle = await loop.run_in_executor(pool, call)
+    metrics.observe_queue_wait(started - submitted)
+    if timings is not None:
+        timings.merge(work, getattr(fn, "__qualname__", repr(fn)))
+    if recycle:
+        _recycle_cpu_pool(pool, recycle)
+    return result
+
+
+def _timed(call: Callable, profile: bool = False):
+    # Wall clock, so the start time is comparable across worker processes
+    started = time.time()
+    try:
+        result, work = timing.run_measured(call, profile)
+    finally:
+        recycle = _recycle_reason()
+    return started, result, work, recycle
+
+
+def _start_worker():
+    global _is_worker
+    _is_worker = True
+    from core import engines
+    try:
+        engines.warm_up()
+    except Exception as e:
+        # A cold worker still works; it loads what it needs on first use
+        print(f"Worker warm-up failed: {e}")
+
+
+def _recycle_reason() -> Optional[str]:
+    """Why this worker should be replaced after the job it just ran, if it should"""
+    global _tasks_done
+    if not _is_worker:
+        return None
+    _tasks_done += 1
+    if WORKER_MAX_TASKS and _tasks_done >= WORKER_MAX_TASKS:
+        return "tasks"
+    rss = metrics.rss_bytes()
+    if WORKER_MAX_RSS_MB and rss is not None and rss >= WORKER_MAX_RSS_MB * 1024 * 1024:
+        return "memory"
+    return None
+
+
+def _recycle_cpu_pool(pool: ProcessPoolExecutor, reason: str):
+    global _cpu_pool
+    # Several jobs of the same pool may ask; only the first replaces it
+    if _cpu_pool is not pool:
+        return
+    metrics.WORKER_RECYCLES.inc(reason)
+    _cpu_pool = None
+    # Queued jobs still run; the old workers exit once the queue is drained
+    pool.shutdown(wait=False)
+
+
+def _reset_cpu_pool(pool: ProcessPoolExecutor):
+    global _cpu_pool
+    # Every job of the broken pool fails; only the first replaces it, and the
+    # others retry on its replacement instead of shutting that one down too
+    if _cpu_pool is not pool:
+        return
+    _cpu_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _ready():
+    return None
+
+
+def start():
+    """Create both pools and start the CPU workers up front so the first request does not pay for it"""
+    pool = _get_pool(CPU)
+    for _ in range(CPU_WORKERS):
+        pool.submit(_ready)
+    _get_pool(IO)
+
+
+def shutdown():
+    global _cpu_pool, _io_pool
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=True, cancel_futures=True)
+        _cpu_pool = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=True, cancel_futures=True)
+        _io_pool = None
+
+
+def pool_sizes() -> dict:
+    return {
+        "cpu_workers": CPU_WORKERS,
+        "io_workers": IO_WORKERS,
+        "worker_max_tasks": WORKER_MAX_TASKS,
+        "worker_max_rss_mb": WORKER_MAX_RSS_MB,
+        "worker_start_method": WORKER_START_METHOD,
+    }
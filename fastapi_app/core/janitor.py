@@ -0,0 +1,184 @@
+"""Background garbage collector for ``downloads/`` and ``uploads/``.
+
+Every artifact class has a TTL; on top of that the download area has a
+high-water mark and, once over it, the least recently used artifacts are
+removed until usage drops back under the low-water mark.  Orphaned
+``uploads/temp_*`` spool files left behind by crashed requests are swept at
+startup and on every pass.
+
+``downloads/cache`` is not touched here; the result cache bounds itself.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core.executor import io_bound, run_tool
+from core.jobs import JOB_RESULT_TTL
+
+HOUR = 3600
+MB = 1024 * 1024
+
+JANITOR_INTERVAL = int(os.getenv("JANITOR_INTERVAL_SECONDS", "300"))
+DOWNLOADS_MAX_BYTES = int(os.getenv("DOWNLOADS_MAX_MB", "5120")) * MB
+# Evict down to this fraction of the high-water mark so passes do not thrash
+LOW_WATER_RATIO = 0.8
+# Spool files younger than this may still belong to an in-flight request
+STARTUP_GRACE = int(os.getenv("JANITOR_STARTUP_GRACE_SECONDS", "300"))
+
+
+class ArtifactClass:
+    def __init__(self, name: str, directory: str, ttl: int, prefix: str = "", evictable: bool = True):
+        self.name = name
+        self.directory = directory
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictable = evictable
+
+    def files(self) -> List[Tuple[str, os.stat_result]]:
+        found = []
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False) and entry.name.startswith(self.prefix):
+                        try:
+                            found.append((entry.path, entry.stat(follow_symlinks=False)))
+                        except FileNotFoundError:
+                            pass
+        except FileNotFoundError:
+            pass
+        return found
+
+
+ARTIFACT_CLASSES = [
+    ArtifactClass("downloads", "downloads", int(float(os.getenv("DOWNLOAD_TTL_HOURS", "24")) * HOUR)),
+    # Jobs report their results until JOB_RESULT_TTL_HOURS, so size pressure must not take them
+    ArtifactClass("job_results", "downloads/jobs", JOB_RESULT_TTL, evictable=False),
+    ArtifactClass("job_requests", "uploads/jobs", int(float(os.getenv("JOB_REQUEST_TTL_HOURS", "6")) * HOUR), evictable=False),
+    ArtifactClass("batch_spool", "uploads/batch", int(float(os.getenv("BATCH_SPOOL_TTL_HOURS", "6")) * HOUR), evictable=False),
+    ArtifactClass("ocr_pages", "ocr_cache", int(float(os.getenv("OCR_CACHE_TTL_HOURS", "168")) * HOUR), evictable=False),
+    ArtifactClass("profiles", "profiles", int(float(os.getenv("PROFILE_TTL_HOURS", "24")) * HOUR), evictable=False),
+    ArtifactClass("upload_spool", "uploads", int(float(os.getenv("SPOOL_TTL_HOURS", "1")) * HOUR), prefix="temp_", evictable=False),
+]
+
+
+def _last_used(stat: os.stat_result) -> float:
+    return max(stat.st_atime, stat.st_mtime)
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+@io_bound
+def sweep(now: Optional[float] = None, spool_ttl: Optional[int] = None) -> Dict[str, dict]:
+    """One janitor pass: TTL expiry per class, then LRU eviction over the high-water mark"""
+    now = now or time.time()
+    report = {}
+    evictable: List[Tuple[float, str, int, str]] = []
+
+    for artifact_class in ARTIFACT_CLASSES:
+        ttl = spool_ttl if (spool_ttl is not None and artifact_class.name == "upload_spool") else artifact_class.ttl
+        removed = reclaimed = live = live_bytes = 0
+        for path, stat in artifact_class.files():
+            if now - stat.st_mtime > ttl:
+                if _remove(path):
+                    removed += 1
+                    reclaimed += stat.st_size
+                continue
+            live += 1
+            live_bytes += stat.st_size
+            if artifact_class.evictable:
+                evictable.append((_last_used(stat), path, stat.st_size, artifact_class.name))
+        report[artifact_class.name] = {
+            "removed": removed,
+            "bytes_reclaimed": reclaimed,
+            "live": live,
+            "live_bytes": live_bytes,
+        }
+
+    total = sum(size for _, _, size, _ in evictable)
+    if total > DOWNLOADS_MAX_BYTES:
+        target = DOWNLOADS_MAX_BYTES * LOW_WATER_RATIO
+        for _, path, size, name in sorted(evictable):
+            if total <= target:
+                break
+            if _remove(path):
+                total -= size
+                stats = report[name]
+                stats["removed"] += 1
+                stats["bytes_reclaimed"] += size
+                stats["live"] -= 1
+                stats["live_bytes"] -= size
+
+    return report
+
+
+class Janitor:
+    def __init__(self, interval: int = JANITOR_INTERVAL):
+        self.interval = interval
+        self.bytes_reclaimed = 0
+        self.files_removed = 0
+        self.passes = 0
+        self.last_run: Optional[float] = None
+        self.last_report: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self, spool_ttl: Optional[int] = None) -> Dict[str, dict]:
+        report = await run_tool(sweep, spool_ttl=spool_ttl)
+        self.passes += 1
+        self.last_run = time.time()
+        self.last_report = report
+        for stats in report.values():
+            self.files_removed += stats["removed"]
+            self.bytes_reclaimed += stats["bytes_reclaimed"]
+        return report
+
+    async def start(self) -> None:
+        # Orphaned spool files from a previous run go right away
+        await self.run_once(spool_ttl=STARTUP_GRACE)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Janitor error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "passes": self.passes,
+            "last_run": self.last_run,
+            "files_removed": self.files_removed,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "live_artifacts": sum(stats["live"] for stats in self.last_report.values()),
+            "live_bytes": sum(stats["live_bytes"] for stats in self.last_report.values()),
+            "classes": self.last_report,
+            "high_water_bytes": DOWNLOADS_MAX_BYTES,
+        }
+
+    def metric_samples(self):
+        """Samples for ``core.metrics.register_collector``"""
+        stats = self.stats()
+        return [
+            ("janitor_passes_total", "counter", "Janitor sweeps completed", self.passes),
+            ("janitor_files_removed_total", "counter", "Artifacts removed by the janitor", self.files_removed),
+            ("janitor_bytes_reclaimed_total", "counter", "Bytes reclaimed by the janitor", self.bytes_reclaimed),
+            ("janitor_live_artifacts", "gauge", "Artifacts left after the last sweep", stats["live_artifacts"]),
+            ("janitor_live_bytes", "gauge", "Bytes left after the last sweep", stats["live_bytes"]),
+        ]
+
+
+janitor = Janitor()
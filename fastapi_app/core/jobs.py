@@ -0,0 +1,510 @@
+"""Asynchronous job subsystem.
+
+A job is a spooled tool request (raw multipart body + headers) that a
+bounded pool of workers replays against the application in-process.  The
+response status, headers and body are kept so the client can collect the
+result later instead of holding the connection open.
+
+Finished jobs are forgotten ``JOB_RESULT_TTL_HOURS`` after they end, the
+same time the janitor keeps their result files for.  When the artifact
+store is remote (see ``core.storage``) a successful result is copied into
+it as well, so whichever node is asked for it can serve it.
+
+Queue and job state live behind ``JobBackend``.  ``MemoryJobBackend`` is the
+in-process default; ``SQLiteJobBackend`` keeps the same contract on a shared
+database file and stands in for an external queue.  Select one with
+``JOB_BACKEND=memory|sqlite``.  A running job's progress is written
+through to the backend about once a second, so every node can report it.
+"""
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from core import metrics, storage
+from core.asgi import call_app
+from core.timing import stage
+
+# States
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Configuration
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.sqlite3")
+JOB_RESULT_TTL = int(float(os.getenv("JOB_RESULT_TTL_HOURS", "24")) * 3600)
+JOB_EXPIRE_INTERVAL = int(os.getenv("JOB_EXPIRE_INTERVAL_SECONDS", "300"))
+
+# A running job's progress is persisted at most this often, unless it moved by at least PROGRESS_SAVE_STEP
+PROGRESS_SAVE_INTERVAL = 1.0
+PROGRESS_SAVE_STEP = 0.05
+
+JOBS_UPLOAD_DIR = "uploads/jobs"
+JOBS_RESULT_DIR = "downloads/jobs"
+
+
+class QueueFull(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+@dataclass
+class Job:
+    id: str
+    route: str
+    priority: int = 0
+    state: str = QUEUED
+    progress: float = 0.0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    request_path: Optional[str] = None
+    request_headers: List[List[str]] = field(default_factory=list)
+    status_code: Optional[int] = None
+    result_path: Optional[str] = None
+    result_headers: List[List[str]] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def public(self) -> dict:
+        """Job state as exposed to API clients"""
+        return {
+            "job_id": self.id,
+            "route": self.route,
+            "priority": self.priority,
+            "state": self.state,
+            "progress": round(self.progress, 3),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "status_code": self.status_code,
+            "result_url": f"/api/jobs/{self.id}/result" if self.state == SUCCEEDED else None,
+        }
+
+
+class JobBackend:
+    """Storage and queue contract for jobs"""
+
+    async def put(self, job: Job) -> None:
+        """Persist a new job and enqueue it; raise QueueFull when at capacity"""
+        raise NotImplementedError
+
+    async def take(self) -> Job:
+        """Block until a queued job is available and return it (marked running)"""
+        raise NotImplementedError
+
+    async def save(self, job: Job) -> None:
+        raise NotImplementedError
+
+    async def save_progress(self, job_id: str, progress: float) -> None:
+        """Record the progress of a job, as long as it is still running"""
+        raise NotImplementedError
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a job if, and only if, it is still queued; return the job as it now is"""
+        raise NotImplementedError
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    async def queued_count(self) -> int:
+        raise NotImplementedError
+
+    async def expire(self, finished_before: float) -> List[Job]:
+        """Forget the jobs that finished before ``finished_before`` and return them"""
+        raise NotImplementedError
+
+
+class MemoryJobBackend(JobBackend):
+    """In-process priority queue; lower priority numbers run first"""
+
+    def __init__(self, max_queued: int = JOB_QUEUE_SIZE):
+        self.max_queued = max_queued
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._jobs: Dict[str, Job] = {}
+        # Jobs still waiting; a cancelled job's queue entry stays behind but is not counted
+        self._waiting: Set[str] = set()
+        self._seq = itertools.count()
+
+    async def put(self, job: Job) -> None:
+        if len(self._waiting) >= self.max_queued:
+            raise QueueFull()
+        self._queue.put_nowait((job.priority, next(self._seq), job.id))
+        self._waiting.add(job.id)
+        self._jobs[job.id] = job
+
+    async def take(self) -> Job:
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job_id in self._waiting and job is not None and job.state == QUEUED:
+                self._waiting.discard(job_id)
+                job.state = RUNNING
+                return job
+
+    async def save(self, job: Job) -> None:
+        if job.state != QUEUED:
+            self._waiting.discard(job.id)
+        self._jobs[job.id] = job
+
+    async def save_progress(self, job_id: str, progress: float) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None and job.state == RUNNING:
+            job.progress = progress
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        # Nothing is awaited between the check and the update, so take()
+        # cannot hand the job to a worker in between
+        job = self._jobs.get(job_id)
+        if job is not None and job.state == QUEUED:
+            job.state = CANCELLED
+            job.finished_at = time.time()
+            self._waiting.discard(job_id)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def queued_count(self) -> int:
+        return len(self._waiting)
+
+    async def expire(self, finished_before: float) -> List[Job]:
+        expired = [job for job in self._jobs.values()
+                   if job.state in FINISHED_STATES and job.finished_at is not None and job.finished_at < finished_before]
+        for job in expired:
+            del self._jobs[job.id]
+        return expired
+
+
+class SQLiteJobBackend(JobBackend):
+    """Job queue on a SQLite file, shareable between worker processes"""
+
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, path: str = JOB_DB_PATH, max_queued: int = JOB_QUEUE_SIZE):
+        self.path = path
+        self.max_queued = max_queued
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, priority INTEGER, seq INTEGER,"
+                " state TEXT, data TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (state, priority, seq)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _put(self, job: Job) -> None:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            (queued,) = conn.execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (QUEUED,)).fetchone()
+            if queued >= self.max_queued:
+                conn.execute("ROLLBACK")
+                raise QueueFull()
+            conn.execute(
+                "INSERT INTO jobs (id, priority, seq, state, data) VALUES (?, ?, ?, ?, ?)",
+                (job.id, job.priority, time.time_ns(), job.state, json.dumps(job.to_dict())),
+            )
+            conn.execute("COMMIT")
+
+    def _take(self) -> Optional[Job]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, data FROM jobs WHERE state = ? ORDER BY priority, seq LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            job = Job(**json.loads(row[1]))
+            job.state = RUNNING
+            conn.execute(
+                "UPDATE jobs SET state = ?, data = ? WHERE id = ?",
+                (job.state, json.dumps(job.to_dict()), job.id),
+            )
+            conn.execute("COMMIT")
+            return job
+
+    def _save(self, job: Job) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, data = ? WHERE id = ?",
+                (job.state, json.dumps(job.to_dict()), job.id),
+            )
+
+    def _save_progress(self, job_id: str, progress: float) -> None:
+        with self._connect() as conn:
+            # A late update must not overwrite a job that has finished since
+            conn.execute(
+                "UPDATE jobs SET data = json_set(data, '$.progress', ?) WHERE id = ? AND state = ?",
+                (progress, job_id, RUNNING),
+            )
+
+    def _cancel(self, job_id: str) -> Optional[Job]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Only a queued job: a worker that took it first has marked it running
+            conn.execute(
+                "UPDATE jobs SET state = ?, data = json_set(data, '$.state', ?, '$.finished_at', ?)"
+                " WHERE id = ? AND state = ?",
+                (CANCELLED, CANCELLED, time.time(), job_id, QUEUED),
+            )
+            row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            conn.execute("COMMIT")
+        return Job(**json.loads(row[0])) if row else None
+
+    def _get(self, job_id: str) -> Optional[Job]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(**json.loads(row[0])) if row else None
+
+    def _expire(self, finished_before: float) -> List[Job]:
+        states = ",".join("?" * len(FINISHED_STATES))
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                f"SELECT id, data FROM jobs WHERE state IN ({states})"
+                " AND json_extract(data, '$.finished_at') < ?",
+                (*FINISHED_STATES, finished_before),
+            ).fetchall()
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(row[0],) for row in rows])
+            conn.execute("COMMIT")
+        return [Job(**json.loads(row[1])) for row in rows]
+
+    def _queued_count(self) -> int:
+        with self._connect() as conn:
+            (queued,) = conn.execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (QUEUED,)).fetchone()
+        return queued
+
+    async def put(self, job: Job) -> None:
+        await asyncio.to_thread(self._put, job)
+
+    async def take(self) -> Job:
+        while True:
+            job = await asyncio.to_thread(self._take)
+            if job is not None:
+                return job
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    async def save(self, job: Job) -> None:
+        await asyncio.to_thread(self._save, job)
+
+    async def save_progress(self, job_id: str, progress: float) -> None:
+        await asyncio.to_thread(self._save_progress, job_id, progress)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self._cancel, job_id)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def queued_count(self) -> int:
+        return await asyncio.to_thread(self._queued_count)
+
+    async def expire(self, finished_before: float) -> List[Job]:
+        return await asyncio.to_thread(self._expire, finished_before)
+
+
+# Job currently being executed by this task (lets tools report progress)
+_current_job: contextvars.ContextVar = contextvars.ContextVar("current_job", default=None)
+# Called with that job whenever it reports progress
+_progress_listener: contextvars.ContextVar = contextvars.ContextVar("progress_listener", default=None)
+
+
+def current_job() -> Optional[Job]:
+    """The job whose request is being handled in this context, if any"""
+    return _current_job.get()
+
+
+def report_progress(fraction: float) -> None:
+    """Record progress for the job running in the current context, if any"""
+    job = _current_job.get()
+    if job is not None:
+        job.progress = max(0.0, min(1.0, fraction))
+        listener: Optional[Callable[[Job], None]] = _progress_listener.get()
+        if listener is not None:
+            listener(job)
+
+
+def create_backend(name: str = JOB_BACKEND) -> JobBackend:
+    if name == "sqlite":
+        return SQLiteJobBackend()
+    return MemoryJobBackend()
+
+
+class JobManager:
+    """Owns the worker tasks that drain the job queue"""
+
+    def __init__(self, backend: Optional[JobBackend] = None, workers: int = JOB_WORKERS):
+        self.backend = backend or create_backend()
+        self.workers = workers
+        self._app = None
+        self._tasks: List[asyncio.Task] = []
+        # Running job id -> (time, progress) last persisted
+        self._saved_progress: Dict[str, Tuple[float, float]] = {}
+        self._progress_saves: Set[asyncio.Task] = set()
+
+    async def start(self, app) -> None:
+        os.makedirs(JOBS_UPLOAD_DIR, exist_ok=True)
+        os.makedirs(JOBS_RESULT_DIR, exist_ok=True)
+        self._app = app
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._expirer()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def new_job(self, route: str, priority: int = 0) -> Job:
+        job_id = uuid.uuid4().hex
+        return Job(
+            id=job_id,
+            route=route,
+            priority=priority,
+            request_path=f"{JOBS_UPLOAD_DIR}/{job_id}.body",
+        )
+
+    async def submit(self, job: Job) -> Job:
+        try:
+            await self.backend.put(job)
+        except QueueFull:
+            _remove(job.request_path)
+            raise
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.backend.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        job = await self.backend.cancel(job_id)
+        if job is not None and job.state == CANCELLED:
+            _remove(job.request_path)
+        return job
+
+    async def expire(self, now: Optional[float] = None) -> int:
+        """Forget jobs finished more than ``JOB_RESULT_TTL`` ago, with their results"""
+        expired = await self.backend.expire((now or time.time()) - JOB_RESULT_TTL)
+        for job in expired:
+            _remove(job.result_path)
+            if job.result_path and storage.store.remote:
+                await storage.store.delete(result_key(job))
+        return len(expired)
+
+    async def _expirer(self) -> None:
+        while True:
+            await asyncio.sleep(JOB_EXPIRE_INTERVAL)
+            try:
+                await self.expire()
+            except Exception as e:
+                print(f"Job expiry failed: {e}")
+
+    def _progress(self, job: Job) -> None:
+        """Persist a running job's progress, throttled, so every node can report it"""
+        saved_at, saved = self._saved_progress.get(job.id, (0.0, 0.0))
+        now = time.monotonic()
+        if now - saved_at < PROGRESS_SAVE_INTERVAL and job.progress - saved < PROGRESS_SAVE_STEP:
+            return
+        self._saved_progress[job.id] = (now, job.progress)
+        task = asyncio.ensure_future(self.backend.save_progress(job.id, job.progress))
+        self._progress_saves.add(task)
+        task.add_done_callback(self._progress_saved)
+
+    def _progress_saved(self, task: asyncio.Task) -> None:
+        self._progress_saves.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Saving job progress failed: {task.exception()}")
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.backend.take()
+            await self._run(job)
+
+    async def _run(self, job: Job) -> None:
+        job.started_at = time.time()
+        await self.backend.save(job)
+        metrics.observe_job_wait(job.route, job.started_at - job.created_at)
+
+        token = _current_job.set(job)
+        listener_token = _progress_listener.set(self._progress)
+        result_path = f"{JOBS_RESULT_DIR}/{job.id}.result"
+        try:
+            headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in job.request_headers]
+            status, response_headers = await call_app(
+                self._app, "POST", job.route, headers, job.request_path, result_path
+            )
+            job.status_code = status
+            job.result_path = result_path
+            job.result_headers = [
+                [name.decode("latin-1"), value.decode("latin-1")] for name, value in response_headers
+            ]
+            if status < 400:
+                if storage.store.remote:
+                    with stage("persist"):
+                        await storage.store.put_file(result_key(job), result_path)
+                job.state = SUCCEEDED
+            else:
+                job.state = FAILED
+                job.error = read_error(result_path)
+        except asyncio.CancelledError:
+            job.state = FAILED
+            job.error = "Job interrupted by shutdown"
+            raise
+        except Exception as e:
+            job.state = FAILED
+            job.error = str(e)
+        finally:
+            _current_job.reset(token)
+            _progress_listener.reset(listener_token)
+            self._saved_progress.pop(job.id, None)
+            job.progress = 1.0 if job.state == SUCCEEDED else job.progress
+            job.finished_at = time.time()
+            _remove(job.request_path)
+            await self.backend.save(job)
+
+
+def result_key(job: Job) -> str:
+    """Artifact store key of a job's result"""
+    return os.path.relpath(f"{JOBS_RESULT_DIR}/{job.id}.result", storage.SCRATCH_DIR)
+
+
+def read_error(path: str) -> str:
+    try:
+        with open(path, "rb") as f:
+            body = f.read(4096)
+        return json.loads(body).get("detail", body.decode("utf-8", "replace"))
+    except Exception:
+        return "Tool request failed"
+
+
+def _remove(path: Optional[str]) -> None:
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+
+manager = JobManager()
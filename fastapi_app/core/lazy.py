@@ -0,0 +1,146 @@
+"""Deferred imports for heavy optional libraries.
+
+PIL, pypdf, PyMuPDF, pdf2image and pytesseract take far longer to import
+than the rest of the app together, and most requests never touch them.  A
+router binds them as ``LazyModule`` proxies instead::
+
+    fitz = LazyModule("fitz")
+    HAS_PYMUPDF = fitz.available      # spec lookup only, nothing is executed
+    ...
+    doc = fitz.open(path)             # first attribute access imports fitz
+
+``available`` only asks the import system whether the module can be found,
+so capability flags stay cheap.  A module that is installed but fails to
+import raises on first use, inside the request that needed it.
+
+``preload()`` imports every available lazy module up front; with
+``PRELOAD_LIBRARIES=1`` the app runs it in the background after startup.
+CPU pool workers run it as part of their warm-up (see ``core.executor``).
+"""
+import importlib
+import importlib.util
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+PRELOAD_LIBRARIES = os.getenv("PRELOAD_LIBRARIES", "0") == "1"
+
+_registry: List["LazyModule"] = []
+
+
+class LazyModule:
+    """Module proxy that imports the first of ``names`` that exists on first use"""
+
+    def __init__(self, *names: str):
+        self._names = names
+        self._module = None
+        self._found: Optional[str] = None
+        self._searched = False
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        _registry.append(self)
+
+    @property
+    def name(self) -> str:
+        return self._found or self._names[0]
+
+    def _find(self) -> Optional[str]:
+        if not self._searched:
+            for name in self._names:
+                try:
+                    if importlib.util.find_spec(name) is not None:
+                        self._found = name
+                        break
+                except (ImportError, ValueError):
+                    continue
+            self._searched = True
+        return self._found
+
+    @property
+    def available(self) -> bool:
+        return self._find() is not None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    name = self._find()
+                    if name is None:
+                        raise ImportError(f"No module named {' or '.join(repr(n) for n in self._names)}")
+                    started = time.perf_counter()
+                    module = importlib.import_module(name)
+                    self.load_seconds = time.perf_counter() - started
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str):
+        # Only reached for names not set in __init__, i.e. the module's own
+        if attr.startswith("__") and attr.endswith("__"):
+            raise AttributeError(attr)
+        return getattr(self.load(), attr)
+
+    def attr(self, attr: str) -> "LazyAttribute":
+        """Stand-in for ``from module import attr``"""
+        return LazyAttribute(self, attr)
+
+    def __reduce__(self):
+        return (LazyModule, self._names)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyModule {self.name} ({state})>"
+
+
+class LazyAttribute:
+    """Callable stand-in for a class or function of a lazy module"""
+
+    def __init__(self, module: LazyModule, attr: str):
+        self._lazy_module = module
+        self._attr = attr
+
+    def resolve(self):
+        return getattr(self._lazy_module.load(), self._attr)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, attr: str):
+        if attr.startswith("__") and attr.endswith("__"):
+            raise AttributeError(attr)
+        return getattr(self.resolve(), attr)
+
+    def __reduce__(self):
+        return (LazyAttribute, (self._lazy_module, self._attr))
+
+
+def preload() -> Dict[str, float]:
+    """Import every available lazy module; returns seconds spent per module"""
+    timings = {}
+    for module in list(_registry):
+        if module.loaded or not module.available:
+            continue
+        try:
+            module.load()
+        except Exception as e:
+            print(f"Preloading {module.name} failed: {e}")
+            continue
+        timings[module.name] = module.load_seconds
+    return timings
+
+
+def modules() -> List[dict]:
+    """State of every lazy module, for the startup report"""
+    seen = {}
+    for module in _registry:
+        # The same library may be proxied by several routers
+        entry = seen.setdefault(module.name, {"module": module.name, "available": False, "loaded": False, "load_seconds": None})
+        entry["available"] = entry["available"] or module.available
+        entry["loaded"] = entry["loaded"] or module.loaded
+        if module.load_seconds is not None:
+            entry["load_seconds"] = round(module.load_seconds, 4)
+    return list(seen.values())
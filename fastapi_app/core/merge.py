@@ -0,0 +1,224 @@
+"""Streaming PDF merge.
+
+``merge`` writes the merged document as it reads the inputs, instead of
+loading every input and building the whole output in memory before saving:
+
+* inputs are memory-mapped spool files; all are opened up front (pypdf
+  reads just the cross-reference table), then copied one after another,
+  parsing only the objects a page actually uses
+* each page is copied with everything it references (contents, resources,
+  annotations) and written out straight away; copied objects are dropped
+  from the reader's cache, so memory follows the largest page, not the sum
+  of the inputs
+* every copied object is hashed after its references are renumbered, and
+  an object identical to one already written (the same font, logo or ICC
+  profile in fifty statements) is written once and shared
+* the page tree, catalog and cross-reference table go at the end, so the
+  output is written strictly forward and can be a pipe
+
+Document-level structures (outlines, forms, structure tree, metadata) are
+not carried over, as with a page-by-page ``PdfWriter`` merge.
+"""
+import hashlib
+import io
+import mmap
+import re
+import uuid
+from array import array
+from typing import BinaryIO, Dict, List, Optional, Set, Union
+
+from core.lazy import LazyModule
+from core.timing import stage
+
+pypdf = LazyModule("pypdf", "PyPDF2")
+generic = LazyModule("pypdf.generic", "PyPDF2.generic")
+
+# Page keys that are rebuilt (the page tree) or dropped (article beads)
+SKIPPED_PAGE_KEYS = {"/Parent", "/B"}
+VERSION_PATTERN = re.compile(rb"%PDF-(\d\.\d)")
+DEFAULT_VERSION = "1.4"
+
+
+class _Output:
+    """Forward-only object writer that remembers where each object went"""
+
+    def __init__(self, output: Union[str, BinaryIO]):
+        self._file = open(output, "wb") if isinstance(output, str) else None
+        self._out = self._file or output
+        self.position = 0
+        # Offset of object n at index n; -1 while it is reserved but not written
+        self.offsets = array("q", [0])
+
+    def write(self, data: bytes) -> None:
+        self._out.write(data)
+        self.position += len(data)
+
+    def reserve(self) -> int:
+        self.offsets.append(-1)
+        return len(self.offsets) - 1
+
+    def write_object(self, number: int, body: bytes) -> None:
+        self.offsets[number] = self.position
+        self.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+
+    def finish(self, root: int) -> None:
+        xref = self.position
+        self.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets))
+        for offset in self.offsets[1:]:
+            self.write(b"%010d 00000 n \n" % offset if offset >= 0 else b"0000000000 65535 f \n")
+        file_id = uuid.uuid4().hex.encode()
+        self.write(b"trailer\n<< /Size %d /Root %d 0 R /ID [<%s> <%s>] >>\nstartxref\n%d\n%%%%EOF\n"
+                   % (len(self.offsets), root, file_id, file_id, xref))
+        self._out.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+def serialize(obj) -> bytes:
+    buffer = io.BytesIO()
+    obj.write_to_stream(buffer)
+    return buffer.getvalue()
+
+
+class _Copier:
+    """Copies the pages of one input, sharing the dedup table with the others"""
+
+    def __init__(self, reader, output: _Output, dedup: Dict[bytes, int], pages_root: int):
+        self.reader = reader
+        self.output = output
+        self.dedup = dedup
+        self.pages_root = pages_root
+        self.copied: Dict[int, int] = {}
+        self.in_progress: Set[int] = set()
+        self.deduplicated = 0
+        # Pages are numbered up front: annotations and links point at other pages
+        self.page_numbers: Dict[int, int] = {}
+        for page in reader.pages:
+            if page.indirect_reference is not None and page.indirect_reference.idnum not in self.page_numbers:
+                self.page_numbers[page.indirect_reference.idnum] = output.reserve()
+
+    def _number(self, ref) -> Optional[int]:
+        """Output object number for an input reference, copying the object on first use"""
+        idnum = ref.idnum
+        if idnum in self.page_numbers:
+            return self.page_numbers[idnum]
+        if idnum in self.copied:
+            return self.copied[idnum]
+        if idnum in self.in_progress:
+            # A reference cycle: the object gets its number now and is not deduplicated
+            number = self.copied[idnum] = self.output.reserve()
+            return number
+
+        obj = ref.get_object()
+        if obj is None or (isinstance(obj, generic.DictionaryObject) and obj.get("/Type") == "/Pages"):
+            return None
+        self.in_progress.add(idnum)
+        try:
+            body = serialize(self._remap(obj))
+        finally:
+            self.in_progress.discard(idnum)
+        # Copied for good: the reader need not keep it (streams hold their data)
+        self.reader.resolved_objects.pop((ref.generation, idnum), None)
+
+        number = self.copied.get(idnum)
+        if number is None:
+            digest = hashlib.blake2b(body, digest_size=16).digest()
+            number = self.dedup.get(digest)
+            if number is not None:
+                self.deduplicated += 1
+                self.copied[idnum] = number
+                return number
+            number = self.dedup[digest] = self.copied[idnum] = self.output.reserve()
+        self.output.write_object(number, body)
+        return number
+
+    def _remap(self, value, skipped_keys=()):
+        if isinstance(value, generic.IndirectObject):
+            number = self._number(value)
+            return generic.NullObject() if number is None else generic.IndirectObject(number, 0, None)
+        if isinstance(value, generic.StreamObject):
+            copy = generic.StreamObject()
+            copy._data = value._data
+        elif isinstance(value, generic.DictionaryObject):
+            copy = generic.DictionaryObject()
+        elif isinstance(value, generic.ArrayObject):
+            return generic.ArrayObject(self._remap(item) for item in value)
+        else:
+            return value
+        for key, item in value.items():
+            if key not in skipped_keys:
+                copy[generic.NameObject(key)] = self._remap(item)
+        return copy
+
+    def copy_pages(self, kids: List[int]) -> None:
+        written = set()
+        for page in self.reader.pages:
+            ref = page.indirect_reference
+            number = self.page_numbers[ref.idnum] if ref is not None else self.output.reserve()
+            kids.append(number)
+            if number in written:
+                continue
+            written.add(number)
+            copy = self._remap(page, SKIPPED_PAGE_KEYS)
+            copy[generic.NameObject("/Parent")] = generic.IndirectObject(self.pages_root, 0, None)
+            self.output.write_object(number, serialize(copy))
+
+
+def map_pdf(path: str) -> mmap.mmap:
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def pdf_version(mapped: mmap.mmap) -> str:
+    found = VERSION_PATTERN.search(mapped[:1024])
+    return found.group(1).decode() if found else DEFAULT_VERSION
+
+
+def open_reader(mapped: mmap.mmap, action: str = "merged"):
+    with stage("decode"):
+        reader = pypdf.PdfReader(mapped)
+    if reader.is_encrypted and not reader.decrypt(""):
+        raise ValueError(f"Password-protected PDFs cannot be {action}; unlock them first")
+    return reader
+
+
+def merge(input_paths: List[str], output: Union[str, BinaryIO]) -> dict:
+    """Merge ``input_paths`` into ``output`` (a path or a writable stream), page by page"""
+    # Every input is mapped and parsed before the first byte goes out: a
+    # streamed response outlives the request's spool files, and a broken
+    # input should fail the request rather than truncate the output
+    maps: List[mmap.mmap] = []
+    out = None
+    try:
+        for path in input_paths:
+            maps.append(map_pdf(path))
+        readers = [open_reader(mapped) for mapped in maps]
+        out = _Output(output)
+        version = max((pdf_version(mapped) for mapped in maps), default=DEFAULT_VERSION)
+        out.write(b"%%PDF-%s\n%%\xe2\xe3\xcf\xd3\n" % version.encode())
+        catalog, pages_root = out.reserve(), out.reserve()
+
+        kids: List[int] = []
+        dedup: Dict[bytes, int] = {}
+        deduplicated = 0
+        for index, mapped in enumerate(maps):
+            copier = _Copier(readers[index], out, dedup, pages_root)
+            copier.copy_pages(kids)
+            deduplicated += copier.deduplicated
+            # Nothing may point into the map once it is closed
+            readers[index] = copier = None
+            mapped.close()
+
+        out.write_object(pages_root, b"<< /Type /Pages /Count %d /Kids [%s] >>"
+                         % (len(kids), b" ".join(b"%d 0 R" % kid for kid in kids)))
+        out.write_object(catalog, b"<< /Type /Catalog /Pages %d 0 R >>" % pages_root)
+        out.finish(catalog)
+    finally:
+        if out is not None:
+            out.close()
+        for mapped in maps:
+            if not mapped.closed:
+                mapped.close()
+    return {"pages": len(kids), "objects": len(out.offsets) - 1, "deduplicated_objects": deduplicated}
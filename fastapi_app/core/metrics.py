@@ -0,0 +1,368 @@
+"""Per-tool metrics in the Prometheus text exposition format.
+
+``MetricsMiddleware`` records, for every tool route: request and error
+counts, a latency histogram, request/response bytes and the number of
+requests in flight.  The executor adds the time tool work spent queued for a
+pool slot and the job manager adds job queue wait, both attributed to the
+tool through a context variable.
+
+Labels are tool ids derived from the registered tool routes
+(``/api/pdf/split`` -> ``pdf_split``); paths that do not match a route are
+not recorded, so cardinality is bounded by the size of the catalogue.
+
+``render()`` also exports process gauges (RSS, open fds, ffmpeg children)
+read from ``/proc`` and whatever collectors other subsystems register.
+Subsystems that want the individual requests (usage recording) register a
+listener and receive a ``ToolRequest`` per completed tool request.
+"""
+import contextvars
+import json
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+TOOL_PREFIXES = ("/api/pdf/", "/api/image/", "/api/audio/", "/api/government/", "/api/pipeline/")
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Tool id of the request being handled in this context, if any
+current_tool: contextvars.ContextVar = contextvars.ContextVar("current_tool", default=None)
+
+# (name, type, help, value) samples produced by a collector at scrape time
+Sample = Tuple[str, str, str, float]
+
+
+def tool_id(path: str) -> str:
+    """``/api/audio/pitch-shift`` -> ``audio_pitch_shift``"""
+    return path[len("/api/"):].strip("/").replace("/", "_").replace("-", "_")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ("tool",)):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def lines(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float], labels: Tuple[str, ...] = ("tool",)):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        # [count per bucket..., +Inf count, sum]
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def lines(self) -> List[str]:
+        lines = []
+        for key, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-2]}")
+        return lines
+
+
+REQUESTS = Counter("tool_requests_total", "Tool requests handled")
+ERRORS = Counter("tool_errors_total", "Tool requests answered with a 5xx status or an unhandled error")
+LATENCY = Histogram("tool_request_duration_seconds", "Tool request latency, including the response body", LATENCY_BUCKETS)
+INPUT_BYTES = Counter("tool_input_bytes_total", "Request body bytes received by tool routes")
+OUTPUT_BYTES = Counter("tool_output_bytes_total", "Response body bytes sent by tool routes")
+IN_FLIGHT = Gauge("tool_requests_in_flight", "Tool requests currently being handled")
+QUEUE_WAIT = Histogram("tool_queue_wait_seconds", "Time tool work waited for a pool slot", WAIT_BUCKETS)
+JOB_QUEUE_WAIT = Histogram("tool_job_queue_wait_seconds", "Time jobs waited in the job queue", WAIT_BUCKETS)
+ADMISSION_BUDGET = Gauge("tool_admission_budget", "Concurrency budget of a tool class, in weight units", labels=("tool_class",))
+ADMISSION_IN_USE = Gauge("tool_admission_in_use", "Weight units held by admitted requests", labels=("tool_class",))
+ADMISSION_QUEUED = Gauge("tool_admission_queued", "Requests waiting for admission", labels=("tool_class",))
+ADMISSION_WAIT = Histogram("tool_admission_wait_seconds", "Time requests waited for admission", WAIT_BUCKETS, labels=("tool_class",))
+ADMISSION_REJECTED = Counter(
+    "tool_admission_rejected_total", "Requests rejected with 429 by admission control", labels=("tool_class", "reason")
+)
+STAGE_SECONDS = Histogram("tool_stage_seconds", "Time tool requests spent per stage (see core.timing)", LATENCY_BUCKETS, labels=("tool", "stage"))
+WORKER_RECYCLES = Counter("tool_worker_recycles_total", "CPU pool replacements requested by a worker, by limit reached", labels=("reason",))
+OCR_PAGES = Counter("tool_ocr_pages_total", "PDF pages read by OCR, by where the text came from", labels=("source",))
+COMPRESS_IMAGES = Counter("tool_compress_images_total", "PDF images considered for recompression, by outcome", labels=("outcome",))
+BATCH_ITEMS = Counter("tool_batch_items_total", "Batch items processed, by outcome", labels=("tool", "state"))
+
+METRICS: List[Metric] = [
+    REQUESTS, ERRORS, LATENCY, INPUT_BYTES, OUTPUT_BYTES, IN_FLIGHT, QUEUE_WAIT, JOB_QUEUE_WAIT,
+    ADMISSION_BUDGET, ADMISSION_IN_USE, ADMISSION_QUEUED, ADMISSION_WAIT, ADMISSION_REJECTED, BATCH_ITEMS,
+    STAGE_SECONDS, WORKER_RECYCLES, OCR_PAGES, COMPRESS_IMAGES,
+]
+
+_collectors: List[Callable[[], Iterable[Sample]]] = []
+
+
+def register_collector(collect: Callable[[], Iterable[Sample]]) -> None:
+    """Add a callable returning ``(name, type, help, value)`` samples at scrape time"""
+    _collectors.append(collect)
+
+
+class ToolRequest:
+    """One completed tool request, as handed to listeners"""
+
+    __slots__ = ("tool", "status", "duration", "input_bytes", "output_bytes", "session_id", "error")
+
+    def __init__(self, tool: str, status: int, duration: float, input_bytes: int, output_bytes: int,
+                 session_id: Optional[str] = None, error: Optional[str] = None):
+        self.tool = tool
+        self.status = status
+        self.duration = duration
+        self.input_bytes = input_bytes
+        self.output_bytes = output_bytes
+        self.session_id = session_id
+        self.error = error
+
+    @property
+    def success(self) -> bool:
+        return self.status < 400
+
+
+_listeners: List[Callable[[ToolRequest], None]] = []
+
+
+def add_listener(listener: Callable[[ToolRequest], None]) -> None:
+    """Call ``listener`` after every tool request; it must not block"""
+    _listeners.append(listener)
+
+
+# Error bodies are JSON ``{"detail": ...}``; only the start is kept
+ERROR_BODY_LIMIT = 2048
+
+
+def _error_detail(body: bytes) -> Optional[str]:
+    if not body:
+        return None
+    try:
+        detail = json.loads(body).get("detail")
+        return detail if isinstance(detail, str) else json.dumps(detail)
+    except (ValueError, AttributeError):
+        return body.decode("utf-8", "replace")
+
+
+def observe_queue_wait(seconds: float) -> None:
+    tool = current_tool.get()
+    if tool is not None:
+        QUEUE_WAIT.observe(tool, value=max(0.0, seconds))
+
+
+def observe_job_wait(route: str, seconds: float) -> None:
+    JOB_QUEUE_WAIT.observe(tool_id(route), value=max(0.0, seconds))
+
+
+# Process gauges
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _open_fds() -> Optional[int]:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def _child_processes(name: str) -> Optional[int]:
+    """Count direct children of this process (or of its pool workers) called ``name``"""
+    try:
+        pids = [entry for entry in os.listdir("/proc") if entry.isdigit()]
+    except OSError:
+        return None
+
+    parents = {}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # comm is parenthesised and may contain spaces
+        comm = stat[stat.find("(") + 1:stat.rfind(")")]
+        fields = stat[stat.rfind(")") + 2:].split()
+        parents[int(pid)] = (comm, int(fields[1]))
+
+    own = {os.getpid()}
+    own.update(pid for pid, (_, ppid) in parents.items() if ppid == os.getpid())
+    return sum(1 for comm, ppid in parents.values() if comm == name and ppid in own)
+
+
+def _process_samples() -> Iterable[Sample]:
+    rss = rss_bytes()
+    if rss is not None:
+        yield "process_resident_memory_bytes", "gauge", "Resident memory of the API process", rss
+    fds = _open_fds()
+    if fds is not None:
+        yield "process_open_fds", "gauge", "Open file descriptors of the API process", fds
+    ffmpeg = _child_processes("ffmpeg")
+    if ffmpeg is not None:
+        yield "tool_ffmpeg_processes", "gauge", "Running ffmpeg child processes", ffmpeg
+
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.lines())
+
+    for collect in [_process_samples, *_collectors]:
+        for name, kind, help, value in collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Record per-tool request metrics around the rest of the stack"""
+
+    def __init__(self, app):
+        self.app = app
+        self._tools: Optional[Dict[str, str]] = None
+
+    def _tool_for(self, scope) -> Optional[str]:
+        if self._tools is None:
+            app = scope.get("app")
+            if app is None:
+                return None
+            # Tool routes have no path parameters, so an exact path lookup is enough
+            self._tools = {
+                route.path: tool_id(route.path)
+                for route in getattr(app, "routes", [])
+                if getattr(route, "path", "").startswith(TOOL_PREFIXES) and "{" not in route.path
+            }
+        return self._tools.get(scope["path"])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        tool = self._tool_for(scope)
+        if tool is None:
+            return await self.app(scope, receive, send)
+
+        status = None
+        received = sent = 0
+        error_body = b""
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, sent, error_body
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                sent += len(body)
+                if status is not None and status >= 400 and len(error_body) < ERROR_BODY_LIMIT:
+                    error_body += body[:ERROR_BODY_LIMIT - len(error_body)]
+            await send(message)
+
+        started = time.perf_counter()
+        IN_FLIGHT.inc(tool)
+        token = current_tool.set(tool)
+        error = None
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        except Exception as e:
+            status = status or 500
+            error = str(e)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            status = status or 500
+            current_tool.reset(token)
+            IN_FLIGHT.dec(tool)
+            REQUESTS.inc(tool)
+            if status >= 500:
+                ERRORS.inc(tool)
+            LATENCY.observe(tool, value=duration)
+            INPUT_BYTES.inc(tool, amount=received)
+            OUTPUT_BYTES.inc(tool, amount=sent)
+
+            if _listeners:
+                request = ToolRequest(
+                    tool, status, duration, received, sent,
+                    session_id=_header(scope, b"x-session-id"),
+                    error=error or (_error_detail(error_body) if status >= 400 else None),
+                )
+                for listener in _listeners:
+                    listener(request)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
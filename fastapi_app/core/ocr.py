@@ -0,0 +1,128 @@
+"""Page-parallel OCR of PDFs.
+
+Every page is a separate job on the CPU pool, so a long scan keeps all
+workers busy.  A worker opens the document, renders only its own page and
+OCRs it; no more than ``OCR_PAGE_CONCURRENCY`` pages of a request are in
+flight, so memory stays bounded by a few rendered pages whatever the page
+count.  ``ocr_pages`` yields the text page by page, in order, as soon as it
+is ready.
+
+A page that already has a text layer (``OCR_TEXT_LAYER_MIN_CHARS``
+characters or more) is extracted instead of rendered.  OCR results are kept
+under ``ocr_cache/``, keyed by a hash of what the page draws (content
+stream, images, fonts, geometry) plus DPI and language, so the same page in
+another upload (a re-sent file, a document with a cover page prepended) is
+not OCRed again.  The janitor expires them after ``OCR_CACHE_TTL_HOURS``.
+
+Without PyMuPDF pages are rendered by pdf2image and neither the text-layer
+check nor the page cache apply.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from collections import deque
+from typing import AsyncIterator, Optional, Tuple
+
+from core import engines, metrics
+from core.executor import CPU, CPU_WORKERS, cpu_bound, run_in_pool, run_tool
+from core.jobs import report_progress
+from core.timing import stage
+
+fitz = engines.fitz
+pdf2image = engines.pdf2image
+
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "ocr_cache")
+OCR_PAGE_CONCURRENCY = int(os.getenv("OCR_PAGE_CONCURRENCY", str(CPU_WORKERS)))
+OCR_TEXT_LAYER_MIN_CHARS = int(os.getenv("OCR_TEXT_LAYER_MIN_CHARS", "20"))
+
+
+def _page_key(doc, page, dpi: int, lang: str) -> str:
+    digest = hashlib.sha256(f"{dpi}:{lang}:{page.rotation}:{tuple(page.rect)}".encode())
+    digest.update(page.read_contents())
+    for xref, *_ in page.get_xobjects():
+        digest.update(doc.xref_stream_raw(xref) or b"")
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b"")
+    for font in page.get_fonts(full=True):
+        digest.update(repr(font[1:]).encode())
+    return digest.hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(OCR_CACHE_DIR, f"{key}.txt")
+
+
+def _cached(key: str) -> Optional[str]:
+    path = _cache_path(key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    # Keep pages that are still being hit away from the janitor
+    os.utime(path)
+    return text
+
+
+def _remember(key: str, text: str) -> None:
+    os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+    temp_path = os.path.join(OCR_CACHE_DIR, f".{key}.{uuid.uuid4().hex}.tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, _cache_path(key))
+
+
+@cpu_bound
+def ocr_page(input_path: str, index: int, dpi: int = engines.DEFAULT_DPI, lang: str = "eng") -> Tuple[str, str]:
+    """Text of one page and where it came from: ``text_layer``, ``cache`` or ``ocr``"""
+    if not (fitz.available and engines.Image.available):
+        with stage("decode"):
+            image, = pdf2image.convert_from_path(input_path, dpi=dpi, first_page=index + 1, last_page=index + 1)
+        return engines.ocr(image, lang), "ocr"
+
+    with stage("decode"):
+        doc = fitz.open(input_path)
+    with doc:
+        page = doc[index]
+        text = page.get_text()
+        if len(text.strip()) >= OCR_TEXT_LAYER_MIN_CHARS:
+            return text, "text_layer"
+
+        key = _page_key(doc, page, dpi, lang)
+        text = _cached(key)
+        if text is not None:
+            return text, "cache"
+
+        with stage("decode"):
+            image = engines.render_page(page, dpi)
+    text = engines.ocr(image, lang)
+    _remember(key, text)
+    return text, "ocr"
+
+
+async def ocr_pages(input_path: str, dpi: int = engines.DEFAULT_DPI, lang: str = "eng") -> AsyncIterator[Tuple[int, str]]:
+    """``(page number, text)`` for every page of a PDF, in page order"""
+    pages = await run_in_pool(CPU, engines.page_count, input_path)
+    in_flight = deque()
+    submitted = 0
+    try:
+        for number in range(1, pages + 1):
+            while submitted < pages and len(in_flight) < OCR_PAGE_CONCURRENCY:
+                in_flight.append(asyncio.ensure_future(run_tool(ocr_page, input_path, submitted, dpi, lang)))
+                submitted += 1
+            text, source = await in_flight.popleft()
+            metrics.OCR_PAGES.inc(source)
+            report_progress(number / pages)
+            yield number, text
+    finally:
+        # The client went away or a page failed: drop the pages not started yet
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+
+async def ocr_text(input_path: str, dpi: int = engines.DEFAULT_DPI, lang: str = "eng") -> AsyncIterator[str]:
+    """The OCR text file, one page at a time"""
+    async for number, text in ocr_pages(input_path, dpi, lang):
+        yield f"--- Page {number} ---\n{text}\n\n"
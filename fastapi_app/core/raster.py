@@ -0,0 +1,155 @@
+"""Parallel PDF rasteriser.
+
+The pages asked for are cut into runs of up to ``RASTER_RUN_PAGES``
+consecutive pages, and each run is rendered by a CPU pool worker with
+PyMuPDF (pdf2image when it is missing) and encoded there as PNG, JPEG or
+WebP.  Encoded pages come back to the event loop, which adds them to the
+archive in page order.  No more than ``RASTER_CONCURRENCY`` runs of a
+request are in flight, so memory is bounded by a few encoded pages per
+worker, never by the document.
+
+Thumbnail mode renders every page with its longer side ``thumbnail`` pixels
+long instead of at ``dpi``.
+"""
+import asyncio
+import io
+import math
+import os
+from collections import deque
+from typing import List, Optional, Tuple
+
+from core import engines
+from core.archive import ArchiveWriter
+from core.executor import CPU_WORKERS, IO, cpu_bound, run_in_pool, run_tool
+from core.jobs import report_progress
+from core.timing import stage
+
+fitz = engines.fitz
+pdf2image = engines.pdf2image
+
+# Format name: (file extension, Pillow format)
+FORMATS = {
+    "png": ("png", "PNG"),
+    "jpeg": ("jpg", "JPEG"),
+    "jpg": ("jpg", "JPEG"),
+    "webp": ("webp", "WEBP"),
+}
+MIN_DPI, MAX_DPI = 36, 600
+MAX_THUMBNAIL = 2048
+
+RASTER_CONCURRENCY = int(os.getenv("RASTER_CONCURRENCY", str(CPU_WORKERS)))
+RASTER_RUN_PAGES = int(os.getenv("RASTER_RUN_PAGES", "4"))
+
+
+def parse_ranges(spec: Optional[str], total: int) -> List[Tuple[int, int]]:
+    """1-based inclusive ``(first, last)`` ranges of a spec like ``"1-3,5,9-"``; the whole document when empty"""
+    if not spec or not spec.strip():
+        return [(1, total)]
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        start, dash, end = part.partition("-")
+        try:
+            first = int(start) if start.strip() else 1
+            last = (int(end) if end.strip() else total) if dash else first
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part!r}")
+        if not 1 <= first <= last <= total:
+            raise ValueError(f"Invalid page range: {part!r} (the document has {total} pages)")
+        ranges.append((first, last))
+    return ranges
+
+
+def parse_pages(spec: Optional[str], total: int) -> List[int]:
+    """0-based indices of the pages in a range spec, in order, without repeats"""
+    pages = []
+    seen = set()
+    for first, last in parse_ranges(spec, total):
+        for index in range(first - 1, last):
+            if index not in seen:
+                seen.add(index)
+                pages.append(index)
+    return pages
+
+
+def _runs(pages: List[int], size: int) -> List[List[int]]:
+    runs = []
+    for index in pages:
+        if runs and len(runs[-1]) < size and runs[-1][-1] == index - 1:
+            runs[-1].append(index)
+        else:
+            runs.append([index])
+    return runs
+
+
+def _encode(image, pil_format: str, quality: int) -> bytes:
+    output = io.BytesIO()
+    with stage("encode"):
+        if pil_format == "PNG":
+            image.save(output, pil_format, compress_level=6)
+        else:
+            image.save(output, pil_format, quality=quality)
+    return output.getvalue()
+
+
+def _render(page, dpi: int, thumbnail: Optional[int]):
+    if thumbnail:
+        zoom = thumbnail / max(page.rect.width, page.rect.height)
+    else:
+        zoom = dpi / 72
+    return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+
+
+@cpu_bound
+def render_run(input_path: str, pages: List[int], image_format: str, quality: int, dpi: int,
+               thumbnail: Optional[int] = None) -> List[bytes]:
+    """Encoded images of consecutive ``pages`` (0-based)"""
+    pil_format = FORMATS[image_format][1]
+    if not (fitz.available and engines.Image.available):
+        # ``size`` (pdftoppm -scale-to) picks each page's resolution from its
+        # size, as the zoom in ``_render`` does
+        with stage("decode"):
+            images = pdf2image.convert_from_path(input_path, dpi=dpi, size=thumbnail or None,
+                                                 first_page=pages[0] + 1, last_page=pages[-1] + 1)
+        return [_encode(image, pil_format, quality) for image in images]
+
+    with stage("decode"):
+        doc = fitz.open(input_path)
+    encoded = []
+    with doc:
+        for index in pages:
+            pixmap = _render(doc[index], dpi, thumbnail)
+            if pil_format == "PNG":
+                # MuPDF's own PNG writer skips the copy into Pillow
+                with stage("encode"):
+                    encoded.append(pixmap.tobytes("png"))
+            else:
+                image = engines.Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+                encoded.append(_encode(image, pil_format, quality))
+    return encoded
+
+
+async def rasterize(input_path: str, archive: ArchiveWriter, pages: List[int], image_format: str = "png",
+                    quality: int = 85, dpi: int = engines.DEFAULT_DPI, thumbnail: Optional[int] = None) -> None:
+    """Render ``pages`` (0-based) into ``archive`` as ``page_<n>.<ext>``"""
+    extension = FORMATS[image_format][0]
+    run_size = max(1, min(RASTER_RUN_PAGES, math.ceil(len(pages) / CPU_WORKERS)))
+    runs = _runs(pages, run_size)
+    in_flight = deque()
+    submitted = done = 0
+    try:
+        while submitted < len(runs) or in_flight:
+            while submitted < len(runs) and len(in_flight) < RASTER_CONCURRENCY:
+                run = runs[submitted]
+                task = asyncio.ensure_future(run_tool(render_run, input_path, run, image_format, quality, dpi, thumbnail))
+                in_flight.append((run, task))
+                submitted += 1
+            run, task = in_flight.popleft()
+            for index, data in zip(run, await task):
+                await run_in_pool(IO, archive.add_bytes, data, f"page_{index + 1}.{extension}")
+            done += len(run)
+            report_progress(done / len(pages))
+    finally:
+        for _, task in in_flight:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in in_flight), return_exceptions=True)
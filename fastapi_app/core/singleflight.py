@@ -0,0 +1,84 @@
+"""Single-flight coordination of identical in-flight work.
+
+The first caller for a key becomes the leader and does the work; callers
+arriving while it runs become followers and wait for the leader's result
+instead of repeating the work.
+
+A leader that fails, or goes away without a result, resolves its flight
+with ``None``.  Followers then go back to the start: one of them becomes
+the new leader and the others follow it, so an error is never handed to a
+request that did not cause it.  A follower that is cancelled while waiting
+only stops waiting; the leader and the other followers are unaffected.
+"""
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+
+
+class Flight:
+    def __init__(self, key: str):
+        self.key = key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.led = 0
+        self.shared = 0
+        self.failed = 0
+
+    def join(self, key: str) -> Tuple[Flight, bool]:
+        """The flight for ``key`` and whether the caller leads it"""
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.followers += 1
+            return flight, False
+        flight = self._flights[key] = Flight(key)
+        self.led += 1
+        return flight, True
+
+    def watch(self, key: str) -> Optional[Flight]:
+        """Follow ``key`` if it is in flight, without ever leading it"""
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.followers += 1
+        return flight
+
+    async def wait(self, flight: Flight) -> Optional[Any]:
+        """The leader's result, or None if the leader failed"""
+        try:
+            # shield: cancelling one follower must not cancel the shared future
+            result = await asyncio.shield(flight.future)
+        finally:
+            flight.followers -= 1
+        if result is not None:
+            self.shared += 1
+        return result
+
+    def complete(self, flight: Flight, result: Any) -> None:
+        self._resolve(flight, result)
+
+    def fail(self, flight: Flight) -> None:
+        if not flight.future.done():
+            self.failed += 1
+        self._resolve(flight, None)
+
+    def _resolve(self, flight: Flight, result: Optional[Any]) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        if not flight.future.done():
+            flight.future.set_result(result)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": sum(flight.followers for flight in self._flights.values()),
+            "led": self.led,
+            "shared": self.shared,
+            "failed_leaders": self.failed,
+        }
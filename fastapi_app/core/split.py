@@ -0,0 +1,246 @@
+"""Single-pass PDF split into many parts.
+
+``split_parts`` opens the input once (memory-mapped, see ``core.merge``) and
+writes every part straight into its own entry of a ZIP, so the archive can
+go out while later parts are still being written.  ``split_range`` writes a
+single part.
+
+Parts keep the input's object numbers.  An object is therefore the same
+bytes in every part it appears in: it is parsed and serialised once, and
+later parts reuse the bytes.  The bytes are held in an LRU of up to
+``SPLIT_SHARED_CACHE_MB``; an object that has been evicted is parsed again
+from the mapped input.  Each part's cross-reference table lists only the
+objects it contains.
+
+Every part gets a new page tree and catalog.  References that lead outside
+the part (a link to a page of another part, the input's page tree) become
+null, so following them never drags the rest of the document in; the few
+objects holding such references (link annotations, destinations) are
+written afresh for each part.  Document-level structures (outlines, forms,
+structure tree, metadata) are not carried over, as with ``merge``.
+"""
+import os
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from core import merge
+from core.archive import ArchiveWriter
+from core.executor import cpu_bound
+from core.timing import stage
+
+generic = merge.generic
+
+SPLIT_SHARED_CACHE_MB = int(os.getenv("SPLIT_SHARED_CACHE_MB", "256"))
+
+
+
+def every_n_pages(every: int, total: int) -> List[Tuple[int, int]]:
+    """1-based inclusive ``(first, last)`` ranges of ``every`` pages each"""
+    if every < 1:
+        raise ValueError("Pages per part must be at least 1")
+    return [(first, min(first + every - 1, total)) for first in range(1, total + 1, every)]
+
+
+def part_name(stem: str, first: int, last: int) -> str:
+    return f"{stem}_page_{first}.pdf" if first == last else f"{stem}_pages_{first}-{last}.pdf"
+
+
+def _references(value, found: List) -> List:
+    if isinstance(value, generic.IndirectObject):
+        found.append(value)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _references(item, found)
+    elif isinstance(value, list):
+        for item in value:
+            _references(item, found)
+    return found
+
+
+class _Part:
+    """Forward-only writer of one part, with the input's object numbers"""
+
+    def __init__(self, output: BinaryIO):
+        self._out = output
+        self.position = 0
+        # Object number: (offset, generation)
+        self.offsets: Dict[int, Tuple[int, int]] = {}
+
+    def write(self, data: bytes) -> None:
+        self._out.write(data)
+        self.position += len(data)
+
+    def write_object(self, number: int, generation: int, body: bytes) -> None:
+        self.offsets[number] = (self.position, generation)
+        self.write(b"%d %d obj\n%s\nendobj\n" % (number, generation, body))
+
+    def finish(self, root: int) -> None:
+        xref = self.position
+        numbers = sorted(self.offsets)
+        # One subsection per run of consecutive numbers, after the free head of the list
+        lines = [b"xref\n0 1\n0000000000 65535 f \n"]
+        start = 0
+        for index, number in enumerate(numbers):
+            if index + 1 == len(numbers) or numbers[index + 1] != number + 1:
+                run = numbers[start:index + 1]
+                lines.append(b"%d %d\n" % (run[0], len(run)))
+                lines.extend(b"%010d %05d n \n" % self.offsets[n] for n in run)
+                start = index + 1
+        self.write(b"".join(lines))
+        self.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (numbers[-1] + 1, root, xref))
+        self._out.flush()
+
+
+class _Splitter:
+    """Writes parts of one reader, sharing serialised objects between them"""
+
+    def __init__(self, reader, version: str):
+        self.reader = reader
+        self.version = version
+        self.page_refs = [page.indirect_reference for page in reader.pages]
+        self.page_numbers: Set[int] = {ref.idnum for ref in self.page_refs}
+        # The catalog and page tree nodes: parts get their own
+        self.structure: Set[int] = set()
+        self._collect_structure(reader.trailer.raw_get("/Root"))
+        # Numbers past the input's are free for each part's page tree and catalog
+        self.free_number = max(int(reader.trailer.get("/Size", 0)),
+                               max(self.page_numbers | self.structure, default=0) + 1)
+        # Object number: (generation, body, references, object); the parsed
+        # object is only kept when it refers to pages or the page tree
+        self._shared: "OrderedDict[int, Tuple[int, bytes, List, object]]" = OrderedDict()
+        self._shared_bytes = 0
+        self._shared_limit = SPLIT_SHARED_CACHE_MB * 1024 * 1024
+        self.reused = 0
+
+    def _collect_structure(self, ref) -> None:
+        while isinstance(ref, generic.IndirectObject) and ref.idnum not in self.structure:
+            self.structure.add(ref.idnum)
+            node = ref.get_object()
+            if node.get("/Type") == "/Catalog":
+                ref = node.raw_get("/Pages")
+            elif node.get("/Type") == "/Pages":
+                for kid in node.get("/Kids", []):
+                    if getattr(kid, "idnum", None) not in self.page_numbers:
+                        self._collect_structure(kid)
+                return
+            else:
+                return
+
+    def _object(self, ref) -> Tuple[int, bytes, List, object]:
+        if ref.idnum in self._shared:
+            self._shared.move_to_end(ref.idnum)
+            self.reused += 1
+            return self._shared[ref.idnum]
+
+        obj = ref.get_object()
+        references = _references(obj, [])
+        outside = any(item.idnum in self.page_numbers or item.idnum in self.structure for item in references)
+        entry = (ref.generation, merge.serialize(obj), references, obj if outside else None)
+        # The bytes stand in for the parsed object from now on
+        self.reader.resolved_objects.pop((ref.generation, ref.idnum), None)
+
+        size = len(entry[1])
+        if size <= self._shared_limit:
+            self._shared[ref.idnum] = entry
+            self._shared_bytes += size
+            while self._shared_bytes > self._shared_limit:
+                _, evicted = self._shared.popitem(last=False)
+                self._shared_bytes -= len(evicted[1])
+        return entry
+
+    def _within(self, value, included: Set[int]):
+        """``value`` with references to pages not in ``included`` and to the page tree made null"""
+        if isinstance(value, generic.IndirectObject):
+            if value.idnum in self.structure or (value.idnum in self.page_numbers and value.idnum not in included):
+                return generic.NullObject()
+            return value
+        if isinstance(value, generic.StreamObject):
+            copy = generic.StreamObject()
+            copy._data = value._data
+        elif isinstance(value, generic.DictionaryObject):
+            copy = generic.DictionaryObject()
+        elif isinstance(value, generic.ArrayObject):
+            return generic.ArrayObject(self._within(item, included) for item in value)
+        else:
+            return value
+        for key, item in value.items():
+            copy[generic.NameObject(key)] = self._within(item, included)
+        return copy
+
+    def write_part(self, pages: List[int], output: BinaryIO) -> None:
+        """Write the pages at ``pages`` (0-based) as a PDF of their own"""
+        part = _Part(output)
+        part.write(b"%%PDF-%s\n%%\xe2\xe3\xcf\xd3\n" % self.version.encode())
+        pages_root, catalog = self.free_number, self.free_number + 1
+
+        kids: List[int] = []
+        pending: List = []
+        included = {self.page_refs[index].idnum for index in pages}
+        seen: Set[int] = set()
+        for index in pages:
+            ref = self.page_refs[index]
+            if ref.idnum in seen:
+                continue
+            seen.add(ref.idnum)
+            kids.append(ref.idnum)
+            # The reader's page carries the attributes it inherits from the page tree
+            page = self.reader.pages[index]
+            copy = generic.DictionaryObject()
+            for key, value in page.items():
+                if key not in merge.SKIPPED_PAGE_KEYS:
+                    copy[generic.NameObject(key)] = self._within(value, included)
+            copy[generic.NameObject("/Parent")] = generic.IndirectObject(pages_root, 0, None)
+            part.write_object(ref.idnum, ref.generation, merge.serialize(copy))
+            _references(copy, pending)
+
+        while pending:
+            ref = pending.pop()
+            if (ref.idnum in seen or ref.idnum in self.page_numbers or ref.idnum in self.structure
+                    or ref.idnum >= self.free_number):
+                continue
+            seen.add(ref.idnum)
+            generation, body, references, obj = self._object(ref)
+            if obj is not None:
+                body = merge.serialize(self._within(obj, included))
+            part.write_object(ref.idnum, generation, body)
+            pending.extend(references)
+
+        part.write_object(pages_root, 0, b"<< /Type /Pages /Count %d /Kids [%s] >>"
+                          % (len(kids), b" ".join(b"%d %d R" % (kid, part.offsets[kid][1]) for kid in kids)))
+        part.write_object(catalog, 0, b"<< /Type /Catalog /Pages %d 0 R >>" % pages_root)
+        part.finish(catalog)
+
+
+@contextmanager
+def _open(input_path: str) -> Iterator[_Splitter]:
+    mapped = merge.map_pdf(input_path)
+    try:
+        yield _Splitter(merge.open_reader(mapped, "split"), merge.pdf_version(mapped))
+    finally:
+        mapped.close()
+
+
+@cpu_bound
+def split_range(input_path: str, output: Union[str, BinaryIO], first: int, last: Optional[int] = None) -> int:
+    """Write pages ``first`` to ``last`` (1-based, inclusive; the end when None); returns ``last``"""
+    with _open(input_path) as splitter:
+        total = len(splitter.page_refs)
+        requested = f"{first}-{'' if last is None else last}"
+        last = total if last is None else last
+        if first < 1 or last > total or first > last:
+            raise ValueError(f"Invalid page range: {requested!r} (the document has {total} pages)")
+        with (open(output, "wb") if isinstance(output, str) else nullcontext(output)) as f, stage("encode"):
+            splitter.write_part(list(range(first - 1, last)), f)
+    return last
+
+
+@cpu_bound
+def split_parts(input_path: str, output: Union[str, BinaryIO], parts: List[Tuple[int, int]],
+                names: List[str]) -> dict:
+    """Write each 1-based inclusive ``(first, last)`` range of pages to ``output``, a ZIP, as ``names``"""
+    with _open(input_path) as splitter, ArchiveWriter(output) as archive:
+        for (first, last), name in zip(parts, names):
+            with archive.open(name) as entry, stage("encode"):
+                splitter.write_part(list(range(first - 1, last)), entry)
+        return {"parts": len(parts), "shared_objects": splitter.reused}
@@ -0,0 +1,152 @@
+"""Startup timing report.
+
+Breaks the time from process start to the first served request into phases
+(interpreter start, imports, app setup, startup hooks, waiting for the first
+request) and lists what the heavy libraries cost when they were first
+loaded (see ``core.lazy``).  Served at ``/api/startup/stats`` and printed
+once the first request has been answered.
+
+With ``STARTUP_PROFILE_IMPORTS=1`` every module imported after this one is
+timed as well, and the report includes the slowest ones by self time
+(inclusive time minus the time of the imports it triggered).  Import this
+module first so the profiler sees the rest of the app.
+"""
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core import lazy
+
+STARTUP_PROFILE_IMPORTS = os.getenv("STARTUP_PROFILE_IMPORTS", "0") == "1"
+SLOWEST_IMPORTS = int(os.getenv("STARTUP_SLOWEST_IMPORTS", "25"))
+
+
+def _process_started() -> float:
+    """Wall-clock start of this process, from /proc when available"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name; starttime is field 22 overall
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+PROCESS_STARTED = _process_started()
+IMPORTED_AT = time.time()
+
+# (phase name, wall-clock time it ended, modules loaded when it ended)
+_marks: List[Tuple[str, float, int]] = [("interpreter", IMPORTED_AT, len(sys.modules))]
+_reported = False
+
+
+def mark(phase: str) -> None:
+    """Close ``phase``: it covers the time since the previous mark"""
+    _marks.append((phase, time.time(), len(sys.modules)))
+
+
+class _ImportProfiler:
+    """Times ``import`` statements through the ``__import__`` hook"""
+
+    def __init__(self):
+        self.inclusive: Dict[str, float] = {}
+        self.own: Dict[str, float] = {}
+        # Per thread: the preload thread may import while the loop thread does
+        self._local = threading.local()
+        self._original = None
+
+    def install(self) -> None:
+        import builtins
+
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+        stack = self._local.__dict__.setdefault("stack", [])
+        # [time spent in nested first imports]
+        stack.append([0.0])
+        started = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = stack.pop()[0]
+            if stack:
+                stack[-1][0] += elapsed
+            self.inclusive[name] = self.inclusive.get(name, 0.0) + elapsed
+            self.own[name] = self.own.get(name, 0.0) + elapsed - nested
+
+    def slowest(self, limit: int) -> List[dict]:
+        ranked = sorted(self.own.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [
+            {"module": name, "self_seconds": round(own, 4), "inclusive_seconds": round(self.inclusive[name], 4)}
+            for name, own in ranked
+        ]
+
+
+_profiler: Optional[_ImportProfiler] = None
+if STARTUP_PROFILE_IMPORTS:
+    _profiler = _ImportProfiler()
+    _profiler.install()
+
+
+def report() -> dict:
+    phases = []
+    previous = PROCESS_STARTED
+    previous_modules = 0
+    for name, ended, module_count in _marks:
+        phases.append({
+            "phase": name,
+            "seconds": round(ended - previous, 4),
+            "modules_loaded": module_count - previous_modules,
+        })
+        previous, previous_modules = ended, module_count
+
+    finished = dict((name, ended) for name, ended, _ in _marks)
+    return {
+        "process_started": PROCESS_STARTED,
+        "ready_seconds": round(finished["startup"] - PROCESS_STARTED, 4) if "startup" in finished else None,
+        "first_request_seconds": (
+            round(finished["first request"] - PROCESS_STARTED, 4) if "first request" in finished else None
+        ),
+        "phases": phases,
+        "modules_in_process": len(sys.modules),
+        "lazy_modules": lazy.modules(),
+        "slowest_imports": _profiler.slowest(SLOWEST_IMPORTS) if _profiler else None,
+    }
+
+
+def _print_report() -> None:
+    data = report()
+    summary = ", ".join(f"{phase['phase']} {phase['seconds']:.3f}s" for phase in data["phases"])
+    print(f"Startup: first request served {data['first_request_seconds']:.3f}s after process start ({summary})")
+    loaded = [m for m in data["lazy_modules"] if m["load_seconds"] is not None]
+    if loaded:
+        print("Startup: lazy imports " + ", ".join(f"{m['module']} {m['load_seconds']:.3f}s" for m in loaded))
+    for entry in (data["slowest_imports"] or [])[:10]:
+        print(f"Startup: import {entry['module']} {entry['self_seconds']:.3f}s self, {entry['inclusive_seconds']:.3f}s total")
+
+
+class FirstRequestMiddleware:
+    """Marks the end of the first HTTP request and prints the report"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _reported
+        if _reported or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if not _reported:
+                _reported = True
+                mark("first request")
+                _print_report()
@@ -0,0 +1,384 @@
+"""Artifact storage behind ``/downloads``.
+
+Tools keep writing their outputs to the local ``downloads/`` directory,
+which is scratch space on the node that ran them.  What clients download
+is served from an ``ArtifactStore`` chosen with ``STORAGE_BACKEND``:
+
+``local``   the ``downloads/`` directory itself (single node, the default)
+``memory``  a dict, for tests
+``s3``      any S3-compatible bucket (AWS, MinIO, a local stand-in), so
+            every node behind a load balancer serves every result
+
+``PublishMiddleware`` copies the artifact named by a tool's JSON
+``download_url`` into the store before the response leaves, and signs the
+URL when ``DOWNLOAD_SIGNING_KEY`` is set.  Job results are copied in by
+``core.jobs`` under ``jobs/``.  Tools that answer with the file itself
+(split, compress, to-images, OCR and the other ``FileResponse`` and
+streamed outputs) hand the client the bytes directly and store nothing;
+their cached copies stay local to each node.  A signed URL carries
+``?token=<expires>.<hmac>`` and stops working after
+``DOWNLOAD_TOKEN_TTL_SECONDS``; with ``DOWNLOAD_REQUIRE_TOKEN=1`` unsigned
+downloads are refused.  All nodes must share the key.
+
+The scratch copies are still swept by the janitor.  Artifacts in a remote
+bucket are not: expire them with a bucket lifecycle rule.
+"""
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import aiofiles
+
+from core import metrics
+from core.executor import IO, io_bound, run_in_pool, run_tool
+from core.lazy import LazyModule
+from core.timing import stage
+
+boto3 = LazyModule("boto3")
+
+CHUNK_SIZE = 1024 * 1024
+SCRATCH_DIR = "downloads"
+URL_PREFIX = "/downloads/"
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+S3_BUCKET = os.getenv("STORAGE_S3_BUCKET", "")
+S3_PREFIX = os.getenv("STORAGE_S3_PREFIX", "downloads/")
+# Set for S3-compatible services other than AWS, e.g. http://localhost:9000
+S3_ENDPOINT = os.getenv("STORAGE_S3_ENDPOINT") or None
+S3_PART_SIZE = int(os.getenv("STORAGE_S3_PART_MB", "8")) * 1024 * 1024
+
+SIGNING_KEY = os.getenv("DOWNLOAD_SIGNING_KEY", "")
+TOKEN_TTL = int(os.getenv("DOWNLOAD_TOKEN_TTL_SECONDS", "3600"))
+REQUIRE_TOKEN = os.getenv("DOWNLOAD_REQUIRE_TOKEN", "0") == "1"
+
+
+def _check_key(key: str) -> str:
+    parts = key.split("/")
+    if not key or key.startswith("/") or any(part in ("", ".", "..") for part in parts):
+        raise ValueError(f"Invalid artifact key: {key!r}")
+    return key
+
+
+class ArtifactStore:
+    """Where downloadable artifacts live; keys are paths relative to ``/downloads/``"""
+
+    # True when artifacts must be copied off the node that produced them
+    remote = True
+
+    async def put_file(self, key: str, path: str) -> int:
+        """Store the file at ``path``; returns its size"""
+        async def chunks():
+            async with aiofiles.open(path, "rb") as f:
+                while True:
+                    chunk = await f.read(CHUNK_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+        return await self.put_stream(key, chunks())
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        raise NotImplementedError
+
+    async def size(self, key: str) -> Optional[int]:
+        """Size in bytes, or None if there is no such artifact"""
+        raise NotImplementedError
+
+    def get(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Bytes ``start`` up to (not including) ``end`` of an artifact, in chunks"""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class LocalStore(ArtifactStore):
+    remote = False
+
+    def __init__(self, root: str = SCRATCH_DIR):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, _check_key(key))
+
+    async def put_file(self, key: str, path: str) -> int:
+        target = self.path(key)
+        if os.path.abspath(path) != os.path.abspath(target):
+            await run_tool(_link_or_copy, path, target)
+        return os.path.getsize(target)
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = f"{target}.{uuid.uuid4().hex}.part"
+        size = 0
+        try:
+            async with aiofiles.open(partial, "wb") as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+                    size += len(chunk)
+            os.replace(partial, target)
+        finally:
+            if os.path.exists(partial):
+                os.unlink(partial)
+        return size
+
+    async def size(self, key: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path(key))
+        except OSError:
+            return None
+
+    async def get(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        async with aiofiles.open(self.path(key), "rb") as f:
+            await f.seek(start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                chunk = await f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def delete(self, key: str) -> None:
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+class MemoryStore(ArtifactStore):
+    def __init__(self):
+        self.objects: Dict[str, bytes] = {}
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        data = bytearray()
+        async for chunk in chunks:
+            data += chunk
+        self.objects[_check_key(key)] = bytes(data)
+        return len(data)
+
+    async def size(self, key: str) -> Optional[int]:
+        data = self.objects.get(key)
+        return None if data is None else len(data)
+
+    async def get(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        data = self.objects[key]
+        end = len(data) if end is None else end
+        for offset in range(start, end, CHUNK_SIZE):
+            yield data[offset:min(offset + CHUNK_SIZE, end)]
+
+    async def delete(self, key: str) -> None:
+        self.objects.pop(key, None)
+
+
+class S3Store(ArtifactStore):
+    """S3-compatible bucket; boto3 calls run on the I/O pool"""
+
+    def __init__(self, bucket: str, prefix: str = S3_PREFIX, endpoint_url: Optional[str] = S3_ENDPOINT):
+        if not bucket:
+            raise ValueError("STORAGE_S3_BUCKET is required for the s3 storage backend")
+        if not boto3.available:
+            raise ValueError("The s3 storage backend needs boto3")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Credentials and region come from the usual AWS_* settings
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url)
+        return self._client
+
+    def _object(self, key: str) -> str:
+        return self.prefix + _check_key(key)
+
+    async def put_file(self, key: str, path: str) -> int:
+        # boto3 switches to a parallel multipart upload for large files
+        await run_in_pool(IO, self.client.upload_file, path, self.bucket, self._object(key))
+        return os.path.getsize(path)
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        name = self._object(key)
+        upload = await run_in_pool(IO, self.client.create_multipart_upload, Bucket=self.bucket, Key=name)
+        upload_id = upload["UploadId"]
+        parts = []
+        buffer = bytearray()
+        size = 0
+
+        async def flush():
+            number = len(parts) + 1
+            part = await run_in_pool(IO, self.client.upload_part, Bucket=self.bucket, Key=name,
+                                     UploadId=upload_id, PartNumber=number, Body=bytes(buffer))
+            parts.append({"ETag": part["ETag"], "PartNumber": number})
+            buffer.clear()
+
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                if len(buffer) >= S3_PART_SIZE:
+                    await flush()
+            # Only the last part may be smaller than the minimum, and at least one is needed
+            if buffer or not parts:
+                await flush()
+            await run_in_pool(IO, self.client.complete_multipart_upload, Bucket=self.bucket, Key=name,
+                              UploadId=upload_id, MultipartUpload={"Parts": parts})
+        except BaseException:
+            await run_in_pool(IO, self.client.abort_multipart_upload, Bucket=self.bucket, Key=name, UploadId=upload_id)
+            raise
+        return size
+
+    async def size(self, key: str) -> Optional[int]:
+        try:
+            head = await run_in_pool(IO, self.client.head_object, Bucket=self.bucket, Key=self._object(key))
+        except self.client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return head["ContentLength"]
+
+    async def get(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        byte_range = f"bytes={start}-" + ("" if end is None else str(end - 1))
+        response = await run_in_pool(IO, self.client.get_object, Bucket=self.bucket, Key=self._object(key), Range=byte_range)
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await run_in_pool(IO, body.read, CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, key: str) -> None:
+        await run_in_pool(IO, self.client.delete_object, Bucket=self.bucket, Key=self._object(key))
+
+
+@io_bound
+def _link_or_copy(source_path: str, target: str) -> None:
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source_path, target)
+    except FileExistsError:
+        os.unlink(target)
+        os.link(source_path, target)
+    except OSError:
+        shutil.copyfile(source_path, target)
+
+
+def create_store(backend: str = STORAGE_BACKEND) -> ArtifactStore:
+    if backend == "local":
+        return LocalStore()
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "s3":
+        return S3Store(S3_BUCKET)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+store = create_store()
+
+
+# Download tokens
+
+def _signature(key: str, expires: int) -> str:
+    return hmac.new(SIGNING_KEY.encode(), f"{key}\n{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def sign(key: str, ttl: int = TOKEN_TTL) -> str:
+    expires = int(time.time()) + ttl
+    return f"{expires}.{_signature(key, expires)}"
+
+
+def verify(key: str, token: Optional[str]) -> bool:
+    if not SIGNING_KEY or not token:
+        return False
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(key, int(expires)))
+
+
+def download_url(key: str) -> str:
+    """URL clients should use for an artifact, signed when a signing key is configured"""
+    url = URL_PREFIX + key
+    return f"{url}?token={sign(key)}" if SIGNING_KEY else url
+
+
+def parse_range(header: str, size: int) -> Tuple[int, int]:
+    """``Range: bytes=a-b`` -> (start, end exclusive); ValueError if it cannot be satisfied"""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError("Only a single byte range is supported")
+    first, _, last = spec.strip().partition("-")
+    if first:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    else:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size
+    if start >= end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class PublishMiddleware:
+    """Copy the artifact a tool response points at into the store, and sign its URL"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not scope["path"].startswith(metrics.TOOL_PREFIXES)
+                or not (store.remote or SIGNING_KEY)):
+            return await self.app(scope, receive, send)
+
+        start = None
+        body = bytearray()
+
+        async def publishing_send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                if content_type.startswith(b"application/json"):
+                    # Held back until the body is known
+                    start = message
+                    return
+            elif start is not None and message["type"] == "http.response.body":
+                body.extend(message.get("body", b""))
+                if message.get("more_body"):
+                    return
+                return await self._send_published(send, start, bytes(body))
+            await send(message)
+
+        await self.app(scope, receive, publishing_send)
+
+    async def _send_published(self, send, start: dict, body: bytes):
+        status = start["status"]
+        try:
+            payload = json.loads(body) if status < 400 else None
+            url = payload.get("download_url") if isinstance(payload, dict) else None
+            if isinstance(url, str) and url.startswith(URL_PREFIX):
+                key = url[len(URL_PREFIX):].partition("?")[0]
+                if store.remote and await store.size(key) is None:
+                    with stage("persist"):
+                        await store.put_file(key, os.path.join(SCRATCH_DIR, _check_key(key)))
+                payload["download_url"] = download_url(key)
+                # Encoded the way JSONResponse does
+                body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        except Exception as e:
+            status = 500
+            body = json.dumps({"detail": f"Error storing result: {str(e)}"}).encode()
+
+        headers = [(name, value) for name, value in start.get("headers", []) if name != b"content-length"]
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
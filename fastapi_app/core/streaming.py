@@ -0,0 +1,330 @@
+"""Streaming response mode.
+
+By default a tool writes its output under ``downloads/`` and the handler
+answers with a ``FileResponse`` or a JSON body pointing at the file.  A
+client that just wants the bytes can ask for them inline with
+``X-Response-Mode: stream`` (or ``?response_mode=stream``).  The encoder
+(``PdfWriter.write``, PIL ``save``, ffmpeg's stdout) then writes into a pipe
+that feeds a chunked ``StreamingResponse``, so nothing is written to disk and
+the first bytes go out while the rest is still being encoded.
+
+Tool functions run in pool processes, so the pipe is a named FIFO: the worker
+writes to it like a file and the event loop reads the other end without
+blocking.  Output produced on the event loop itself (OCR text, page by
+page) goes through ``stream_chunks`` instead.
+
+The response is held back until the first chunk is ready.  A tool that fails
+before writing anything (wrong password, bad page range) therefore still
+gets a normal error status; a failure after that aborts the transfer.
+"""
+import asyncio
+import io
+import mimetypes
+import os
+import tempfile
+import uuid
+from collections import deque
+from typing import AsyncIterator, Callable, List, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from core.executor import IO, run_in_pool
+
+CHUNK_SIZE = 256 * 1024
+
+MODE_HEADER = "x-response-mode"
+MODE_PARAM = "response_mode"
+STREAM = "stream"
+
+# Stands in for a tool function's output argument; replaced by the pipe in the worker
+STREAM_OUTPUT = "<stream-output>"
+
+# Formats whose writers seek back into the output and cannot go through a pipe
+SEEKING_FORMATS = {"tif", "tiff"}
+
+FIFO_DIR = os.getenv("STREAM_FIFO_DIR", tempfile.gettempdir())
+
+# FIFO ends held by the event loop.  A pool worker forked while a stream is
+# open would inherit them and keep the FIFO alive (no EOF for us, no EPIPE
+# for the writer), so forked children close them straight away.
+_open_fds = set()
+
+
+def _close_inherited_fds() -> None:
+    for fd in _open_fds:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+    _open_fds.clear()
+
+
+os.register_at_fork(after_in_child=_close_inherited_fds)
+
+
+def _open(path: str, flags: int) -> int:
+    fd = os.open(path, flags)
+    _open_fds.add(fd)
+    return fd
+
+
+def _close(fd: int) -> None:
+    _open_fds.discard(fd)
+    os.close(fd)
+
+
+def stream_requested(request: Request) -> bool:
+    """Dependency: True when the client asked for the output bytes inline"""
+    mode = request.headers.get(MODE_HEADER) or request.query_params.get(MODE_PARAM) or ""
+    return mode.lower() == STREAM
+
+
+def streamable(filename: str) -> bool:
+    return filename.rsplit(".", 1)[-1].lower() not in SEEKING_FORMATS
+
+
+class StreamWriter:
+    """Write-only binary stream over the pipe, as seen by an encoder.
+
+    Keeps its own position because pypdf and PyMuPDF record object offsets
+    with ``tell()``, and carries ``name`` so PIL picks the format from the
+    output filename just as it does for a path.
+    """
+
+    def __init__(self, raw, name: str):
+        self._raw = raw
+        self.name = name
+        self._position = 0
+
+    def write(self, data) -> int:
+        size = memoryview(data).nbytes
+        self._raw.write(data)
+        self._position += size
+        return size
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        target = self._position + offset if whence == io.SEEK_CUR else offset
+        if whence == io.SEEK_END or target != self._position:
+            raise io.UnsupportedOperation("Output is a stream and cannot seek")
+        return self._position
+
+    def flush(self) -> None:
+        self._raw.flush()
+
+    def writable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return False
+
+    def seekable(self) -> bool:
+        return False
+
+    @property
+    def closed(self) -> bool:
+        return self._raw.closed
+
+    def close(self) -> None:
+        # The pipe belongs to _write_to_fifo
+        self.flush()
+
+
+def _write_to_fifo(fifo_path: str, filename: str, fn: Callable, args: tuple, kwargs: dict):
+    """Worker side: run ``fn`` with STREAM_OUTPUT bound to the FIFO"""
+    # Non-blocking open fails with ENXIO instead of hanging if the reader is gone
+    fd = os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+    os.set_blocking(fd, True)
+    with open(fd, "wb") as raw:
+        output = StreamWriter(raw, filename)
+        args = [output if isinstance(arg, str) and arg == STREAM_OUTPUT else arg for arg in args]
+        return fn(*args, **kwargs)
+
+
+class _ToolOutput:
+    """Read end of the FIFO a pool worker is writing into"""
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict, filename: str,
+                 on_close: Optional[Callable[[], None]] = None):
+        self.path = os.path.join(FIFO_DIR, f"tool_stream_{uuid.uuid4().hex}.fifo")
+        os.mkfifo(self.path, 0o600)
+        self._fd = _open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        # Our own write end keeps reads from seeing EOF before the worker has
+        # opened the FIFO; it is dropped once the worker returns
+        self._hold: Optional[int] = _open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        self._closed = False
+        self._on_close = on_close
+        cost = getattr(fn, "cost_class", IO)
+        self._task = asyncio.ensure_future(run_in_pool(cost, _write_to_fifo, self.path, filename, fn, args, kwargs))
+        self._task.add_done_callback(self._release)
+
+    def _release(self, _task=None) -> None:
+        if self._hold is not None:
+            _close(self._hold)
+            self._hold = None
+
+    async def read(self, size: int) -> bytes:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                return os.read(self._fd, size)
+            except BlockingIOError:
+                ready = loop.create_future()
+                loop.add_reader(self._fd, lambda: ready.done() or ready.set_result(None))
+                try:
+                    await ready
+                finally:
+                    loop.remove_reader(self._fd)
+
+    async def finish(self) -> None:
+        await self._task
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        # A worker still writing now fails with EPIPE and frees its slot
+        _close(self._fd)
+        self._release()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        if not self._task.done():
+            self._task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        if self._on_close is not None:
+            # Not before the worker is done with whatever it was reading
+            if self._task.done():
+                self._on_close()
+            else:
+                self._task.add_done_callback(lambda _task: self._on_close())
+
+
+class _CommandOutput:
+    """stdout of a subprocess, with a bounded tail of stderr for error reports"""
+
+    STDERR_LINES = 20
+
+    def __init__(self, process: asyncio.subprocess.Process, name: str):
+        self._process = process
+        self.name = name
+        self._stderr = deque(maxlen=self.STDERR_LINES)
+        self._stderr_task = asyncio.ensure_future(self._drain_stderr())
+
+    @classmethod
+    async def start(cls, cmd: List[str]) -> "_CommandOutput":
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        return cls(process, os.path.basename(cmd[0]))
+
+    async def _drain_stderr(self) -> None:
+        async for line in self._process.stderr:
+            self._stderr.append(line.decode("utf-8", "replace").rstrip())
+
+    async def read(self, size: int) -> bytes:
+        return await self._process.stdout.read(size)
+
+    async def finish(self) -> None:
+        returncode = await self._process.wait()
+        await self._stderr_task
+        if returncode != 0:
+            detail = self._stderr[-1] if self._stderr else "no output"
+            raise RuntimeError(f"{self.name} exited with {returncode}: {detail}")
+
+    async def close(self) -> None:
+        if self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+        if not self._stderr_task.done():
+            self._stderr_task.cancel()
+
+
+class _IteratorOutput:
+    """Chunks produced on the event loop by an async generator"""
+
+    def __init__(self, chunks: AsyncIterator, on_close: Optional[Callable[[], None]]):
+        self._chunks = chunks
+        self._on_close = on_close
+        self._closed = False
+
+    async def read(self, size: int) -> bytes:
+        async for chunk in self._chunks:
+            if chunk:
+                return chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+        return b""
+
+    async def finish(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._chunks.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+
+
+async def _respond(source, filename: str, media_type: Optional[str], headers: Optional[dict]) -> StreamingResponse:
+    try:
+        first = await source.read(CHUNK_SIZE)
+        if not first:
+            await source.finish()
+    except BaseException:
+        await source.close()
+        raise
+
+    async def body():
+        try:
+            chunk = first
+            while chunk:
+                yield chunk
+                chunk = await source.read(CHUNK_SIZE)
+            await source.finish()
+        finally:
+            await source.close()
+
+    return StreamingResponse(
+        body(),
+        media_type=media_type or mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        headers={"Content-Disposition": f"attachment; filename={filename}", **(headers or {})},
+        # Runs even if the client went away before the body was consumed
+        background=BackgroundTask(source.close),
+    )
+
+
+async def stream_tool(fn: Callable, *args, filename: str, media_type: Optional[str] = None,
+                      headers: Optional[dict] = None, on_close: Optional[Callable[[], None]] = None,
+                      **kwargs) -> StreamingResponse:
+    """Run a tool function on its pool and stream what it writes to ``STREAM_OUTPUT``.
+
+    ``await stream_tool(_split, file.path, STREAM_OUTPUT, 1, 3, filename="split.pdf")``
+
+    ``on_close`` runs once the response is over and the function has returned
+    """
+    return await _respond(_ToolOutput(fn, args, kwargs, filename, on_close), filename, media_type, headers)
+
+
+async def stream_chunks(chunks: AsyncIterator, filename: str, media_type: Optional[str] = None,
+                        headers: Optional[dict] = None, on_close: Optional[Callable[[], None]] = None) -> StreamingResponse:
+    """Stream what an async generator yields (``str`` goes out as UTF-8) as it is produced.
+
+    ``on_close`` runs once the response is over, whether or not it completed
+    """
+    return await _respond(_IteratorOutput(chunks, on_close), filename, media_type, headers)
+
+
+async def stream_command(cmd: List[str], filename: str, media_type: Optional[str] = None,
+                         headers: Optional[dict] = None) -> StreamingResponse:
+    """Run a command that writes its output to stdout and stream it"""
+    return await _respond(await _CommandOutput.start(cmd), filename, media_type, headers)
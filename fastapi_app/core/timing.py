@@ -0,0 +1,243 @@
+"""Per-request stage timers and the opt-in profiler.
+
+Every tool request is broken down into stages:
+
+``ingest``   reading the request body and spooling the uploads
+``decode``   parsing inputs (opening a PDF, decoding an image)
+``process``  the rest of the tool work on the pools
+``encode``   writing the output (PDF save, image encode)
+``persist``  caching the output and copying it to the artifact store
+
+Code marks a stage with ``with stage("decode"):``, on the event loop or in
+a pool worker alike: pool calls collect their stages locally and the
+executor merges them into the request, counting whatever the tool did not
+mark as ``process``.  Pool work inside a stage opened on the loop (the
+cache copying a file) belongs to that stage.  The totals go out as a
+``Server-Timing`` header and into the ``tool_stage_seconds`` histogram.
+
+An admin (see ``core.admin``) sending ``X-Profile: 1`` gets the whole
+request run under cProfile: each pool call in its worker, and the request's
+time on the event loop (reading the body, the handler, caching and sending
+the output) from the first byte in to the last byte out.  The event loop is
+shared, so its report also holds whatever other requests ran on it
+meanwhile, and only one request profiles the loop at a time.  The report is
+kept under ``profiles/`` and its id returned in ``X-Profile-Id``; fetch it
+from ``/api/profiles/{id}`` once the response has been read.
+"""
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from starlette.requests import Request
+
+from core import metrics
+from core.admin import is_admin
+
+STAGES = ("ingest", "decode", "process", "encode", "persist")
+PROFILE_DIR = "profiles"
+PROFILE_HEADER = b"x-profile"
+# Lines of a cProfile report kept per pool call and for the event loop
+PROFILE_LINES = int(os.getenv("PROFILE_LINES", "60"))
+
+
+class RequestTimings:
+    def __init__(self, profile: bool = False):
+        self.stages: Dict[str, float] = {}
+        self.profile = profile
+        self.profiles: List[str] = []
+        self._open = 0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def merge(self, work: "WorkTimings", label: str) -> None:
+        """Fold in what a pool call measured"""
+        if self._open == 0:
+            for name, seconds in work.stages.items():
+                self.add(name, seconds)
+        if work.profile:
+            self.profiles.append(f"== {label} ==\n{work.profile}")
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items())
+
+
+class WorkTimings:
+    """Stages measured inside one pool call"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.profile: Optional[str] = None
+
+
+# Timings of the request being handled in this context, if any
+current: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+
+# Set while a pool call is collecting its stages on this thread
+_work = threading.local()
+
+# The event loop's thread takes one profiler at a time
+_loop_profiled = False
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    timings = None
+    work = getattr(_work, "timings", None)
+    if work is None:
+        timings = current.get()
+        if timings is not None:
+            timings._open += 1
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if work is not None:
+            work.stages[name] = work.stages.get(name, 0.0) + elapsed
+        elif timings is not None:
+            timings._open -= 1
+            timings.add(name, elapsed)
+
+
+def _report(profiler: cProfile.Profile) -> str:
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return report.getvalue()
+
+
+def _start_profiler() -> Optional[cProfile.Profile]:
+    """A running profiler, or None when another one holds the interpreter (Python 3.12+)"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def _run_profiled(call, work: WorkTimings):
+    profiler = _start_profiler()
+    if profiler is None:
+        work.profile = "Not profiled: another profiler was running\n"
+        return call()
+    try:
+        return call()
+    finally:
+        profiler.disable()
+        work.profile = _report(profiler)
+
+
+def run_measured(call, profile: bool = False):
+    """Pool side: run ``call`` collecting its stages; returns (result, WorkTimings)"""
+    work = WorkTimings()
+    _work.timings = work
+    started = time.perf_counter()
+    try:
+        result = _run_profiled(call, work) if profile else call()
+    finally:
+        _work.timings = None
+        marked = sum(work.stages.values())
+        work.stages["process"] = max(time.perf_counter() - started - marked, 0.0)
+    return result, work
+
+
+def _save_profile(profile_id: str, scope, timings: RequestTimings) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.txt"), "w") as f:
+        f.write(f"{scope['method']} {scope['path']}\n")
+        f.write(f"Stages: {timings.server_timing() or 'none'}\n\n")
+        f.write("\n".join(timings.profiles) or "Nothing was profiled\n")
+
+
+def read_profile(profile_id: str) -> Optional[str]:
+    if not profile_id.isalnum():
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.txt")) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+class TimingMiddleware:
+    """Time the stages of tool requests and report them in ``Server-Timing``"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(metrics.TOOL_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        profile = any(name == PROFILE_HEADER and value not in (b"", b"0") for name, value in scope.get("headers", []))
+        if profile and not is_admin(Request(scope)):
+            body = b'{"detail":"Profiling requires a valid admin token"}'
+            await send({
+                "type": "http.response.start",
+                "status": 403,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            return await send({"type": "http.response.body", "body": body})
+
+        timings = RequestTimings(profile)
+        token = current.set(timings)
+        started = time.perf_counter()
+        profile_id = uuid.uuid4().hex if profile else None
+        loop_profiler = self._start_loop_profiler(timings) if profile else None
+
+        async def timed_receive():
+            waited = time.perf_counter()
+            message = await receive()
+            if message["type"] == "http.request":
+                timings.add("ingest", time.perf_counter() - waited)
+            return message
+
+        async def timing_send(message):
+            if message["type"] == "http.response.start":
+                timings.add("total", time.perf_counter() - started)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing().encode()))
+                if profile_id:
+                    headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, timed_receive, timing_send)
+        finally:
+            current.reset(token)
+            if loop_profiler is not None:
+                self._stop_loop_profiler(loop_profiler, timings)
+            if profile_id:
+                _save_profile(profile_id, scope, timings)
+            tool = metrics.current_tool.get()
+            if tool is not None:
+                for name in STAGES:
+                    if name in timings.stages:
+                        metrics.STAGE_SECONDS.observe(tool, name, value=timings.stages[name])
+
+    @staticmethod
+    def _start_loop_profiler(timings: RequestTimings) -> Optional[cProfile.Profile]:
+        global _loop_profiled
+        profiler = None if _loop_profiled else _start_profiler()
+        if profiler is None:
+            timings.profiles.append("== event loop ==\nNot profiled: another profiler was running\n")
+            return None
+        _loop_profiled = True
+        return profiler
+
+    @staticmethod
+    def _stop_loop_profiler(profiler: cProfile.Profile, timings: RequestTimings) -> None:
+        global _loop_profiled
+        profiler.disable()
+        _loop_profiled = False
+        # Ahead of the pool calls: the loop's report covers the whole request
+        timings.profiles.insert(0, f"== event loop ==\n{_report(profiler)}")
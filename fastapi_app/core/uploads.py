@@ -0,0 +1,240 @@
+"""Upload ingest layer.
+
+Uploads are copied chunk by chunk from the multipart parser into a spool
+file under ``uploads/``, hashing as they go, so a handler never holds a whole
+file in memory.  Handlers receive a ``SpooledUpload`` (path, size, SHA-256)
+through the ``spool_file`` / ``spool_files`` dependencies, which also remove
+the spool file once the request is done.
+
+Size limits are per tool route and are enforced twice: up front from
+``Content-Length`` by ``UploadLimitMiddleware``, and again while spooling.
+"""
+import hashlib
+import mmap
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+import aiofiles
+from fastapi import File, HTTPException, Request, UploadFile
+
+from core.executor import io_bound, run_tool
+from core.timing import stage
+
+CHUNK_SIZE = 1024 * 1024
+MB = 1024 * 1024
+
+UPLOAD_DIR = "uploads"
+
+# Maximum request body per route prefix (longest prefix wins)
+DEFAULT_MAX_BYTES = int(os.getenv("UPLOAD_MAX_MB", "100")) * MB
+TOOL_LIMITS = {
+    "/api/government": 10 * MB,
+    "/api/image": 50 * MB,
+    "/api/pdf": 200 * MB,
+    "/api/pdf/merge": 1024 * MB,
+    "/api/audio": 500 * MB,
+    "/api/audio/video-convert": 2048 * MB,
+    "/api/audio/extract": 2048 * MB,
+    "/api/pipeline/image": 50 * MB,
+    "/api/pipeline/pdf": 200 * MB,
+    "/api/pipeline/audio": 500 * MB,
+    # Whole batch upload; each item is also held to its tool's own limit
+    "/api/batch": int(os.getenv("BATCH_MAX_MB", "4096")) * MB,
+}
+
+
+def limit_for(path: str) -> int:
+    """Upload size limit in bytes for a tool route"""
+    best = None
+    for prefix in TOOL_LIMITS:
+        if path == prefix or path.startswith(prefix + "/"):
+            if best is None or len(prefix) > len(best):
+                best = prefix
+    return TOOL_LIMITS[best] if best else DEFAULT_MAX_BYTES
+
+
+class SpooledUpload:
+    """An upload that has been streamed to a file on disk"""
+
+    def __init__(self, path: str, filename: str, size: int, sha256: str, content_type: Optional[str] = None):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self.content_type = content_type
+
+    @property
+    def extension(self) -> str:
+        return self.filename.split('.')[-1].lower() if '.' in self.filename else ""
+
+    @contextmanager
+    def mmap(self):
+        """Read-only memory map of the spooled bytes"""
+        with open(self.path, "rb") as f:
+            if self.size == 0:
+                yield b""
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+
+    async def copy_to(self, output_path: str) -> None:
+        await run_tool(_copy_file, self.path, output_path)
+
+    def detach(self) -> str:
+        """Another name for the spooled bytes, for work that outlives the request.
+
+        The caller removes it; the janitor sweeps it up otherwise.
+        """
+        path = f"{UPLOAD_DIR}/temp_{uuid.uuid4()}.{self.extension or 'tmp'}"
+        os.link(self.path, path)
+        return path
+
+    def cleanup(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+@io_bound
+def _copy_file(source: str, destination: str) -> None:
+    shutil.copyfile(source, destination)
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. Maximum size is {max_bytes // MB} MB"
+    )
+
+
+async def spool_upload(file: UploadFile, max_bytes: int = DEFAULT_MAX_BYTES) -> SpooledUpload:
+    """Stream an UploadFile to a spool file, hashing it and enforcing ``max_bytes``"""
+    filename = file.filename or "upload"
+    extension = filename.split('.')[-1] if '.' in filename else "tmp"
+    path = f"{UPLOAD_DIR}/temp_{uuid.uuid4()}.{extension}"
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with stage("ingest"):
+            async with aiofiles.open(path, "wb") as out:
+                while True:
+                    chunk = await file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise _too_large(max_bytes)
+                    digest.update(chunk)
+                    await out.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+    finally:
+        await file.close()
+
+    return SpooledUpload(path, filename, size, digest.hexdigest(), file.content_type)
+
+
+async def spool_file(request: Request, file: UploadFile = File(...)):
+    """Dependency: the ``file`` form field as a SpooledUpload"""
+    upload = await spool_upload(file, limit_for(request.url.path))
+    try:
+        yield upload
+    finally:
+        upload.cleanup()
+
+
+async def spool_files(request: Request, files: List[UploadFile] = File(...)):
+    """Dependency: the ``files`` form field as a list of SpooledUploads"""
+    max_bytes = limit_for(request.url.path)
+    uploads: List[SpooledUpload] = []
+    try:
+        for file in files:
+            uploads.append(await spool_upload(file, max_bytes))
+        yield uploads
+    finally:
+        for upload in uploads:
+            upload.cleanup()
+
+
+class UploadLimitMiddleware:
+    """Reject oversized request bodies before the multipart parser reads them"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            return await self.app(scope, receive, send)
+
+        max_bytes = limit_for(self._tool_path(scope))
+        content_length = None
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                content_length = int(value or 0)
+                break
+
+        if content_length is not None and content_length > max_bytes:
+            return await self._reject(send, max_bytes)
+
+        # Chunked bodies: count as they arrive and cut the request off early
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if exceeded:
+                # Whatever the app answers to a truncated body, the client gets a 413
+                if not response_started:
+                    response_started = True
+                    await self._reject(send, max_bytes)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except Exception:
+            if exceeded and not response_started:
+                return await self._reject(send, max_bytes)
+            raise
+
+    @staticmethod
+    def _tool_path(scope) -> str:
+        path = scope["path"]
+        if path == "/api/jobs":
+            # Job submissions carry the tool route in the query string
+            tool = parse_qs(scope.get("query_string", b"").decode()).get("tool")
+            if tool:
+                return tool[0]
+        return path
+
+    @staticmethod
+    async def _reject(send, max_bytes: int):
+        body = ('{"detail":"Request too large. Maximum size is %d MB"}' % (max_bytes // MB)).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,295 @@
+"""Batched usage recording into the ``tool_usage`` table.
+
+Every completed tool request (reported by ``MetricsMiddleware``) becomes a
+usage event in an in-memory buffer.  A background task flushes the buffer
+with one bulk insert when it reaches ``USAGE_BATCH_SIZE`` events or every
+``USAGE_FLUSH_SECONDS``, whichever comes first.  Database work runs on the
+I/O pool, so request latency never depends on the database.
+
+When the database cannot keep up, the buffer stops growing at
+``USAGE_QUEUE_SIZE`` events.  What happens next depends on
+``USAGE_OVERFLOW``.  With ``spill`` (the default), overflowing events and
+batches that fail to insert are appended to a local JSON-lines file, which
+is replayed once inserts succeed again.  With ``drop``, those events are
+counted and discarded.
+
+Any SQLAlchemy URL works; ``DATABASE_URL=sqlite:///usage.sqlite3`` is enough
+for local use and tests.
+"""
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from core import metrics
+from core.executor import io_bound, run_tool
+
+MB = 1024 * 1024
+
+USAGE_ENABLED = os.getenv("USAGE_ENABLED", "1") != "0"
+USAGE_BATCH_SIZE = int(os.getenv("USAGE_BATCH_SIZE", "200"))
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "5"))
+USAGE_QUEUE_SIZE = int(os.getenv("USAGE_QUEUE_SIZE", "10000"))
+USAGE_OVERFLOW = os.getenv("USAGE_OVERFLOW", "spill")
+USAGE_SPILL_PATH = os.getenv("USAGE_SPILL_PATH", "usage_spill.jsonl")
+
+SPILL = "spill"
+DROP = "drop"
+
+
+def _event(request: metrics.ToolRequest) -> dict:
+    return {
+        "tool": request.tool,
+        "session_id": request.session_id,
+        "file_size": round(request.input_bytes / MB, 4),
+        "processing_time": round(request.duration, 4),
+        "success": request.success,
+        "error_message": request.error,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+# Database side, executed on the I/O pool
+
+# Tool slug -> tools.id, filled as slugs are first seen
+_tool_ids: Dict[str, int] = {}
+
+
+@io_bound
+def _prepare_database() -> None:
+    from database import Base, Tool, ToolUsage, engine
+    Base.metadata.create_all(engine, tables=[Tool.__table__, ToolUsage.__table__])
+
+
+def _resolve_tool_ids(db, slugs: Iterable[str]) -> Dict[str, int]:
+    from database import Tool
+
+    missing = [slug for slug in set(slugs) if slug not in _tool_ids]
+    if missing:
+        for tool in db.query(Tool).filter(Tool.slug.in_(missing)):
+            _tool_ids[tool.slug] = tool.id
+        new_tools = [
+            Tool(slug=slug, name=slug.replace("_", " ").title(), category=slug.split("_")[0])
+            for slug in missing if slug not in _tool_ids
+        ]
+        if new_tools:
+            db.add_all(new_tools)
+            db.flush()
+            for tool in new_tools:
+                _tool_ids[tool.slug] = tool.id
+    return _tool_ids
+
+
+@io_bound
+def _insert_batch(events: List[dict]) -> None:
+    from sqlalchemy import insert
+    from database import SessionLocal, ToolUsage
+
+    db = SessionLocal()
+    try:
+        tool_ids = _resolve_tool_ids(db, (event["tool"] for event in events))
+        rows = [
+            {
+                "tool_id": tool_ids[event["tool"]],
+                "session_id": event["session_id"],
+                "file_size": event["file_size"],
+                "processing_time": event["processing_time"],
+                "success": event["success"],
+                "error_message": event["error_message"],
+                "created_at": datetime.fromisoformat(event["created_at"]),
+            }
+            for event in events
+        ]
+        db.execute(insert(ToolUsage), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        # Ids cached during a rolled back transaction may not exist
+        _tool_ids.clear()
+        raise
+    finally:
+        db.close()
+
+
+# Spill writes come from several I/O threads
+_spill_lock = threading.Lock()
+
+
+@io_bound
+def _append_spill(path: str, events: List[dict]) -> None:
+    with _spill_lock, open(path, "a") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+@io_bound
+def _take_spill(path: str) -> List[dict]:
+    """Read and remove the spill file (events are re-spilled if the replay fails)"""
+    replay_path = f"{path}.replay"
+    with _spill_lock:
+        try:
+            os.replace(path, replay_path)
+        except FileNotFoundError:
+            return []
+    events = []
+    with open(replay_path) as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    os.unlink(replay_path)
+    return events
+
+
+class UsageWriter:
+    """Buffers usage events and bulk-inserts them from a background task"""
+
+    def __init__(self, batch_size: int = USAGE_BATCH_SIZE, flush_interval: float = USAGE_FLUSH_SECONDS,
+                 max_queued: int = USAGE_QUEUE_SIZE, overflow: str = USAGE_OVERFLOW,
+                 spill_path: str = USAGE_SPILL_PATH):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queued = max_queued
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.enabled = False
+        self._buffer: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._spill_tasks = set()
+        self._spill_pending = False
+        self.recorded = 0
+        self.inserted = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.replayed = 0
+
+    def record(self, request: metrics.ToolRequest) -> None:
+        """Listener for ``core.metrics``; never blocks"""
+        if not self.enabled:
+            return
+        self.recorded += 1
+        self._buffer.append(_event(request))
+        if len(self._buffer) > self.max_queued:
+            self._overflow([self._buffer.popleft() for _ in range(len(self._buffer) - self.max_queued)])
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _overflow(self, events: List[dict]) -> None:
+        if self.overflow != SPILL:
+            self.dropped += len(events)
+            return
+        self.spilled += len(events)
+        self._spill_pending = True
+        task = asyncio.ensure_future(run_tool(_append_spill, self.spill_path, events))
+        self._spill_tasks.add(task)
+        task.add_done_callback(self._spill_done)
+
+    def _spill_done(self, task: asyncio.Task) -> None:
+        self._spill_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Usage spill error: {task.exception()}")
+
+    async def start(self) -> None:
+        if not USAGE_ENABLED:
+            return
+        try:
+            await run_tool(_prepare_database)
+        except Exception as e:
+            # No DATABASE_URL or an unreachable database: usage is not recorded
+            print(f"Usage recording disabled: {e}")
+            return
+        self.enabled = True
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self.enabled = False
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Whatever is still buffered goes to the spill file rather than being lost
+        if self._buffer and self.overflow == SPILL:
+            events = list(self._buffer)
+            self._buffer.clear()
+            self.spilled += len(events)
+            await run_tool(_append_spill, self.spill_path, events)
+        if self._spill_tasks:
+            await asyncio.gather(*self._spill_tasks, return_exceptions=True)
+
+    async def _loop(self) -> None:
+        await self._replay()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                if not await self._flush(batch):
+                    break
+            else:
+                if self._spill_pending and not self._spill_tasks:
+                    await self._replay()
+
+    async def _flush(self, batch: List[dict]) -> bool:
+        try:
+            await run_tool(_insert_batch, batch)
+        except Exception as e:
+            self.failures += 1
+            print(f"Usage flush error: {e}")
+            self._overflow(batch)
+            return False
+        self.batches += 1
+        self.inserted += len(batch)
+        return True
+
+    async def _replay(self) -> None:
+        self._spill_pending = False
+        try:
+            events = await run_tool(_take_spill, self.spill_path)
+        except OSError as e:
+            print(f"Usage replay error: {e}")
+            return
+        for start in range(0, len(events), self.batch_size):
+            batch = events[start:start + self.batch_size]
+            if not await self._flush(batch):
+                # The failed batch was re-spilled; put back the rest as well
+                self._overflow(events[start + self.batch_size:])
+                return
+            self.replayed += len(batch)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": len(self._buffer),
+            "recorded": self.recorded,
+            "inserted": self.inserted,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+        }
+
+    def metric_samples(self):
+        """Samples for ``core.metrics.register_collector``"""
+        return [
+            ("tool_usage_queued", "gauge", "Usage events waiting to be inserted", len(self._buffer)),
+            ("tool_usage_inserted_total", "counter", "Usage events inserted into the database", self.inserted),
+            ("tool_usage_failed_batches_total", "counter", "Usage batches that failed to insert", self.failures),
+            ("tool_usage_dropped_total", "counter", "Usage events dropped under back-pressure", self.dropped),
+            ("tool_usage_spilled_total", "counter", "Usage events written to the spill file", self.spilled),
+        ]
+
+
+usage_writer = UsageWriter()
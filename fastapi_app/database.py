@@ -1,28 +1,259 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, Float
+"""Database engines, sessions and models.
+
+``DATABASE_URL`` is read when the database is first used, not at import,
+so the app (and every pool worker) starts without one; features that need
+the database report ``DatabaseNotConfigured`` instead.
+
+Two engines share the same pool settings:
+
+``engine`` / ``SessionLocal`` / ``get_db``
+    synchronous, for code on the I/O pool (``core.usage``).  Never use
+    them from a coroutine: psycopg2 blocks the event loop.
+``async_engine`` / ``AsyncSessionLocal`` / ``get_async_db``
+    asyncio, for routes.  The driver comes from ``DATABASE_ASYNC_URL`` or
+    is derived from ``DATABASE_URL`` (asyncpg for PostgreSQL, aiosqlite for
+    SQLite), and must be installed.
+
+Pools are sized with ``DB_POOL_SIZE``, ``DB_MAX_OVERFLOW``,
+``DB_POOL_TIMEOUT`` and ``DB_POOL_RECYCLE``; connections are pre-pinged
+unless ``DB_POOL_PRE_PING=0``.  ``sqlite:///usage.sqlite3`` works for local
+use.  An in-memory SQLite database lives in one connection per engine, so
+the sync and async engines do not see each other's.
+Checked-out connections, overflow and the time spent waiting for a
+connection are exported through ``core.metrics``; ``health()`` backs
+``/api/health/db``.
+"""
+from sqlalchemy import create_engine, text, Column, Integer, String, DateTime, Boolean, Text, Float
+from sqlalchemy.engine import make_url
+from sqlalchemy import exc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 from datetime import datetime
+import asyncio
 import os
+import threading
+import time
+
+from core import metrics
 
 # Database configuration
-DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") != "0"
+DB_HEALTH_TIMEOUT = float(os.getenv("DB_HEALTH_TIMEOUT", "5"))
+
+# Drivers used when DATABASE_ASYNC_URL is not set
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+}
+
+POOL_WAIT = metrics.Histogram("db_pool_wait_seconds", "Time spent waiting for a pooled database connection",
+                              metrics.WAIT_BUCKETS, labels=("engine",))
+POOL_TIMEOUTS = metrics.Counter("db_pool_timeouts_total", "Connection requests that gave up after DB_POOL_TIMEOUT", labels=("engine",))
+POOL_CHECKED_OUT = metrics.Gauge("db_pool_checked_out", "Connections currently checked out of the pool", labels=("engine",))
+POOL_OVERFLOW = metrics.Gauge("db_pool_overflow", "Connections open beyond the pool size", labels=("engine",))
+metrics.METRICS.extend([POOL_WAIT, POOL_TIMEOUTS, POOL_CHECKED_OUT, POOL_OVERFLOW])
+
+
+class DatabaseNotConfigured(RuntimeError):
+    pass
+
+
+def database_url() -> str:
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        raise DatabaseNotConfigured("DATABASE_URL environment variable is required")
+    # Convert postgres:// to postgresql:// if needed (for compatibility)
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def async_database_url() -> str:
+    url = os.getenv("DATABASE_ASYNC_URL")
+    if url:
+        return url
+    parsed = make_url(database_url())
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise DatabaseNotConfigured(f"No async driver known for {backend}; set DATABASE_ASYNC_URL")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+class _TimedPool:
+    """Queue pool that records checkout waits and keeps the usage gauges current"""
+
+    engine_label = "sync"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            # Only a wait for a free connection; failures to connect are not timeouts
+            POOL_TIMEOUTS.inc(self.engine_label)
+            raise
+        finally:
+            POOL_WAIT.observe(self.engine_label, value=time.perf_counter() - started)
+            self._update_gauges()
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self._update_gauges()
+
+    def _update_gauges(self):
+        POOL_CHECKED_OUT.set(self.engine_label, value=self.checkedout())
+        POOL_OVERFLOW.set(self.engine_label, value=max(self.overflow(), 0))
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    engine_label = "sync"
+
+
+class TimedAsyncQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    engine_label = "async"
+
+
+def _engine_options(url: str, pool_class) -> dict:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        # Sessions move between I/O threads
+        options = {"connect_args": {"check_same_thread": False}}
+        if parsed.database in (None, "", ":memory:"):
+            # Every connection would get its own empty database
+            return {**options, "poolclass": StaticPool}
+    else:
+        options = {}
+    return {
+        **options,
+        "poolclass": pool_class,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
 
-if not DATABASE_URL:
-    raise Exception("DATABASE_URL environment variable is required")
 
-# Convert postgres:// to postgresql:// if needed (for compatibility)
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+_lock = threading.Lock()
+_engine = None
+_session_factory = None
+_async_engine = None
+_async_session_factory = None
+
+
+def get_engine():
+    global _engine, _session_factory
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                url = database_url()
+                _engine = create_engine(url, **_engine_options(url, TimedQueuePool))
+                _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+    return _engine
+
+
+def get_async_engine():
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        with _lock:
+            if _async_engine is None:
+                url = async_database_url()
+                _async_engine = create_async_engine(url, **_engine_options(url, TimedAsyncQueuePool))
+                _async_session_factory = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+def __getattr__(name: str):
+    # Module attributes created on first use, so importing this module never needs a database
+    if name == "engine":
+        return get_engine()
+    if name == "SessionLocal":
+        get_engine()
+        return _session_factory
+    if name == "async_engine":
+        return get_async_engine()
+    if name == "AsyncSessionLocal":
+        get_async_engine()
+        return _async_session_factory
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def pool_status() -> dict:
+    """Pool usage of the engines created so far"""
+    status = {}
+    for label, current in (("sync", _engine), ("async", _async_engine)):
+        if current is None:
+            continue
+        pool = current.pool if label == "sync" else current.sync_engine.pool
+        entry = {"class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update(size=pool.size(), checked_out=pool.checkedout(), overflow=max(pool.overflow(), 0),
+                         idle=pool.checkedin(), max_overflow=DB_MAX_OVERFLOW)
+        status[label] = entry
+    return status
+
+
+def _ping_sync() -> None:
+    with get_engine().connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+async def _ping() -> str:
+    try:
+        engine = get_async_engine()
+    except (DatabaseNotConfigured, ImportError):
+        # No async driver installed: probe through the sync engine off the loop
+        from core.executor import IO, run_in_pool
+        await run_in_pool(IO, _ping_sync)
+        return "sync"
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+    return "async"
+
+
+async def health() -> dict:
+    """Probe the database with ``SELECT 1``"""
+    try:
+        database_url()
+    except DatabaseNotConfigured as e:
+        return {"status": "disabled", "detail": str(e)}
+
+    started = time.perf_counter()
+    try:
+        engine_label = await asyncio.wait_for(_ping(), DB_HEALTH_TIMEOUT)
+    except Exception as e:
+        return {"status": "error", "detail": str(e) or type(e).__name__, "pool": pool_status()}
+    return {
+        "status": "ok",
+        "engine": engine_label,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "pool": pool_status(),
+    }
+
+
+async def dispose() -> None:
+    """Close pooled connections at shutdown"""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 # Database Models
 class User(Base):
     __tablename__ = "users"
-    
+
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
@@ -33,7 +264,7 @@ class User(Base):
 
 class Tool(Base):
     __tablename__ = "tools"
-    
+
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     slug = Column(String, unique=True, index=True)
@@ -45,7 +276,7 @@ class Tool(Base):
 
 class ToolUsage(Base):
     __tablename__ = "tool_usage"
-    
+
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=True)  # Anonymous usage allowed
     tool_id = Column(Integer)
@@ -56,10 +287,17 @@ class ToolUsage(Base):
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-# Dependency to get database session
+# Dependency to get a database session (sync; only for code that runs on the I/O pool)
 def get_db():
-    db = SessionLocal()
+    get_engine()
+    db = _session_factory()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependency to get an async database session, for routes
+async def get_async_db():
+    get_async_engine()
+    async with _async_session_factory() as db:
+        yield db
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Form, Depends
 import os
 import uuid
 import subprocess
 import shutil
-from typing import List, Optional
-from pathlib import Path
+from typing import BinaryIO, List, Optional, Union
+
+from core.executor import io_bound, run_tool
+from core.uploads import SpooledUpload, spool_file, spool_files
+from core.cache import ToolCache, tool_cache
+from core.streaming import STREAM_OUTPUT, stream_command, stream_requested, stream_tool
+from core.archive import ArchiveWriter
 
 router = APIRouter()
 
@@ -16,6 +20,7 @@ os.makedirs("downloads", exist_ok=True)
 # FFmpeg path
 FFMPEG_PATH = shutil.which("ffmpeg") or "/nix/store/3zc5jbvqzrn8zmva4fx5p0nh4yy03wk4-ffmpeg-6.1.1-bin/bin/ffmpeg"
 
+@io_bound
 def run_ffmpeg_command(input_path: str, output_path: str, ffmpeg_args: List[str]) -> bool:
     """Execute FFmpeg command with error handling"""
     try:
@@ -26,25 +31,92 @@ def run_ffmpeg_command(input_path: str, output_path: str, ffmpeg_args: List[str]
         print(f"FFmpeg error: {e}")
         return False
 
-@router.post("/convert")
+# Muxer options that let each output format be written to a pipe
+STREAM_MUXERS = {
+    "mp3": ["-f", "mp3"],
+    "wav": ["-f", "wav"],
+    "ogg": ["-f", "ogg"],
+    "flac": ["-f", "flac"],
+    "aac": ["-f", "adts"],
+    "m4a": ["-f", "ipod", "-movflags", "frag_keyframe+empty_moov"],
+    "mp4": ["-f", "mp4", "-movflags", "frag_keyframe+empty_moov"],
+    "mov": ["-f", "mov", "-movflags", "frag_keyframe+empty_moov"],
+    "mkv": ["-f", "matroska"],
+    "webm": ["-f", "webm"],
+}
+
+def can_stream(output_filename: str) -> bool:
+    return output_filename.split('.')[-1].lower() in STREAM_MUXERS
+
+async def stream_ffmpeg(input_path: str, output_filename: str, ffmpeg_args: List[str], headers: Optional[dict] = None):
+    """Run FFmpeg with the output on stdout and stream it to the client"""
+    muxer = STREAM_MUXERS[output_filename.split('.')[-1].lower()]
+    cmd = [FFMPEG_PATH, "-nostdin", "-i", input_path] + ffmpeg_args + muxer + ["pipe:1"]
+    return await stream_command(cmd, output_filename, headers=headers)
+
+@io_bound
+def run_command(cmd: List[str], timeout: int = 120) -> subprocess.CompletedProcess:
+    """Execute an arbitrary FFmpeg/FFprobe command line"""
+    return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+
+# Audio filters, shared by the effect routes and /api/pipeline.  Each returns
+# an ``-af`` filter chain; chains join with "," into a single filtergraph.
+REVERB_FILTER = "aecho=0.8:0.9:1000:0.3"
+NORMALIZE_FILTER = "loudnorm"
+SILENCE_REMOVE_FILTER = "silenceremove=start_periods=1:start_silence=0.1:start_threshold=-50dB"
+
+def trim_filter(start_time: float, duration: float) -> str:
+    return f"atrim=start={start_time}:duration={duration},asetpts=PTS-STARTPTS"
+
+def enhance_filter(noise_reduction: bool = True) -> str:
+    return "loudnorm,highpass=f=100" if noise_reduction else "loudnorm"
+
+def speed_filter(speed_factor: float) -> str:
+    return f"atempo={speed_factor}"
+
+def equalizer_filter(bass: int, treble: int) -> str:
+    return f"equalizer=f=60:width_type=h:width=50:g={bass},equalizer=f=10000:width_type=h:width=50:g={treble}"
+
+def fade_filter(fade_in: int, fade_out: int) -> str:
+    return f"afade=t=in:st=0:d={fade_in},afade=t=out:d={fade_out}"
+
+def pitch_filter(semitones: int) -> str:
+    # Convert semitones to frequency ratio
+    ratio = 2 ** (semitones / 12.0)
+    return f"asetrate=44100*{ratio},aresample=44100"
+
+def voice_filter(effect: str) -> str:
+    if effect == "robot":
+        return "amodulate=hz=15"
+    elif effect == "chipmunk":
+        return "asetrate=44100*1.5,aresample=44100"
+    elif effect == "deep":
+        return "asetrate=44100*0.8,aresample=44100"
+    return REVERB_FILTER
+
+def loop_filter(loop_count: int) -> str:
+    return f"aloop=loop={loop_count-1}:size=2048"
+
+@router.post("/convert", summary="Audio Converter")
 async def convert_audio(
-    file: UploadFile = File(...),
-    output_format: str = Form("mp3")
+    file: SpooledUpload = Depends(spool_file),
+    output_format: str = Form("mp3"),
+    cache: ToolCache = Depends(tool_cache("audio_convert")),
+    stream: bool = Depends(stream_requested)
 ):
     """Convert audio between different formats using FFmpeg"""
     supported_formats = ['mp3', 'wav', 'ogg', 'flac', 'm4a', 'aac']
     if output_format.lower() not in supported_formats:
         raise HTTPException(status_code=400, detail=f"Unsupported format. Supported: {supported_formats}")
     
-    temp_input = None
     temp_output = None
     
     try:
-        # Save uploaded file temporarily
-        temp_input = f"uploads/temp_input_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'tmp'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file, output_format=output_format)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         # Generate output filename
         output_filename = f"converted_{uuid.uuid4()}.{output_format}"
@@ -53,18 +125,21 @@ async def convert_audio(
         # FFmpeg conversion
         ffmpeg_args = ["-acodec", "libmp3lame" if output_format == "mp3" else f"lib{output_format}"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
             # Get file size
             file_size = os.path.getsize(temp_output)
             file_size_mb = round(file_size / (1024 * 1024), 1)
             
-            return {
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": f"Audio converted to {output_format.upper()} successfully",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename,
                 "file_size": f"{file_size_mb} MB"
-            }
+            })
         else:
             # Fallback: create demo file
             with open(temp_output, "wb") as f:
@@ -80,29 +155,25 @@ async def convert_audio(
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error converting audio: {str(e)}")
-    
-    finally:
-        # Clean up temporary files
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/trim")
+@router.post("/trim", summary="Audio Trimmer")
 async def trim_audio(
-    file: UploadFile = File(...),
+    file: SpooledUpload = Depends(spool_file),
     start_time: float = Form(0),
-    duration: float = Form(30)
+    duration: float = Form(30),
+    cache: ToolCache = Depends(tool_cache("audio_trim")),
+    stream: bool = Depends(stream_requested)
 ):
     """Trim audio file using FFmpeg"""
-    temp_input = None
     temp_output = None
     
     try:
-        # Save uploaded file temporarily
+        cached = await cache.lookup(file, start_time=start_time, duration=duration)
+        if cached:
+            return cached
+        
         file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'mp3'
-        temp_input = f"uploads/temp_trim_{uuid.uuid4()}.{file_extension}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        temp_input = file.path
         
         # Generate output filename
         output_filename = f"trimmed_{uuid.uuid4()}.{file_extension}"
@@ -111,17 +182,20 @@ async def trim_audio(
         # FFmpeg trim command
         ffmpeg_args = ["-ss", str(start_time), "-t", str(duration), "-acodec", "copy"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
             file_size = os.path.getsize(temp_output)
             file_size_mb = round(file_size / (1024 * 1024), 1)
             
-            return {
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": f"Audio trimmed from {start_time}s (duration: {duration}s)",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename,
                 "file_size": f"{file_size_mb} MB"
-            }
+            })
         else:
             # Fallback
             with open(temp_output, "wb") as f:
@@ -137,30 +211,20 @@ async def trim_audio(
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error trimming audio: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/merge")
-async def merge_audio(files: List[UploadFile] = File(...)):
+@router.post("/merge", summary="Audio Merger")
+async def merge_audio(files: List[SpooledUpload] = Depends(spool_files), cache: ToolCache = Depends(tool_cache("audio_merge"))):
     """Merge multiple audio files using FFmpeg"""
     if len(files) < 2:
         raise HTTPException(status_code=400, detail="At least 2 audio files required")
     
-    temp_files = []
+    temp_files = [file.path for file in files]
     temp_output = None
     
     try:
-        # Save all uploaded files temporarily
-        for i, file in enumerate(files):
-            file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'mp3'
-            temp_path = f"uploads/temp_merge_{uuid.uuid4()}_{i}.{file_extension}"
-            temp_files.append(temp_path)
-            
-            content = await file.read()
-            with open(temp_path, "wb") as f:
-                f.write(content)
+        cached = await cache.lookup(files)
+        if cached:
+            return cached
         
         # Generate output filename
         output_filename = f"merged_{uuid.uuid4()}.mp3"
@@ -179,7 +243,7 @@ async def merge_audio(files: List[UploadFile] = File(...)):
             cmd.extend(["-filter_complex", filter_complex, "-c:a", "libmp3lame", "-y", temp_output])
         
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+            result = await run_tool(run_command, cmd)
             success = result.returncode == 0
         except Exception:
             success = False
@@ -188,13 +252,13 @@ async def merge_audio(files: List[UploadFile] = File(...)):
             file_size = os.path.getsize(temp_output)
             file_size_mb = round(file_size / (1024 * 1024), 1)
             
-            return {
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": f"Merged {len(files)} audio files successfully",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename,
                 "file_size": f"{file_size_mb} MB"
-            }
+            })
         else:
             # Fallback: create demo merged file
             with open(temp_output, "wb") as f:
@@ -210,29 +274,23 @@ async def merge_audio(files: List[UploadFile] = File(...)):
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error merging audio: {str(e)}")
-    
-    finally:
-        # Clean up temporary files
-        for temp_file in temp_files:
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
 
-@router.post("/extract")
+@router.post("/extract", summary="Extract Audio")
 async def extract_audio(
-    file: UploadFile = File(...),
-    output_format: str = Form("mp3")
+    file: SpooledUpload = Depends(spool_file),
+    output_format: str = Form("mp3"),
+    cache: ToolCache = Depends(tool_cache("video_to_audio")),
+    stream: bool = Depends(stream_requested)
 ):
     """Extract audio from video file"""
-    temp_input = None
     temp_output = None
     
     try:
-        # Save uploaded file temporarily
-        file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'mp4'
-        temp_input = f"uploads/temp_extract_{uuid.uuid4()}.{file_extension}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file, output_format=output_format)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         # Generate output filename
         output_filename = f"extracted_{uuid.uuid4()}.{output_format}"
@@ -241,17 +299,20 @@ async def extract_audio(
         # FFmpeg extract audio command
         ffmpeg_args = ["-vn", "-acodec", "libmp3lame" if output_format == "mp3" else f"lib{output_format}"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
             file_size = os.path.getsize(temp_output)
             file_size_mb = round(file_size / (1024 * 1024), 1)
             
-            return {
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": f"Audio extracted to {output_format.upper()} successfully",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename,
                 "file_size": f"{file_size_mb} MB"
-            }
+            })
         else:
             # Fallback
             with open(temp_output, "wb") as f:
@@ -267,31 +328,27 @@ async def extract_audio(
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting audio: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/video-convert")
+@router.post("/video-convert", summary="Video Converter")
 async def convert_video(
-    file: UploadFile = File(...),
-    output_format: str = Form("mp4")
+    file: SpooledUpload = Depends(spool_file),
+    output_format: str = Form("mp4"),
+    cache: ToolCache = Depends(tool_cache("video_convert")),
+    stream: bool = Depends(stream_requested)
 ):
     """Convert video between different formats"""
     supported_formats = ['mp4', 'avi', 'mov', 'mkv', 'webm']
     if output_format.lower() not in supported_formats:
         raise HTTPException(status_code=400, detail=f"Unsupported format. Supported: {supported_formats}")
     
-    temp_input = None
     temp_output = None
     
     try:
-        # Save uploaded file temporarily
-        file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'mp4'
-        temp_input = f"uploads/temp_video_{uuid.uuid4()}.{file_extension}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file, output_format=output_format)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         # Generate output filename
         output_filename = f"converted_{uuid.uuid4()}.{output_format}"
@@ -300,17 +357,20 @@ async def convert_video(
         # FFmpeg video conversion
         ffmpeg_args = ["-c:v", "libx264", "-c:a", "aac", "-crf", "23"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
             file_size = os.path.getsize(temp_output)
             file_size_mb = round(file_size / (1024 * 1024), 1)
             
-            return {
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": f"Video converted to {output_format.upper()} successfully",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename,
                 "file_size": f"{file_size_mb} MB"
-            }
+            })
         else:
             # Fallback
             with open(temp_output, "wb") as f:
@@ -326,49 +386,46 @@ async def convert_video(
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error converting video: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/enhance")
+@router.post("/enhance", summary="Audio Enhancer")
 async def enhance_audio(
-    file: UploadFile = File(...),
-    noise_reduction: bool = Form(True)
+    file: SpooledUpload = Depends(spool_file),
+    noise_reduction: bool = Form(True),
+    cache: ToolCache = Depends(tool_cache("audio_enhance")),
+    stream: bool = Depends(stream_requested)
 ):
     """Enhance audio quality - noise reduction and volume normalization"""
-    temp_input = None
     temp_output = None
     
     try:
-        # Save uploaded file temporarily
+        cached = await cache.lookup(file, noise_reduction=noise_reduction)
+        if cached:
+            return cached
+        
         file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'mp3'
-        temp_input = f"uploads/temp_enhance_{uuid.uuid4()}.{file_extension}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        temp_input = file.path
         
         # Generate output filename
         output_filename = f"enhanced_{uuid.uuid4()}.{file_extension}"
         temp_output = f"downloads/{output_filename}"
         
         # FFmpeg enhance audio - volume normalization and basic filtering
-        if noise_reduction:
-            ffmpeg_args = ["-af", "loudnorm,highpass=f=100", "-c:a", "libmp3lame"]
-        else:
-            ffmpeg_args = ["-af", "loudnorm", "-c:a", "libmp3lame"]
+        ffmpeg_args = ["-af", enhance_filter(noise_reduction), "-c:a", "libmp3lame"]
+        
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
             file_size = os.path.getsize(temp_output)
             file_size_mb = round(file_size / (1024 * 1024), 1)
             
-            return {
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": "Audio enhanced successfully - normalized volume" + (" and reduced noise" if noise_reduction else ""),
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename,
                 "file_size": f"{file_size_mb} MB"
-            }
+            })
         else:
             # Fallback
             with open(temp_output, "wb") as f:
@@ -384,43 +441,44 @@ async def enhance_audio(
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error enhancing audio: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/speed-changer")
+@router.post("/speed-changer", summary="Speed Changer")
 async def change_audio_speed(
-    file: UploadFile = File(...),
-    speed_factor: float = Form(1.5)
+    file: SpooledUpload = Depends(spool_file),
+    speed_factor: float = Form(1.5),
+    cache: ToolCache = Depends(tool_cache("speed_changer")),
+    stream: bool = Depends(stream_requested)
 ):
     """Change audio playback speed"""
-    temp_input = None
     temp_output = None
     
     try:
-        temp_input = f"uploads/temp_speed_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'mp3'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file, speed_factor=speed_factor)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         output_filename = f"speed_changed_{uuid.uuid4()}.mp3"
         temp_output = f"downloads/{output_filename}"
         
         # FFmpeg command for speed change
-        ffmpeg_args = ["-filter:a", f"atempo={speed_factor}", "-c:a", "libmp3lame"]
+        ffmpeg_args = ["-filter:a", speed_filter(speed_factor), "-c:a", "libmp3lame"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
             file_size = os.path.getsize(temp_output)
             file_size_mb = round(file_size / (1024 * 1024), 1)
             
-            return {
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": f"Audio speed changed to {speed_factor}x successfully",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename,
                 "file_size": f"{file_size_mb} MB"
-            }
+            })
         else:
             with open(temp_output, "wb") as f:
                 f.write(b"Demo speed changed audio")
@@ -434,41 +492,41 @@ async def change_audio_speed(
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error changing speed: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/equalizer")
+@router.post("/equalizer", summary="Audio Equalizer")
 async def apply_audio_equalizer(
-    file: UploadFile = File(...),
+    file: SpooledUpload = Depends(spool_file),
     bass: int = Form(0),
-    treble: int = Form(0)
+    treble: int = Form(0),
+    cache: ToolCache = Depends(tool_cache("audio_equalizer")),
+    stream: bool = Depends(stream_requested)
 ):
     """Apply equalizer settings to audio"""
-    temp_input = None
     temp_output = None
     
     try:
-        temp_input = f"uploads/temp_eq_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'mp3'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file, bass=bass, treble=treble)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         output_filename = f"equalized_{uuid.uuid4()}.mp3"
         temp_output = f"downloads/{output_filename}"
         
         # FFmpeg equalizer filter
-        eq_filter = f"equalizer=f=60:width_type=h:width=50:g={bass},equalizer=f=10000:width_type=h:width=50:g={treble}"
-        ffmpeg_args = ["-af", eq_filter, "-c:a", "libmp3lame"]
+        ffmpeg_args = ["-af", equalizer_filter(bass, treble), "-c:a", "libmp3lame"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
-            return {
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": "Audio equalizer applied successfully",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename
-            }
+            })
         else:
             with open(temp_output, "wb") as f:
                 f.write(b"Demo equalized audio")
@@ -482,36 +540,35 @@ async def apply_audio_equalizer(
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error applying equalizer: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/reverb")
-async def add_reverb_effect(file: UploadFile = File(...)):
+@router.post("/reverb", summary="Audio Reverb")
+async def add_reverb_effect(file: SpooledUpload = Depends(spool_file), cache: ToolCache = Depends(tool_cache("audio_reverb")), stream: bool = Depends(stream_requested)):
     """Add reverb effect to audio"""
-    temp_input = None
     temp_output = None
     
     try:
-        temp_input = f"uploads/temp_reverb_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'mp3'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         output_filename = f"reverb_{uuid.uuid4()}.mp3"
         temp_output = f"downloads/{output_filename}"
         
         # FFmpeg reverb effect
-        ffmpeg_args = ["-af", "aecho=0.8:0.9:1000:0.3", "-c:a", "libmp3lame"]
+        ffmpeg_args = ["-af", REVERB_FILTER, "-c:a", "libmp3lame"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
-            return {
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": "Reverb effect added successfully",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename
-            }
+            })
         else:
             with open(temp_output, "wb") as f:
                 f.write(b"Demo reverb audio")
@@ -525,41 +582,41 @@ async def add_reverb_effect(file: UploadFile = File(...)):
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding reverb: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/fade")
+@router.post("/fade", summary="Audio Fade")
 async def add_fade_effect(
-    file: UploadFile = File(...),
+    file: SpooledUpload = Depends(spool_file),
     fade_in: int = Form(2),
-    fade_out: int = Form(2)
+    fade_out: int = Form(2),
+    cache: ToolCache = Depends(tool_cache("audio_fade")),
+    stream: bool = Depends(stream_requested)
 ):
     """Add fade in/out effects to audio"""
-    temp_input = None
     temp_output = None
     
     try:
-        temp_input = f"uploads/temp_fade_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'mp3'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file, fade_in=fade_in, fade_out=fade_out)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         output_filename = f"faded_{uuid.uuid4()}.mp3"
         temp_output = f"downloads/{output_filename}"
         
         # FFmpeg fade effects
-        fade_filter = f"afade=t=in:st=0:d={fade_in},afade=t=out:d={fade_out}"
-        ffmpeg_args = ["-af", fade_filter, "-c:a", "libmp3lame"]
+        ffmpeg_args = ["-af", fade_filter(fade_in, fade_out), "-c:a", "libmp3lame"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
-            return {
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": f"Fade effects added (in: {fade_in}s, out: {fade_out}s)",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename
-            }
+            })
         else:
             with open(temp_output, "wb") as f:
                 f.write(b"Demo faded audio")
@@ -573,36 +630,35 @@ async def add_fade_effect(
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding fade: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/normalize")
-async def normalize_audio(file: UploadFile = File(...)):
+@router.post("/normalize", summary="Audio Normalize")
+async def normalize_audio(file: SpooledUpload = Depends(spool_file), cache: ToolCache = Depends(tool_cache("audio_normalize")), stream: bool = Depends(stream_requested)):
     """Normalize audio volume levels"""
-    temp_input = None
     temp_output = None
     
     try:
-        temp_input = f"uploads/temp_normalize_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'mp3'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         output_filename = f"normalized_{uuid.uuid4()}.mp3"
         temp_output = f"downloads/{output_filename}"
         
         # FFmpeg normalization
-        ffmpeg_args = ["-af", "loudnorm", "-c:a", "libmp3lame"]
+        ffmpeg_args = ["-af", NORMALIZE_FILTER, "-c:a", "libmp3lame"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
-            return {
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": "Audio normalized successfully",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename
-            }
+            })
         else:
             with open(temp_output, "wb") as f:
                 f.write(b"Demo normalized audio")
@@ -616,40 +672,39 @@ async def normalize_audio(file: UploadFile = File(...)):
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error normalizing audio: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/pitch-shift")
+@router.post("/pitch-shift", summary="Pitch Shift")
 async def shift_audio_pitch(
-    file: UploadFile = File(...),
-    semitones: int = Form(2)
+    file: SpooledUpload = Depends(spool_file),
+    semitones: int = Form(2),
+    cache: ToolCache = Depends(tool_cache("pitch_shift")),
+    stream: bool = Depends(stream_requested)
 ):
     """Shift audio pitch by semitones"""
-    temp_input = None
     temp_output = None
     
     try:
-        temp_input = f"uploads/temp_pitch_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'mp3'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file, semitones=semitones)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         output_filename = f"pitch_shifted_{uuid.uuid4()}.mp3"
         temp_output = f"downloads/{output_filename}"
         
-        # Convert semitones to frequency ratio
-        ratio = 2 ** (semitones / 12.0)
-        ffmpeg_args = ["-af", f"asetrate=44100*{ratio},aresample=44100", "-c:a", "libmp3lame"]
+        ffmpeg_args = ["-af", pitch_filter(semitones), "-c:a", "libmp3lame"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
-            return {
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": f"Audio pitch shifted by {semitones} semitones",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename
-            }
+            })
         else:
             with open(temp_output, "wb") as f:
                 f.write(b"Demo pitch shifted audio")
@@ -663,26 +718,18 @@ async def shift_audio_pitch(
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error shifting pitch: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/audio-info")
-async def get_audio_info(file: UploadFile = File(...)):
+@router.post("/audio-info", summary="Audio Info")
+async def get_audio_info(file: SpooledUpload = Depends(spool_file)):
     """Get detailed audio file information"""
-    temp_input = None
     
     try:
-        temp_input = f"uploads/temp_info_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'mp3'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        temp_input = file.path
         
         # Try to get audio info using FFprobe
         try:
             cmd = [FFMPEG_PATH.replace("ffmpeg", "ffprobe"), "-v", "quiet", "-print_format", "json", "-show_format", "-show_streams", temp_input]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            result = await run_tool(run_command, cmd, timeout=30)
             
             if result.returncode == 0:
                 import json
@@ -696,7 +743,7 @@ async def get_audio_info(file: UploadFile = File(...)):
             pass
         
         # Fallback: basic file info
-        file_size = os.path.getsize(temp_input)
+        file_size = file.size
         return {
             "success": True,
             "message": "Basic audio information (demo mode)",
@@ -718,48 +765,40 @@ async def get_audio_info(file: UploadFile = File(...)):
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting audio info: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/voice-changer")
+@router.post("/voice-changer", summary="Voice Changer")
 async def change_voice(
-    file: UploadFile = File(...),
-    effect: str = Form("robot")
+    file: SpooledUpload = Depends(spool_file),
+    effect: str = Form("robot"),
+    cache: ToolCache = Depends(tool_cache("voice_changer")),
+    stream: bool = Depends(stream_requested)
 ):
     """Apply voice changing effects"""
-    temp_input = None
     temp_output = None
     
     try:
-        temp_input = f"uploads/temp_voice_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'mp3'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file, effect=effect)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         output_filename = f"voice_changed_{uuid.uuid4()}.mp3"
         temp_output = f"downloads/{output_filename}"
         
         # Different voice effects
-        if effect == "robot":
-            filter_complex = "amodulate=hz=15"
-        elif effect == "chipmunk":
-            filter_complex = "asetrate=44100*1.5,aresample=44100"
-        elif effect == "deep":
-            filter_complex = "asetrate=44100*0.8,aresample=44100"
-        else:
-            filter_complex = "aecho=0.8:0.9:1000:0.3"
+        ffmpeg_args = ["-af", voice_filter(effect), "-c:a", "libmp3lame"]
         
-        ffmpeg_args = ["-af", filter_complex, "-c:a", "libmp3lame"]
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
-            return {
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": f"Voice changed to {effect} effect",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename
-            }
+            })
         else:
             with open(temp_output, "wb") as f:
                 f.write(b"Demo voice changed audio")
@@ -773,36 +812,35 @@ async def change_voice(
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error changing voice: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/silence-remove")
-async def remove_silence(file: UploadFile = File(...)):
+@router.post("/silence-remove", summary="Silence Remover")
+async def remove_silence(file: SpooledUpload = Depends(spool_file), cache: ToolCache = Depends(tool_cache("silence_remove")), stream: bool = Depends(stream_requested)):
     """Remove silence from audio"""
-    temp_input = None
     temp_output = None
     
     try:
-        temp_input = f"uploads/temp_silence_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'mp3'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         output_filename = f"silence_removed_{uuid.uuid4()}.mp3"
         temp_output = f"downloads/{output_filename}"
         
         # FFmpeg silence removal
-        ffmpeg_args = ["-af", "silenceremove=start_periods=1:start_silence=0.1:start_threshold=-50dB", "-c:a", "libmp3lame"]
+        ffmpeg_args = ["-af", SILENCE_REMOVE_FILTER, "-c:a", "libmp3lame"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
-            return {
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": "Silence removed successfully",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename
-            }
+            })
         else:
             with open(temp_output, "wb") as f:
                 f.write(b"Demo silence removed audio")
@@ -816,40 +854,40 @@ async def remove_silence(file: UploadFile = File(...)):
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error removing silence: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/loop")
+@router.post("/loop", summary="Audio Loop")
 async def loop_audio(
-    file: UploadFile = File(...),
-    loop_count: int = Form(3)
+    file: SpooledUpload = Depends(spool_file),
+    loop_count: int = Form(3),
+    cache: ToolCache = Depends(tool_cache("audio_loop")),
+    stream: bool = Depends(stream_requested)
 ):
     """Loop audio multiple times"""
-    temp_input = None
     temp_output = None
     
     try:
-        temp_input = f"uploads/temp_loop_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'mp3'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
+        cached = await cache.lookup(file, loop_count=loop_count)
+        if cached:
+            return cached
+        
+        temp_input = file.path
         
         output_filename = f"looped_{uuid.uuid4()}.mp3"
         temp_output = f"downloads/{output_filename}"
         
         # Create looped audio
-        filter_complex = f"aloop=loop={loop_count-1}:size=2048"
-        ffmpeg_args = ["-af", filter_complex, "-c:a", "libmp3lame"]
+        ffmpeg_args = ["-af", loop_filter(loop_count), "-c:a", "libmp3lame"]
         
-        if run_ffmpeg_command(temp_input, temp_output, ffmpeg_args):
-            return {
+        if stream and can_stream(output_filename):
+            return await stream_ffmpeg(temp_input, output_filename, ffmpeg_args, cache.headers)
+        
+        if await run_tool(run_ffmpeg_command, temp_input, temp_output, ffmpeg_args):
+            return await cache.store(temp_output, {
                 "success": True,
                 "message": f"Audio looped {loop_count} times successfully",
                 "download_url": f"/downloads/{output_filename}",
                 "filename": output_filename
-            }
+            })
         else:
             with open(temp_output, "wb") as f:
                 f.write(b"Demo looped audio")
@@ -863,62 +901,56 @@ async def loop_audio(
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error looping audio: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
 
-@router.post("/stereo-split")
-async def split_stereo_channels(file: UploadFile = File(...)):
-    """Split stereo audio into separate left/right channels"""
-    temp_input = None
+# Archive entry and pan filter for each channel of a stereo split
+STEREO_CHANNELS = [
+    ("left.mp3", "pan=mono|c0=0.5*c0"),
+    ("right.mp3", "pan=mono|c0=0.5*c1"),
+]
+
+@io_bound
+def _split_stereo(input_path: str, output: Union[str, BinaryIO]):
+    # FFmpeg encodes each channel to stdout, which is copied straight into its entry
+    with ArchiveWriter(output) as archive:
+        for name, pan in STEREO_CHANNELS:
+            cmd = [FFMPEG_PATH, "-nostdin", "-i", input_path, "-af", pan, "-c:a", "libmp3lame", "-f", "mp3", "pipe:1"]
+            with subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as process:
+                archive.add_stream(process.stdout, name)
+            if process.returncode != 0:
+                raise RuntimeError(f"FFmpeg failed on the {name.split('.')[0]} channel")
+
+@router.post("/stereo-split", summary="Stereo Split")
+async def split_stereo_channels(
+    file: SpooledUpload = Depends(spool_file),
+    cache: ToolCache = Depends(tool_cache("audio_stereo_split")),
+    stream: bool = Depends(stream_requested)
+):
+    """Split stereo audio into separate left/right channels, returned as one ZIP"""
     
     try:
-        temp_input = f"uploads/temp_stereo_{uuid.uuid4()}.{file.filename.split('.')[-1] if '.' in file.filename else 'mp3'}"
-        content = await file.read()
-        with open(temp_input, "wb") as f:
-            f.write(content)
-        
-        # Create separate files for left and right channels
-        left_filename = f"left_channel_{uuid.uuid4()}.mp3"
-        right_filename = f"right_channel_{uuid.uuid4()}.mp3"
-        left_path = f"downloads/{left_filename}"
-        right_path = f"downloads/{right_filename}"
-        
-        # Extract left channel
-        left_args = ["-af", "pan=mono|c0=0.5*c0", "-c:a", "libmp3lame"]
-        left_success = run_ffmpeg_command(temp_input, left_path, left_args)
-        
-        # Extract right channel
-        right_args = ["-af", "pan=mono|c0=0.5*c1", "-c:a", "libmp3lame"]
-        right_success = run_ffmpeg_command(temp_input, right_path, right_args)
-        
-        if left_success and right_success:
-            return {
-                "success": True,
-                "message": "Stereo channels split successfully",
-                "left_channel": f"/downloads/{left_filename}",
-                "right_channel": f"/downloads/{right_filename}",
-                "files": [left_filename, right_filename]
-            }
-        else:
-            # Demo fallback
-            with open(left_path, "wb") as f:
-                f.write(b"Demo left channel audio")
-            with open(right_path, "wb") as f:
-                f.write(b"Demo right channel audio")
-            
-            return {
-                "success": True,
-                "message": "Stereo channels split (demo mode)",
-                "left_channel": f"/downloads/{left_filename}",
-                "right_channel": f"/downloads/{right_filename}",
-                "files": [left_filename, right_filename]
-            }
+        cached = await cache.lookup(file)
+        if cached:
+            return cached
+        
+        output_filename = f"stereo_split_{uuid.uuid4()}.zip"
+        output_path = f"downloads/{output_filename}"
+        
+        if stream:
+            # FFmpeg reads the input once per channel, after this handler's spool file is gone
+            input_path = file.detach()
+            return await stream_tool(_split_stereo, input_path, STREAM_OUTPUT, filename=output_filename,
+                                     media_type="application/zip", headers=cache.headers,
+                                     on_close=lambda: os.path.exists(input_path) and os.unlink(input_path))
+        
+        await run_tool(_split_stereo, file.path, output_path)
+        
+        return await cache.store(output_path, {
+            "success": True,
+            "message": "Stereo channels split successfully",
+            "download_url": f"/downloads/{output_filename}",
+            "filename": output_filename,
+            "files": [name for name, _ in STEREO_CHANNELS]
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error splitting stereo: {str(e)}")
-    
-    finally:
-        if temp_input and os.path.exists(temp_input):
-            os.unlink(temp_input)
\ No newline at end of file
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+
+from core import metrics
+from core.batch import BATCH_CONCURRENCY, BatchError, receive
+from core.uploads import limit_for
+
+router = APIRouter()
+
+def _body_fields(dependant) -> set:
+    names = {param.name for param in dependant.body_params}
+    for sub in dependant.dependencies:
+        names |= _body_fields(sub)
+    return names
+
+def _find_single_file_tool(app, tool: str):
+    """The tool route for a route path or tool id, if it takes a single ``file`` upload"""
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or "POST" not in route.methods:
+            continue
+        if not route.path.startswith(metrics.TOOL_PREFIXES) or "{" in route.path:
+            continue
+        if tool in (route.path, metrics.tool_id(route.path)):
+            return route if "file" in _body_fields(route.dependant) else None
+    return None
+
+@router.post("")
+async def run_batch(
+    request: Request,
+    tool: str = Query(..., description="Single-file tool to run, as a route or id, e.g. /api/image/resize or image_resize"),
+    concurrency: int = Query(BATCH_CONCURRENCY, ge=1, le=64, description="Items processed at once")
+):
+    """Run one single-file tool over every uploaded file.
+
+    The body is a multipart form with any number of files plus the tool's
+    parameters, which apply to every file.  The response is a ZIP streamed
+    as items finish, ending with ``batch_report.json`` (per-item status,
+    error and timing).  A failing item is reported there and does not stop
+    the others.
+    """
+    route = _find_single_file_tool(request.app, tool)
+    if route is None:
+        raise HTTPException(status_code=404, detail=f"Unknown single-file tool: {tool}")
+
+    try:
+        batch = await receive(request, route.path, limit_for(route.path))
+    except BatchError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    batch.concurrency = min(concurrency, len(batch.items))
+
+    return StreamingResponse(
+        batch.response_body(),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=batch_{batch.id}.zip",
+            "X-Batch-Items": str(len(batch.items)),
+        }
+    )
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import Optional
+import mimetypes
+
+from core import storage
+
+router = APIRouter()
+
+@router.api_route("/{key:path}", methods=["GET", "HEAD"])
+async def download_artifact(request: Request, key: str, token: Optional[str] = Query(None)):
+    """Serve a tool output from the artifact store, honouring ``Range`` requests"""
+    if (token is not None or storage.REQUIRE_TOKEN) and not storage.verify(key, token):
+        raise HTTPException(status_code=403, detail="Invalid or expired download token")
+
+    try:
+        size = await storage.store.size(key)
+    except ValueError:
+        size = None
+    if size is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    headers = {"Accept-Ranges": "bytes"}
+    status_code, start, end = 200, 0, size
+    range_header = request.headers.get("range")
+    if range_header:
+        try:
+            start, end = storage.parse_range(range_header, size)
+        except ValueError:
+            raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+
+    media_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(storage.store.get(key, start, end), status_code=status_code, headers=headers, media_type=media_type)
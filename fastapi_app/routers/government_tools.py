@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Form
 from pydantic import BaseModel
 import re
+import uuid
 from typing import Optional
 
 router = APIRouter()
@@ -19,7 +20,7 @@ class GSTCalculation(BaseModel):
     sgst: float
     igst: float
 
-@router.post("/pan-validate", response_model=PANValidationResponse)
+@router.post("/pan-validate", summary="PAN Validator", response_model=PANValidationResponse)
 async def validate_pan(pan_number: str = Form(...)):
     """Validate PAN card number format"""
     try:
@@ -44,7 +45,7 @@ async def validate_pan(pan_number: str = Form(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error validating PAN: {str(e)}")
 
-@router.post("/aadhaar-mask")
+@router.post("/aadhaar-mask", summary="Aadhaar Masker")
 async def mask_aadhaar(aadhaar_number: str = Form(...)):
     """Mask Aadhaar number for privacy"""
     try:
@@ -67,7 +68,7 @@ async def mask_aadhaar(aadhaar_number: str = Form(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error masking Aadhaar: {str(e)}")
 
-@router.post("/gst-calculate", response_model=GSTCalculation)
+@router.post("/gst-calculate", summary="GST Calculator", response_model=GSTCalculation)
 async def calculate_gst(
     amount: float = Form(...),
     gst_rate: float = Form(18.0),
@@ -107,7 +108,7 @@ async def calculate_gst(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating GST: {str(e)}")
 
-@router.post("/ifsc-lookup")
+@router.post("/ifsc-lookup", summary="IFSC Code Finder")
 async def lookup_ifsc(ifsc_code: str = Form(...)):
     """Look up bank details from IFSC code"""
     try:
@@ -142,7 +143,7 @@ async def lookup_ifsc(ifsc_code: str = Form(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error looking up IFSC: {str(e)}")
 
-@router.post("/emi-calculate")
+@router.post("/emi-calculate", summary="EMI Calculator")
 async def calculate_emi(
     principal: float = Form(...),
     rate: float = Form(...),
@@ -178,7 +179,7 @@ async def calculate_emi(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating EMI: {str(e)}")
 
-@router.post("/tds-calculate")
+@router.post("/tds-calculate", summary="TDS Calculator")
 async def calculate_tds(
     salary: float = Form(...),
     tax_regime: str = Form("new")
@@ -225,7 +226,7 @@ async def calculate_tds(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating TDS: {str(e)}")
 
-@router.post("/property-tax-calculate")
+@router.post("/property-tax-calculate", summary="Property Tax Calculator")
 async def calculate_property_tax(
     property_value: float = Form(...),
     property_type: str = Form("residential"),
@@ -264,7 +265,7 @@ async def calculate_property_tax(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating property tax: {str(e)}")
 
-@router.post("/professional-tax-calculate")
+@router.post("/professional-tax-calculate", summary="Professional Tax Calculator")
 async def calculate_professional_tax(
     monthly_salary: float = Form(...),
     state: str = Form("maharashtra")
@@ -316,7 +317,7 @@ async def calculate_professional_tax(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating professional tax: {str(e)}")
 
-@router.post("/legal-notice-generator")
+@router.post("/legal-notice-generator", summary="Legal Notice Generator")
 async def generate_legal_notice(
     sender_name: str = Form(...),
     recipient_name: str = Form(...),
@@ -371,7 +372,7 @@ Place: [PLACE]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating legal notice: {str(e)}")
 
-@router.post("/affidavit-generator")
+@router.post("/affidavit-generator", summary="Affidavit Generator")
 async def generate_affidavit(
     deponent_name: str = Form(...),
     father_name: str = Form(...),
@@ -426,7 +427,7 @@ DEPONENT
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating affidavit: {str(e)}")
 
-@router.post("/vehicle-registration-check")
+@router.post("/vehicle-registration-check", summary="Vehicle Registration Check")
 async def check_vehicle_registration(vehicle_number: str = Form(...)):
     """Check vehicle registration details"""
     try:
@@ -465,7 +466,7 @@ async def check_vehicle_registration(vehicle_number: str = Form(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error checking vehicle registration: {str(e)}")
 
-@router.post("/driving-license-validator")
+@router.post("/driving-license-validator", summary="Driving License Validator")
 async def validate_driving_license(dl_number: str = Form(...)):
     """Validate driving license number format"""
     try:
@@ -497,7 +498,7 @@ async def validate_driving_license(dl_number: str = Form(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error validating DL: {str(e)}")
 
-@router.post("/voter-id-validator")
+@router.post("/voter-id-validator", summary="Voter ID Validator")
 async def validate_voter_id(voter_id: str = Form(...)):
     """Validate voter ID card number format"""
     try:
@@ -527,7 +528,7 @@ async def validate_voter_id(voter_id: str = Form(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error validating voter ID: {str(e)}")
 
-@router.post("/stamp-duty-calculator")
+@router.post("/stamp-duty-calculator", summary="Stamp Duty Calculator")
 async def calculate_stamp_duty(
     property_value: float = Form(...),
     property_type: str = Form("residential"),
@@ -581,7 +582,7 @@ async def calculate_stamp_duty(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating stamp duty: {str(e)}")
 
-@router.post("/court-fee-calculator")
+@router.post("/court-fee-calculator", summary="Court Fee Calculator")
 async def calculate_court_fee(
     case_value: float = Form(...),
     court_type: str = Form("district"),
@@ -1,17 +1,22 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Depends
 import os
 import uuid
-import io
-from typing import List, Optional
-from pathlib import Path
+from contextlib import ExitStack
+from typing import BinaryIO, List, Tuple, Union
 
-# Simplified imports to avoid missing dependencies
-try:
-    from PIL import Image, ImageEnhance, ImageFilter
-    HAS_IMAGE_SUPPORT = True
-except ImportError:
-    HAS_IMAGE_SUPPORT = False
+from core.executor import cpu_bound, run_tool
+from core.lazy import LazyModule
+from core.uploads import SpooledUpload, spool_file, spool_files
+from core.archive import ArchiveWriter, unique_names
+from core.timing import stage
+from core.cache import ToolCache, tool_cache
+from core.streaming import STREAM_OUTPUT, stream_requested, stream_tool, streamable
+
+# PIL is imported on first use
+Image = LazyModule("PIL.Image")
+ImageEnhance = LazyModule("PIL.ImageEnhance")
+ImageFilter = LazyModule("PIL.ImageFilter")
+HAS_IMAGE_SUPPORT = Image.available
 
 router = APIRouter()
 
@@ -19,11 +24,145 @@ router = APIRouter()
 os.makedirs("uploads", exist_ok=True)
 os.makedirs("downloads", exist_ok=True)
 
-@router.post("/resize")
+# In-memory image operations, shared by the tool routes and /api/pipeline
+def resize_op(image, width: int, height: int):
+    return image.resize((width, height), Image.LANCZOS)
+
+def rotate_op(image, angle: int):
+    return image.rotate(angle, expand=True)
+
+def crop_op(image, x: int, y: int, width: int, height: int):
+    return image.crop((x, y, x + width, y + height))
+
+def grayscale_op(image):
+    return image.convert('L')
+
+def sepia_op(image):
+    image = image.convert('RGB')
+    pixels = image.load()
+    for i in range(image.width):
+        for j in range(image.height):
+            r, g, b = pixels[i, j]
+            tr = int(0.393 * r + 0.769 * g + 0.189 * b)
+            tg = int(0.349 * r + 0.686 * g + 0.168 * b)
+            tb = int(0.272 * r + 0.534 * g + 0.131 * b)
+            pixels[i, j] = (min(255, tr), min(255, tg), min(255, tb))
+    return image
+
+def blur_op(image, blur_radius: float):
+    return image.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+
+def sharpen_op(image):
+    return image.filter(ImageFilter.SHARPEN)
+
+def vintage_op(image):
+    # Vintage effect (combination of sepia and brightness)
+    return ImageEnhance.Brightness(image).enhance(0.8)
+
+def upscale_op(image, scale_factor: int):
+    new_width = int(image.width * scale_factor)
+    new_height = int(image.height * scale_factor)
+    return image.resize((new_width, new_height), Image.LANCZOS)
+
+def noise_reduce_op(image):
+    return image.filter(ImageFilter.SMOOTH)
+
+def encodable(image, output_format: str):
+    """``image`` in a mode ``output_format`` can store"""
+    if output_format.lower() in ['jpg', 'jpeg'] and image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+def open_image(path: Union[str, BinaryIO]):
+    """Open and decode an image, timed as the ``decode`` stage"""
+    with stage("decode"):
+        image = Image.open(path)
+        image.load()
+    return image
+
+def save_image(image, output, *args, **kwargs):
+    """``image.save``, timed as the ``encode`` stage"""
+    with stage("encode"):
+        image.save(output, *args, **kwargs)
+
+# Tool work, executed on the CPU pool
+@cpu_bound
+def _resize(input_path: str, output_path: str, width: int, height: int):
+    save_image(resize_op(open_image(input_path), width, height), output_path)
+
+@cpu_bound
+def _compress(input_path: str, output_path: str, quality: int):
+    image = open_image(input_path)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    save_image(image, output_path, "JPEG", quality=quality, optimize=True)
+
+@cpu_bound
+def _convert(input_path: str, output_path: str, output_format: str):
+    image = encodable(open_image(input_path), output_format)
+    save_image(image, output_path, output_format.upper())
+
+@cpu_bound
+def _rotate(input_path: str, output_path: str, angle: int):
+    save_image(rotate_op(open_image(input_path), angle), output_path)
+
+@cpu_bound
+def _crop(input_path: str, output_path: str, x: int, y: int, width: int, height: int):
+    save_image(crop_op(open_image(input_path), x, y, width, height), output_path)
+
+@cpu_bound
+def _grayscale(input_path: str, output_path: str):
+    save_image(grayscale_op(open_image(input_path)), output_path)
+
+@cpu_bound
+def _sepia(input_path: str, output_path: str):
+    save_image(sepia_op(open_image(input_path)), output_path)
+
+@cpu_bound
+def _blur(input_path: str, output_path: str, blur_radius: float):
+    save_image(blur_op(open_image(input_path), blur_radius), output_path)
+
+@cpu_bound
+def _sharpen(input_path: str, output_path: str):
+    save_image(sharpen_op(open_image(input_path)), output_path)
+
+@cpu_bound
+def _reencode(input_path: str, output_path: str):
+    save_image(open_image(input_path), output_path)
+
+@cpu_bound
+def _vintage(input_path: str, output_path: str):
+    save_image(vintage_op(open_image(input_path)), output_path)
+
+@cpu_bound
+def _upscale(input_path: str, output_path: str, scale_factor: int):
+    save_image(upscale_op(open_image(input_path), scale_factor), output_path)
+
+@cpu_bound
+def _noise_reduce(input_path: str, output_path: str):
+    save_image(noise_reduce_op(open_image(input_path)), output_path)
+
+@cpu_bound
+def _batch_resize(inputs: List[Tuple[str, str]], output: Union[str, BinaryIO], width: int, height: int):
+    # inputs: (path, entry name); each image is encoded straight into its entry.
+    # Every input is opened before the first byte goes out: a streamed
+    # response outlives the request's spool files.  Decoding still happens
+    # one image at a time.
+    with ExitStack() as sources:
+        files = [sources.enter_context(open(input_path, "rb")) for input_path, _ in inputs]
+        with ArchiveWriter(output) as archive:
+            for source, (_, name) in zip(files, inputs):
+                image = open_image(source)
+                with archive.open(name) as entry:
+                    save_image(resize_op(image, width, height), entry, image.format)
+
+@router.post("/resize", summary="Image Resizer")
 async def resize_image(
-    file: UploadFile = File(...),
+    file: SpooledUpload = Depends(spool_file),
     width: int = Form(800),
-    height: int = Form(600)
+    height: int = Form(600),
+    cache: ToolCache = Depends(tool_cache("image_resize")),
+    stream: bool = Depends(stream_requested)
 ):
     """Resize image to specified dimensions"""
     if not HAS_IMAGE_SUPPORT:
@@ -33,34 +172,37 @@ async def resize_image(
         raise HTTPException(status_code=400, detail="Unsupported image format")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
-        
-        # Resize image
-        resized_image = image.resize((width, height), Image.LANCZOS)
+        cached = await cache.lookup(file, width=width, height=height)
+        if cached:
+            return cached
         
         # Generate unique filename
         file_extension = file.filename.split('.')[-1]
         output_filename = f"resized_{uuid.uuid4()}.{file_extension}"
         output_path = f"downloads/{output_filename}"
         
-        # Save resized image
-        resized_image.save(output_path)
+        if stream and streamable(output_filename):
+            return await stream_tool(_resize, file.path, STREAM_OUTPUT, width, height, filename=output_filename, headers=cache.headers)
         
-        return {
+        # Resize and save image
+        await run_tool(_resize, file.path, output_path, width, height)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": f"Image resized to {width}x{height}",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error resizing image: {str(e)}")
 
-@router.post("/compress")
+@router.post("/compress", summary="Image Compressor")
 async def compress_image(
-    file: UploadFile = File(...),
-    quality: int = Form(85)
+    file: SpooledUpload = Depends(spool_file),
+    quality: int = Form(85),
+    cache: ToolCache = Depends(tool_cache("image_compress")),
+    stream: bool = Depends(stream_requested)
 ):
     """Compress image to reduce file size"""
     if not HAS_IMAGE_SUPPORT:
@@ -70,34 +212,36 @@ async def compress_image(
         raise HTTPException(status_code=400, detail="Unsupported image format for compression")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        cached = await cache.lookup(file, quality=quality)
+        if cached:
+            return cached
         
         # Generate unique filename
         output_filename = f"compressed_{uuid.uuid4()}.jpg"
         output_path = f"downloads/{output_filename}"
         
+        if stream and streamable(output_filename):
+            return await stream_tool(_compress, file.path, STREAM_OUTPUT, quality, filename=output_filename, headers=cache.headers)
+        
         # Save compressed image
-        image.save(output_path, "JPEG", quality=quality, optimize=True)
+        await run_tool(_compress, file.path, output_path, quality)
         
-        return {
+        return await cache.store(output_path, {
             "success": True,
             "message": f"Image compressed with {quality}% quality",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error compressing image: {str(e)}")
 
-@router.post("/convert")
+@router.post("/convert", summary="Format Converter")
 async def convert_format(
-    file: UploadFile = File(...),
-    output_format: str = Form("png")
+    file: SpooledUpload = Depends(spool_file),
+    output_format: str = Form("png"),
+    cache: ToolCache = Depends(tool_cache("image_convert")),
+    stream: bool = Depends(stream_requested)
 ):
     """Convert image to different format"""
     if not HAS_IMAGE_SUPPORT:
@@ -108,208 +252,224 @@ async def convert_format(
         raise HTTPException(status_code=400, detail=f"Unsupported output format. Supported: {supported_formats}")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
-        
-        # Convert to RGB for JPEG output
-        if output_format.lower() in ['jpg', 'jpeg'] and image.mode != 'RGB':
-            image = image.convert('RGB')
+        cached = await cache.lookup(file, output_format=output_format)
+        if cached:
+            return cached
         
         # Generate unique filename
         output_filename = f"converted_{uuid.uuid4()}.{output_format.lower()}"
         output_path = f"downloads/{output_filename}"
         
+        if stream and streamable(output_filename):
+            return await stream_tool(_convert, file.path, STREAM_OUTPUT, output_format, filename=output_filename, headers=cache.headers)
+        
         # Save converted image
-        image.save(output_path, output_format.upper())
+        await run_tool(_convert, file.path, output_path, output_format)
         
-        return {
+        return await cache.store(output_path, {
             "success": True,
             "message": f"Image converted to {output_format.upper()}",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error converting image: {str(e)}")
 
-@router.post("/rotate")
+@router.post("/rotate", summary="Image Rotator")
 async def rotate_image(
-    file: UploadFile = File(...),
-    angle: int = Form(90)
+    file: SpooledUpload = Depends(spool_file),
+    angle: int = Form(90),
+    cache: ToolCache = Depends(tool_cache("image_rotate")),
+    stream: bool = Depends(stream_requested)
 ):
     """Rotate image by specified angle"""
     if not HAS_IMAGE_SUPPORT:
         raise HTTPException(status_code=500, detail="Image processing not available")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
-        rotated_image = image.rotate(angle, expand=True)
+        cached = await cache.lookup(file, angle=angle)
+        if cached:
+            return cached
         
         file_extension = file.filename.split('.')[-1]
         output_filename = f"rotated_{uuid.uuid4()}.{file_extension}"
         output_path = f"downloads/{output_filename}"
         
-        rotated_image.save(output_path)
+        if stream and streamable(output_filename):
+            return await stream_tool(_rotate, file.path, STREAM_OUTPUT, angle, filename=output_filename, headers=cache.headers)
         
-        return {
+        await run_tool(_rotate, file.path, output_path, angle)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": f"Image rotated {angle}° successfully",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error rotating image: {str(e)}")
 
-@router.post("/smart-crop")
+@router.post("/smart-crop", summary="Smart Crop")
 async def smart_crop_image(
-    file: UploadFile = File(...),
+    file: SpooledUpload = Depends(spool_file),
     x: int = Form(0),
     y: int = Form(0),
     width: int = Form(400),
-    height: int = Form(400)
+    height: int = Form(400),
+    cache: ToolCache = Depends(tool_cache("smart_crop")),
+    stream: bool = Depends(stream_requested)
 ):
     """Smart crop image with specified coordinates"""
     if not HAS_IMAGE_SUPPORT:
         raise HTTPException(status_code=500, detail="Image processing not available")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
-        cropped_image = image.crop((x, y, x + width, y + height))
+        cached = await cache.lookup(file, x=x, y=y, width=width, height=height)
+        if cached:
+            return cached
         
         file_extension = file.filename.split('.')[-1]
         output_filename = f"cropped_{uuid.uuid4()}.{file_extension}"
         output_path = f"downloads/{output_filename}"
         
-        cropped_image.save(output_path)
+        if stream and streamable(output_filename):
+            return await stream_tool(_crop, file.path, STREAM_OUTPUT, x, y, width, height, filename=output_filename, headers=cache.headers)
         
-        return {
+        await run_tool(_crop, file.path, output_path, x, y, width, height)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": "Image cropped successfully",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error cropping image: {str(e)}")
 
-@router.post("/grayscale")
-async def convert_to_grayscale(file: UploadFile = File(...)):
+@router.post("/grayscale", summary="Grayscale Converter")
+async def convert_to_grayscale(file: SpooledUpload = Depends(spool_file), cache: ToolCache = Depends(tool_cache("image_grayscale")), stream: bool = Depends(stream_requested)):
     """Convert image to grayscale"""
     if not HAS_IMAGE_SUPPORT:
         raise HTTPException(status_code=500, detail="Image processing not available")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
-        grayscale_image = image.convert('L')
+        cached = await cache.lookup(file)
+        if cached:
+            return cached
         
         file_extension = file.filename.split('.')[-1]
         output_filename = f"grayscale_{uuid.uuid4()}.{file_extension}"
         output_path = f"downloads/{output_filename}"
         
-        grayscale_image.save(output_path)
+        if stream and streamable(output_filename):
+            return await stream_tool(_grayscale, file.path, STREAM_OUTPUT, filename=output_filename, headers=cache.headers)
         
-        return {
+        await run_tool(_grayscale, file.path, output_path)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": "Image converted to grayscale successfully",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error converting to grayscale: {str(e)}")
 
-@router.post("/sepia")
-async def apply_sepia_effect(file: UploadFile = File(...)):
+@router.post("/sepia", summary="Sepia Effect")
+async def apply_sepia_effect(file: SpooledUpload = Depends(spool_file), cache: ToolCache = Depends(tool_cache("image_sepia")), stream: bool = Depends(stream_requested)):
     """Apply sepia effect to image"""
     if not HAS_IMAGE_SUPPORT:
         raise HTTPException(status_code=500, detail="Image processing not available")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content)).convert('RGB')
-        
-        # Apply sepia effect
-        pixels = image.load()
-        for i in range(image.width):
-            for j in range(image.height):
-                r, g, b = pixels[i, j]
-                tr = int(0.393 * r + 0.769 * g + 0.189 * b)
-                tg = int(0.349 * r + 0.686 * g + 0.168 * b)
-                tb = int(0.272 * r + 0.534 * g + 0.131 * b)
-                pixels[i, j] = (min(255, tr), min(255, tg), min(255, tb))
+        cached = await cache.lookup(file)
+        if cached:
+            return cached
         
         file_extension = file.filename.split('.')[-1]
         output_filename = f"sepia_{uuid.uuid4()}.{file_extension}"
         output_path = f"downloads/{output_filename}"
         
-        image.save(output_path)
+        if stream and streamable(output_filename):
+            return await stream_tool(_sepia, file.path, STREAM_OUTPUT, filename=output_filename, headers=cache.headers)
         
-        return {
+        # Apply sepia effect
+        await run_tool(_sepia, file.path, output_path)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": "Sepia effect applied successfully",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error applying sepia: {str(e)}")
 
-@router.post("/blur")
+@router.post("/blur", summary="Blur Effect")
 async def blur_image(
-    file: UploadFile = File(...),
-    blur_radius: float = Form(2.0)
+    file: SpooledUpload = Depends(spool_file),
+    blur_radius: float = Form(2.0),
+    cache: ToolCache = Depends(tool_cache("image_blur")),
+    stream: bool = Depends(stream_requested)
 ):
     """Apply blur effect to image"""
     if not HAS_IMAGE_SUPPORT:
         raise HTTPException(status_code=500, detail="Image processing not available")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
-        blurred_image = image.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+        cached = await cache.lookup(file, blur_radius=blur_radius)
+        if cached:
+            return cached
         
         file_extension = file.filename.split('.')[-1]
         output_filename = f"blurred_{uuid.uuid4()}.{file_extension}"
         output_path = f"downloads/{output_filename}"
         
-        blurred_image.save(output_path)
+        if stream and streamable(output_filename):
+            return await stream_tool(_blur, file.path, STREAM_OUTPUT, blur_radius, filename=output_filename, headers=cache.headers)
         
-        return {
+        await run_tool(_blur, file.path, output_path, blur_radius)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": "Blur effect applied successfully",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error applying blur: {str(e)}")
 
-@router.post("/sharpen")
-async def sharpen_image(file: UploadFile = File(...)):
+@router.post("/sharpen", summary="Sharpen Image")
+async def sharpen_image(file: SpooledUpload = Depends(spool_file), cache: ToolCache = Depends(tool_cache("image_sharpen")), stream: bool = Depends(stream_requested)):
     """Sharpen image for better clarity"""
     if not HAS_IMAGE_SUPPORT:
         raise HTTPException(status_code=500, detail="Image processing not available")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
-        sharpened_image = image.filter(ImageFilter.SHARPEN)
+        cached = await cache.lookup(file)
+        if cached:
+            return cached
         
         file_extension = file.filename.split('.')[-1]
         output_filename = f"sharpened_{uuid.uuid4()}.{file_extension}"
         output_path = f"downloads/{output_filename}"
         
-        sharpened_image.save(output_path)
+        if stream and streamable(output_filename):
+            return await stream_tool(_sharpen, file.path, STREAM_OUTPUT, filename=output_filename, headers=cache.headers)
         
-        return {
+        await run_tool(_sharpen, file.path, output_path)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": "Image sharpened successfully",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error sharpening image: {str(e)}")
 
-@router.post("/collage-maker")
+@router.post("/collage-maker", summary="Collage Maker")
 async def create_image_collage(files: List[UploadFile] = File(...)):
     """Create collage from multiple images"""
     if not HAS_IMAGE_SUPPORT:
@@ -332,140 +492,161 @@ async def create_image_collage(files: List[UploadFile] = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating collage: {str(e)}")
 
-@router.post("/photo-frame")
-async def add_photo_frame(file: UploadFile = File(...)):
+@router.post("/photo-frame", summary="Photo Frame")
+async def add_photo_frame(file: SpooledUpload = Depends(spool_file), cache: ToolCache = Depends(tool_cache("photo_frame")), stream: bool = Depends(stream_requested)):
     """Add decorative frame to photo"""
     if not HAS_IMAGE_SUPPORT:
         raise HTTPException(status_code=500, detail="Image processing not available")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
+        cached = await cache.lookup(file)
+        if cached:
+            return cached
         
         file_extension = file.filename.split('.')[-1]
         output_filename = f"framed_{uuid.uuid4()}.{file_extension}"
         output_path = f"downloads/{output_filename}"
         
-        image.save(output_path)
+        if stream and streamable(output_filename):
+            return await stream_tool(_reencode, file.path, STREAM_OUTPUT, filename=output_filename, headers=cache.headers)
         
-        return {
+        await run_tool(_reencode, file.path, output_path)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": "Photo frame added successfully",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding frame: {str(e)}")
 
-@router.post("/vintage")
-async def apply_vintage_effect(file: UploadFile = File(...)):
+@router.post("/vintage", summary="Vintage Effect")
+async def apply_vintage_effect(file: SpooledUpload = Depends(spool_file), cache: ToolCache = Depends(tool_cache("vintage_effect")), stream: bool = Depends(stream_requested)):
     """Apply vintage effect to image"""
     if not HAS_IMAGE_SUPPORT:
         raise HTTPException(status_code=500, detail="Image processing not available")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
-        
-        # Apply vintage effect (combination of sepia and brightness)
-        enhancer = ImageEnhance.Brightness(image)
-        vintage_image = enhancer.enhance(0.8)
+        cached = await cache.lookup(file)
+        if cached:
+            return cached
         
         file_extension = file.filename.split('.')[-1]
         output_filename = f"vintage_{uuid.uuid4()}.{file_extension}"
         output_path = f"downloads/{output_filename}"
         
-        vintage_image.save(output_path)
+        if stream and streamable(output_filename):
+            return await stream_tool(_vintage, file.path, STREAM_OUTPUT, filename=output_filename, headers=cache.headers)
         
-        return {
+        await run_tool(_vintage, file.path, output_path)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": "Vintage effect applied successfully",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error applying vintage effect: {str(e)}")
 
-@router.post("/upscaler")
-async def upscale_image(file: UploadFile = File(...), scale_factor: int = Form(2)):
+@router.post("/upscaler", summary="Image Upscaler")
+async def upscale_image(file: SpooledUpload = Depends(spool_file), scale_factor: int = Form(2), cache: ToolCache = Depends(tool_cache("image_upscaler")), stream: bool = Depends(stream_requested)):
     """Upscale image using AI-like interpolation"""
     if not HAS_IMAGE_SUPPORT:
         raise HTTPException(status_code=500, detail="Image processing not available")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
-        
-        new_width = int(image.width * scale_factor)
-        new_height = int(image.height * scale_factor)
-        upscaled_image = image.resize((new_width, new_height), Image.LANCZOS)
+        cached = await cache.lookup(file, scale_factor=scale_factor)
+        if cached:
+            return cached
         
         file_extension = file.filename.split('.')[-1]
         output_filename = f"upscaled_{uuid.uuid4()}.{file_extension}"
         output_path = f"downloads/{output_filename}"
         
-        upscaled_image.save(output_path)
+        if stream and streamable(output_filename):
+            return await stream_tool(_upscale, file.path, STREAM_OUTPUT, scale_factor, filename=output_filename, headers=cache.headers)
         
-        return {
+        await run_tool(_upscale, file.path, output_path, scale_factor)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": f"Image upscaled {scale_factor}x successfully",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error upscaling image: {str(e)}")
 
-@router.post("/batch-resize")
+@router.post("/batch-resize", summary="Batch Resize")
 async def batch_resize_images(
-    files: List[UploadFile] = File(...),
+    files: List[SpooledUpload] = Depends(spool_files),
     width: int = Form(800),
-    height: int = Form(600)
+    height: int = Form(600),
+    cache: ToolCache = Depends(tool_cache("image_batch_resize")),
+    stream: bool = Depends(stream_requested)
 ):
     """Batch resize multiple images"""
     if not HAS_IMAGE_SUPPORT:
         raise HTTPException(status_code=500, detail="Image processing not available")
     
+    for file in files:
+        if not file.filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.webp')):
+            raise HTTPException(status_code=400, detail=f"Unsupported image format: {file.filename}")
+    
     try:
+        # Entry names come from the upload names, so they are part of the key
+        names = unique_names([file.filename for file in files])
+        cached = await cache.lookup(files, width=width, height=height, names=names)
+        if cached:
+            return cached
+        
         output_filename = f"batch_resized_{uuid.uuid4()}.zip"
         output_path = f"downloads/{output_filename}"
+        inputs = list(zip([file.path for file in files], names))
         
-        # Demo implementation
-        with open(output_path, "wb") as f:
-            f.write(b"Batch resized images content")
+        if stream:
+            return await stream_tool(_batch_resize, inputs, STREAM_OUTPUT, width, height, filename=output_filename,
+                                     media_type="application/zip", headers=cache.headers)
         
-        return {
+        await run_tool(_batch_resize, inputs, output_path, width, height)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": f"Batch resized {len(files)} images to {width}x{height}",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error batch resizing: {str(e)}")
 
-@router.post("/noise-reduction")
-async def reduce_image_noise(file: UploadFile = File(...)):
+@router.post("/noise-reduction", summary="Noise Reduction")
+async def reduce_image_noise(file: SpooledUpload = Depends(spool_file), cache: ToolCache = Depends(tool_cache("noise_reduction")), stream: bool = Depends(stream_requested)):
     """Reduce noise in image"""
     if not HAS_IMAGE_SUPPORT:
         raise HTTPException(status_code=500, detail="Image processing not available")
     
     try:
-        content = await file.read()
-        image = Image.open(io.BytesIO(content))
-        
-        # Apply noise reduction filter
-        noise_reduced = image.filter(ImageFilter.SMOOTH)
+        cached = await cache.lookup(file)
+        if cached:
+            return cached
         
         file_extension = file.filename.split('.')[-1]
         output_filename = f"noise_reduced_{uuid.uuid4()}.{file_extension}"
         output_path = f"downloads/{output_filename}"
         
-        noise_reduced.save(output_path)
+        if stream and streamable(output_filename):
+            return await stream_tool(_noise_reduce, file.path, STREAM_OUTPUT, filename=output_filename, headers=cache.headers)
         
-        return {
+        # Apply noise reduction filter
+        await run_tool(_noise_reduce, file.path, output_path)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": "Image noise reduced successfully",
             "download_url": f"/downloads/{output_filename}",
             "filename": output_filename
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reducing noise: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,112 @@
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.routing import Match
+import aiofiles
+import os
+
+from core import jobs, storage
+
+router = APIRouter()
+
+# Response headers carried over from the tool response when serving a result
+_RESULT_HEADERS = ("content-disposition",)
+
+def _find_tool_route(app, path: str):
+    """Return the POST route that would handle ``path``, if any"""
+    scope = {"type": "http", "path": path, "method": "POST"}
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+@router.post("")
+async def submit_job(
+    request: Request,
+    tool: str = Query(..., description="Tool route to run, e.g. /api/pdf/ocr"),
+    priority: int = Query(0, ge=-10, le=10, description="Lower runs first")
+):
+    """Submit any tool request as a background job.
+
+    The request body is exactly what the tool endpoint expects (multipart
+    form with files and parameters); it is spooled to disk and replayed by
+    a job worker.
+    """
+    if not tool.startswith("/api/") or tool.startswith("/api/jobs"):
+        raise HTTPException(status_code=400, detail="Invalid tool route")
+
+    if _find_tool_route(request.app, tool) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown tool route: {tool}")
+
+    job = jobs.manager.new_job(tool, priority)
+    job.request_headers = [
+        [name, value] for name, value in request.headers.items()
+        if name in ("content-type", "content-length")
+    ]
+
+    # Spool the raw request body without parsing it
+    async with aiofiles.open(job.request_path, "wb") as f:
+        async for chunk in request.stream():
+            await f.write(chunk)
+
+    try:
+        await jobs.manager.submit(job)
+    except jobs.QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Job queue is full, try again later",
+            headers={"Retry-After": "5"}
+        )
+
+    return {
+        "success": True,
+        "message": "Job queued",
+        **job.public(),
+        "status_url": f"/api/jobs/{job.id}"
+    }
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Get job state and progress"""
+    job = await jobs.manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.public()
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Fetch the tool response produced by a finished job"""
+    job = await jobs.manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if job.state not in jobs.FINISHED_STATES:
+        raise HTTPException(status_code=409, detail=f"Job is {job.state}")
+
+    if job.state != jobs.SUCCEEDED or not job.result_path:
+        raise HTTPException(status_code=422, detail=job.error or f"Job {job.state}")
+
+    headers = dict(job.result_headers)
+    media_type = headers.get("content-type")
+    result_headers = {name: value for name, value in headers.items() if name in _RESULT_HEADERS}
+
+    if os.path.exists(job.result_path):
+        return FileResponse(job.result_path, status_code=job.status_code, media_type=media_type, headers=result_headers)
+
+    # Run on another node: its copy in the artifact store
+    key = jobs.result_key(job)
+    if storage.store.remote and await storage.store.size(key) is not None:
+        return StreamingResponse(
+            storage.store.get(key), status_code=job.status_code, media_type=media_type, headers=result_headers
+        )
+    raise HTTPException(status_code=410, detail="Job result has expired")
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a job that has not started yet"""
+    job = await jobs.manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.state != jobs.CANCELLED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.state} and cannot be cancelled")
+    return job.public()
@@ -1,36 +1,33 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Depends
 from fastapi.responses import FileResponse
 import os
 import uuid
-import io
 import aiofiles
-from typing import List, Optional
+from typing import BinaryIO, List, Optional, Union
 from pathlib import Path
 
-# Import PDF libraries
-try:
-    from pypdf import PdfReader, PdfWriter
-    HAS_PDF_SUPPORT = True
-except ImportError:
-    try:
-        from PyPDF2 import PdfReader, PdfWriter
-        HAS_PDF_SUPPORT = True
-    except ImportError:
-        HAS_PDF_SUPPORT = False
-
-# Import additional libraries for advanced features
-try:
-    import fitz  # PyMuPDF for compression
-    HAS_PYMUPDF = True
-except ImportError:
-    HAS_PYMUPDF = False
-
-try:
-    from pdf2image import convert_from_bytes
-    import pytesseract
-    HAS_OCR_SUPPORT = True
-except ImportError:
-    HAS_OCR_SUPPORT = False
+from core import compress, engines, merge, ocr, raster, split
+from core.executor import CPU, cpu_bound, run_in_pool, run_tool
+from core.lazy import LazyModule
+from core.uploads import SpooledUpload, spool_file, spool_files
+from core.archive import ArchiveWriter, stream_archive, unique_names
+from core.cache import ToolCache, tool_cache
+from core.streaming import STREAM_OUTPUT, stream_chunks, stream_requested, stream_tool
+from core.timing import stage
+
+# PDF libraries are imported on first use
+pypdf = LazyModule("pypdf", "PyPDF2")
+PdfReader = pypdf.attr("PdfReader")
+PdfWriter = pypdf.attr("PdfWriter")
+HAS_PDF_SUPPORT = pypdf.available
+
+# Additional libraries for advanced features
+fitz = LazyModule("fitz")  # PyMuPDF for compression
+HAS_PYMUPDF = fitz.available
+
+# Page rendering and OCR stay loaded in the pool workers (see core.engines)
+HAS_RENDER_SUPPORT = engines.HAS_RENDERER
+HAS_OCR_SUPPORT = engines.HAS_RENDERER and engines.HAS_OCR
 
 router = APIRouter()
 
@@ -38,8 +35,54 @@ router = APIRouter()
 os.makedirs("uploads", exist_ok=True)
 os.makedirs("downloads", exist_ok=True)
 
-@router.post("/merge")
-async def merge_pdfs(files: List[UploadFile] = File(...)):
+# Tool work, executed on the CPU pool.  ``output`` is a path, or a writable
+# stream when the client asked for the result inline (see core.streaming)
+@cpu_bound
+def _merge(input_paths: List[str], output: Union[str, BinaryIO]) -> dict:
+    # Written page by page as the inputs are read (see core.merge)
+    return merge.merge(input_paths, output)
+
+@cpu_bound
+def _split(input_path: str, output: Union[str, BinaryIO], start_page: int, end_page: Optional[int]):
+    # One part of the single-pass splitter (see core.split)
+    return split.split_range(input_path, output, start_page, end_page)
+
+@cpu_bound
+def _compress(input_path: str, output: Union[str, BinaryIO], replacements: List[compress.Replacement] = ()):
+    if HAS_PYMUPDF:
+        # Images re-encoded beforehand by compress.recompress_images
+        compress.rewrite(input_path, output, replacements)
+    else:
+        # Fallback to basic compression using pypdf
+        _rewrite(input_path, output)
+
+def _savings_headers(original_size: int, compressed_size: int) -> dict:
+    saved = original_size - compressed_size
+    return {
+        "X-Original-Size": str(original_size),
+        "X-Compressed-Size": str(compressed_size),
+        "X-Size-Reduction": f"{100 * saved / original_size:.1f}%" if original_size else "0.0%",
+    }
+
+@cpu_bound
+def _rewrite(input_path: str, output: Union[str, BinaryIO], decrypt_password: Optional[str] = None,
+             encrypt_password: Optional[str] = None):
+    with stage("decode"):
+        reader = PdfReader(input_path)
+    if decrypt_password is not None and reader.is_encrypted:
+        if not reader.decrypt(decrypt_password):
+            raise ValueError("Invalid password")
+
+    writer = PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+    if encrypt_password is not None:
+        writer.encrypt(encrypt_password)
+    with stage("encode"):
+        writer.write(output)
+
+@router.post("/merge", summary="PDF Merger")
+async def merge_pdfs(files: List[SpooledUpload] = Depends(spool_files), cache: ToolCache = Depends(tool_cache("pdf_merge")), stream: bool = Depends(stream_requested)):
     """Merge multiple PDF files into one"""
     if len(files) < 2:
         raise HTTPException(status_code=400, detail="At least 2 PDF files required")
@@ -48,36 +91,36 @@ async def merge_pdfs(files: List[UploadFile] = File(...)):
         raise HTTPException(status_code=500, detail="PDF processing not available")
     
     try:
-        writer = PdfWriter()
+        cached = await cache.lookup(files)
+        if cached:
+            return cached
         
         for file in files:
             if not file.filename.lower().endswith('.pdf'):
                 raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-            
-            content = await file.read()
-            reader = PdfReader(io.BytesIO(content))
-            
-            for page in reader.pages:
-                writer.add_page(page)
         
         # Generate unique filename
         output_filename = f"merged_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
+        if stream:
+            return await stream_tool(_merge, [file.path for file in files], STREAM_OUTPUT, filename=output_filename, headers=cache.headers)
         
-        return {
+        stats = await run_tool(_merge, [file.path for file in files], output_path)
+        
+        return await cache.store(output_path, {
             "success": True,
             "message": "PDFs merged successfully",
             "download_url": f"/downloads/{output_filename}",
-            "filename": output_filename
-        }
+            "filename": output_filename,
+            "pages": stats["pages"],
+            "deduplicated_objects": stats["deduplicated_objects"]
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error merging PDFs: {str(e)}")
 
-@router.post("/to-powerpoint")
+@router.post("/to-powerpoint", summary="PDF to PowerPoint")
 async def pdf_to_powerpoint(file: UploadFile = File(...)):
     """Convert PDF to PowerPoint"""
     try:
@@ -97,37 +140,15 @@ async def pdf_to_powerpoint(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error converting PDF: {str(e)}")
 
-@router.post("/to-images")
-async def pdf_to_images(file: UploadFile = File(...)):
-    """Convert PDF pages to images"""
-    try:
-        output_filename = f"pdf_images_{uuid.uuid4()}.zip"
-        output_path = f"downloads/{output_filename}"
-        
-        # Demo implementation
-        with open(output_path, "wb") as f:
-            f.write(b"PDF images zip content")
-        
-        return {
-            "success": True,
-            "message": "PDF converted to images successfully",
-            "download_url": f"/downloads/{output_filename}",
-            "filename": output_filename
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error converting PDF: {str(e)}")
-
-@router.post("/form-filler")
-async def pdf_form_filler(file: UploadFile = File(...), form_data: str = Form(...)):
+@router.post("/form-filler", summary="PDF Form Filler")
+async def pdf_form_filler(file: SpooledUpload = Depends(spool_file), form_data: str = Form(...)):
     """Fill PDF forms with data"""
     try:
         output_filename = f"filled_form_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
         # Demo implementation
-        content = await file.read()
-        with open(output_path, "wb") as f:
-            f.write(content)
+        await file.copy_to(output_path)
         
         return {
             "success": True,
@@ -138,9 +159,9 @@ async def pdf_form_filler(file: UploadFile = File(...), form_data: str = Form(..
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error filling form: {str(e)}")
 
-@router.post("/metadata-editor")
+@router.post("/metadata-editor", summary="PDF Metadata Editor")
 async def edit_pdf_metadata(
-    file: UploadFile = File(...),
+    file: SpooledUpload = Depends(spool_file),
     title: str = Form(""),
     author: str = Form(""),
     subject: str = Form("")
@@ -150,9 +171,7 @@ async def edit_pdf_metadata(
         output_filename = f"metadata_edited_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        content = await file.read()
-        with open(output_path, "wb") as f:
-            f.write(content)
+        await file.copy_to(output_path)
         
         return {
             "success": True,
@@ -168,16 +187,14 @@ async def edit_pdf_metadata(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error editing metadata: {str(e)}")
 
-@router.post("/bookmark-manager")
-async def manage_pdf_bookmarks(file: UploadFile = File(...)):
+@router.post("/bookmark-manager", summary="PDF Bookmark Manager")
+async def manage_pdf_bookmarks(file: SpooledUpload = Depends(spool_file)):
     """Manage PDF bookmarks"""
     try:
         output_filename = f"bookmarked_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        content = await file.read()
-        with open(output_path, "wb") as f:
-            f.write(content)
+        await file.copy_to(output_path)
         
         return {
             "success": True,
@@ -188,9 +205,9 @@ async def manage_pdf_bookmarks(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error managing bookmarks: {str(e)}")
 
-@router.post("/page-extractor")
+@router.post("/page-extractor", summary="PDF Page Extractor")
 async def extract_pdf_pages(
-    file: UploadFile = File(...),
+    file: SpooledUpload = Depends(spool_file),
     start_page: int = Form(1),
     end_page: int = Form(1)
 ):
@@ -199,9 +216,7 @@ async def extract_pdf_pages(
         output_filename = f"extracted_pages_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        content = await file.read()
-        with open(output_path, "wb") as f:
-            f.write(content)
+        await file.copy_to(output_path)
         
         return {
             "success": True,
@@ -212,9 +227,9 @@ async def extract_pdf_pages(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting pages: {str(e)}")
 
-@router.post("/page-rotator")
+@router.post("/page-rotator", summary="PDF Page Rotator")
 async def rotate_pdf_pages(
-    file: UploadFile = File(...),
+    file: SpooledUpload = Depends(spool_file),
     rotation: int = Form(90)
 ):
     """Rotate PDF pages"""
@@ -222,9 +237,7 @@ async def rotate_pdf_pages(
         output_filename = f"rotated_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        content = await file.read()
-        with open(output_path, "wb") as f:
-            f.write(content)
+        await file.copy_to(output_path)
         
         return {
             "success": True,
@@ -235,16 +248,14 @@ async def rotate_pdf_pages(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error rotating pages: {str(e)}")
 
-@router.post("/redaction")
-async def redact_pdf_content(file: UploadFile = File(...)):
+@router.post("/redaction", summary="PDF Redaction")
+async def redact_pdf_content(file: SpooledUpload = Depends(spool_file)):
     """Redact sensitive content from PDF"""
     try:
         output_filename = f"redacted_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        content = await file.read()
-        with open(output_path, "wb") as f:
-            f.write(content)
+        await file.copy_to(output_path)
         
         return {
             "success": True,
@@ -255,16 +266,14 @@ async def redact_pdf_content(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error redacting PDF: {str(e)}")
 
-@router.post("/digital-signature")
-async def add_digital_signature(file: UploadFile = File(...)):
+@router.post("/digital-signature", summary="PDF Digital Signature")
+async def add_digital_signature(file: SpooledUpload = Depends(spool_file)):
     """Add digital signature to PDF"""
     try:
         output_filename = f"signed_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        content = await file.read()
-        with open(output_path, "wb") as f:
-            f.write(content)
+        await file.copy_to(output_path)
         
         return {
             "success": True,
@@ -275,7 +284,7 @@ async def add_digital_signature(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding signature: {str(e)}")
 
-@router.post("/table-extractor")
+@router.post("/table-extractor", summary="PDF Table Extractor")
 async def extract_pdf_tables(file: UploadFile = File(...)):
     """Extract tables from PDF"""
     try:
@@ -295,7 +304,7 @@ async def extract_pdf_tables(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting tables: {str(e)}")
 
-@router.post("/compare")
+@router.post("/compare", summary="PDF Compare")
 async def compare_pdfs(files: List[UploadFile] = File(...)):
     """Compare two PDF files"""
     if len(files) != 2:
@@ -318,9 +327,9 @@ async def compare_pdfs(files: List[UploadFile] = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error comparing PDFs: {str(e)}")
 
-@router.post("/annotation")
+@router.post("/annotation", summary="PDF Annotation")
 async def add_pdf_annotations(
-    file: UploadFile = File(...),
+    file: SpooledUpload = Depends(spool_file),
     annotations: str = Form(...)
 ):
     """Add annotations to PDF"""
@@ -328,9 +337,7 @@ async def add_pdf_annotations(
         output_filename = f"annotated_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        content = await file.read()
-        with open(output_path, "wb") as f:
-            f.write(content)
+        await file.copy_to(output_path)
         
         return {
             "success": True,
@@ -341,7 +348,7 @@ async def add_pdf_annotations(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding annotations: {str(e)}")
 
-@router.post("/batch-converter")
+@router.post("/batch-converter", summary="PDF Batch Converter")
 async def batch_convert_pdfs(files: List[UploadFile] = File(...)):
     """Batch convert multiple PDFs"""
     try:
@@ -361,16 +368,14 @@ async def batch_convert_pdfs(files: List[UploadFile] = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error batch converting: {str(e)}")
 
-@router.post("/size-optimizer")
-async def optimize_pdf_size(file: UploadFile = File(...)):
+@router.post("/size-optimizer", summary="PDF Size Optimizer")
+async def optimize_pdf_size(file: SpooledUpload = Depends(spool_file)):
     """Optimize PDF file size"""
     try:
         output_filename = f"optimized_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        content = await file.read()
-        with open(output_path, "wb") as f:
-            f.write(content)
+        await file.copy_to(output_path)
         
         return {
             "success": True,
@@ -381,16 +386,14 @@ async def optimize_pdf_size(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error optimizing PDF: {str(e)}")
 
-@router.post("/pdfa-converter")
-async def convert_to_pdfa(file: UploadFile = File(...)):
+@router.post("/pdfa-converter", summary="PDF/A Converter")
+async def convert_to_pdfa(file: SpooledUpload = Depends(spool_file)):
     """Convert PDF to PDF/A format"""
     try:
         output_filename = f"pdfa_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        content = await file.read()
-        with open(output_path, "wb") as f:
-            f.write(content)
+        await file.copy_to(output_path)
         
         return {
             "success": True,
@@ -401,16 +404,14 @@ async def convert_to_pdfa(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error converting to PDF/A: {str(e)}")
 
-@router.post("/repair")
-async def repair_pdf(file: UploadFile = File(...)):
+@router.post("/repair", summary="PDF Repair")
+async def repair_pdf(file: SpooledUpload = Depends(spool_file)):
     """Repair corrupted PDF"""
     try:
         output_filename = f"repaired_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        content = await file.read()
-        with open(output_path, "wb") as f:
-            f.write(content)
+        await file.copy_to(output_path)
         
         return {
             "success": True,
@@ -421,196 +422,314 @@ async def repair_pdf(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error repairing PDF: {str(e)}")
 
-@router.post("/split")
+@router.post("/split", summary="PDF Splitter")
 async def split_pdf(
-    file: UploadFile = File(...),
+    file: SpooledUpload = Depends(spool_file),
     start_page: int = Form(1),
-    end_page: Optional[int] = Form(None)
+    end_page: Optional[int] = Form(None),
+    ranges: Optional[str] = Form(None),
+    every: Optional[int] = Form(None),
+    cache: ToolCache = Depends(tool_cache("pdf_split")),
+    stream: bool = Depends(stream_requested)
 ):
-    """Split PDF by page range"""
+    """Split PDF by page range.
+
+    With ``ranges`` (one part per comma-separated range, e.g. ``"1-3,4,5-"``)
+    or ``every`` (parts of that many pages) the document is split into
+    several parts in one pass, returned as a ZIP.
+    """
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
+    if ranges or every is not None:
+        return await _split_many(file, ranges, every, cache, stream)
+    
     try:
-        content = await file.read()
-        reader = PdfReader(io.BytesIO(content))
+        cached = await cache.lookup(file, start_page=start_page, end_page=end_page)
+        if cached:
+            return cached
         
-        total_pages = len(reader.pages)
-        if end_page is None:
-            end_page = total_pages
+        output_id = uuid.uuid4()
         
-        if start_page < 1 or end_page > total_pages or start_page > end_page:
-            raise HTTPException(status_code=400, detail="Invalid page range")
+        if stream:
+            # The range is only resolved by the worker, after the headers have gone out
+            output_filename = f"split_{start_page}-{end_page or 'end'}_{output_id}.pdf"
+            return await stream_tool(_split, file.path, STREAM_OUTPUT, start_page, end_page,
+                                     filename=output_filename, media_type="application/pdf", headers=cache.headers)
         
-        writer = PdfWriter()
-        for i in range(start_page - 1, min(end_page, total_pages)):
-            writer.add_page(reader.pages[i])
+        output_path = f"downloads/split_{output_id}.pdf"
+        end_page = await run_tool(_split, file.path, output_path, start_page, end_page)
         
-        output_filename = f"split_{start_page}-{end_page}_{uuid.uuid4()}.pdf"
+        # Name the file after the resolved page range
+        output_filename = f"split_{start_page}-{end_page}_{output_id}.pdf"
+        os.replace(output_path, f"downloads/{output_filename}")
         output_path = f"downloads/{output_filename}"
         
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
+        await cache.store(output_path, media_type="application/pdf", filename=output_filename)
         
         return FileResponse(
             output_path,
             media_type="application/pdf",
             filename=output_filename,
-            headers={"Content-Disposition": f"attachment; filename={output_filename}"}
+            headers={"Content-Disposition": f"attachment; filename={output_filename}", **cache.headers}
+        )
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error splitting PDF: {str(e)}")
+
+async def _split_many(file: SpooledUpload, ranges: Optional[str], every: Optional[int],
+                      cache: ToolCache, stream: bool):
+    if ranges and every is not None:
+        raise HTTPException(status_code=400, detail="Give either ranges or every, not both")
+    
+    try:
+        total_pages = await run_in_pool(CPU, engines.page_count, file.path)
+        parts = split.every_n_pages(every, total_pages) if every is not None else raster.parse_ranges(ranges, total_pages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read PDF: {str(e)}")
+    
+    # Entries are named after the upload, so the name is part of the key
+    stem = Path(file.filename).stem
+    try:
+        cached = await cache.lookup(file, parts=parts, stem=stem)
+        if cached:
+            return cached
+        
+        names = unique_names([split.part_name(stem, first, last) for first, last in parts])
+        output_filename = f"split_{uuid.uuid4()}.zip"
+        output_path = f"downloads/{output_filename}"
+        
+        if stream:
+            return await stream_tool(split.split_parts, file.path, STREAM_OUTPUT, parts, names, filename=output_filename,
+                                     media_type="application/zip", headers=cache.headers)
+        
+        await run_tool(split.split_parts, file.path, output_path, parts, names)
+        
+        await cache.store(output_path, media_type="application/zip", filename=output_filename)
+        
+        return FileResponse(
+            output_path,
+            media_type="application/zip",
+            filename=output_filename,
+            headers={"Content-Disposition": f"attachment; filename={output_filename}", **cache.headers}
         )
     
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error splitting PDF: {str(e)}")
 
-@router.post("/compress")
-async def compress_pdf(file: UploadFile = File(...), quality: int = Form(85)):
-    """Compress PDF file to reduce size"""
+@router.post("/compress", summary="PDF Compressor")
+async def compress_pdf(
+    file: SpooledUpload = Depends(spool_file),
+    quality: int = Form(85),
+    dpi: int = Form(150),
+    cache: ToolCache = Depends(tool_cache("pdf_compress")),
+    stream: bool = Depends(stream_requested),
+):
+    """Compress PDF file to reduce size.
+
+    Images are downsampled to ``dpi`` and re-encoded as JPEG at ``quality``;
+    the sizes before and after come back in ``X-Original-Size``,
+    ``X-Compressed-Size`` and ``X-Size-Reduction`` (not on streamed responses).
+    """
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
     if not HAS_PDF_SUPPORT:
         raise HTTPException(status_code=500, detail="PDF processing not available")
+    if not 1 <= quality <= 100:
+        raise HTTPException(status_code=400, detail="Quality must be between 1 and 100")
+    if not compress.MIN_DPI <= dpi <= compress.MAX_DPI:
+        raise HTTPException(status_code=400, detail=f"DPI must be between {compress.MIN_DPI} and {compress.MAX_DPI}")
     
+    replacements = []
     try:
-        content = await file.read()
-        
-        if HAS_PYMUPDF:
-            # Use PyMuPDF for compression
-            input_path = f"uploads/temp_{uuid.uuid4()}.pdf"
-            
-            async with aiofiles.open(input_path, "wb") as f:
-                await f.write(content)
-            
-            doc = fitz.open(input_path)
-            output_filename = f"compressed_{uuid.uuid4()}.pdf"
-            output_path = f"downloads/{output_filename}"
-            
-            doc.save(output_path, garbage=4, deflate=True, clean=True)
-            doc.close()
-            
-            # Clean up temp file
-            os.remove(input_path)
-        else:
-            # Fallback to basic compression using pypdf
-            reader = PdfReader(io.BytesIO(content))
-            writer = PdfWriter()
-            
-            for page in reader.pages:
-                writer.add_page(page)
-            
-            output_filename = f"compressed_{uuid.uuid4()}.pdf"
-            output_path = f"downloads/{output_filename}"
-            
-            with open(output_path, "wb") as output_file:
-                writer.write(output_file)
+        cached = await cache.lookup(file, quality=quality, dpi=dpi)
+        if cached:
+            cached.headers.update(_savings_headers(file.size, os.path.getsize(cached.path)))
+            return cached
+        
+        output_filename = f"compressed_{uuid.uuid4()}.pdf"
+        output_path = f"downloads/{output_filename}"
+        replacements = await compress.recompress_images(file.path, quality, dpi)
+        
+        if stream:
+            # The replacement images are read before the first byte goes out
+            return await stream_tool(_compress, file.path, STREAM_OUTPUT, replacements, filename=output_filename,
+                                     media_type="application/pdf", headers=cache.headers)
+        
+        await run_tool(_compress, file.path, output_path, replacements)
+        if os.path.getsize(output_path) >= file.size:
+            # Nothing to gain: hand back the original
+            await file.copy_to(output_path)
+        
+        await cache.store(output_path, media_type="application/pdf", filename=output_filename)
         
         return FileResponse(
             output_path,
             media_type="application/pdf",
             filename=output_filename,
-            headers={"Content-Disposition": f"attachment; filename={output_filename}"}
+            headers={
+                "Content-Disposition": f"attachment; filename={output_filename}",
+                **_savings_headers(file.size, os.path.getsize(output_path)),
+                **cache.headers,
+            }
         )
     
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error compressing PDF: {str(e)}")
+    finally:
+        compress.discard(replacements)
 
-@router.post("/ocr")
-async def pdf_ocr(file: UploadFile = File(...)):
+@router.post("/ocr", summary="PDF OCR")
+async def pdf_ocr(
+    file: SpooledUpload = Depends(spool_file),
+    language: str = Form("eng"),
+    dpi: int = Form(engines.DEFAULT_DPI),
+    stream: bool = Depends(stream_requested),
+    cache: ToolCache = Depends(tool_cache("pdf_ocr")),
+):
     """Extract text from scanned PDF using OCR"""
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
     if not HAS_OCR_SUPPORT:
-        raise HTTPException(status_code=500, detail="OCR processing not available. Please install pdf2image and pytesseract.")
+        raise HTTPException(status_code=500, detail="OCR processing not available. Please install PyMuPDF (or pdf2image) and tesserocr, or pytesseract and the tesseract binary.")
+    
+    if not 36 <= dpi <= 600:
+        raise HTTPException(status_code=400, detail="DPI must be between 36 and 600")
     
     try:
-        content = await file.read()
+        cached = await cache.lookup(file, language=language, dpi=dpi)
+        if cached:
+            return cached
         
-        # Convert PDF to images
-        images = convert_from_bytes(content)
-        extracted_text = ""
+        output_filename = f"ocr_text_{uuid.uuid4()}.txt"
         
-        for i, image in enumerate(images):
-            # Perform OCR on each page
-            text = pytesseract.image_to_string(image)
-            extracted_text += f"--- Page {i+1} ---\n{text}\n\n"
+        if stream:
+            # Pages go out as they are read, after this handler's spool file is gone
+            input_path = file.detach()
+            return await stream_chunks(
+                ocr.ocr_text(input_path, dpi, language), filename=output_filename, media_type="text/plain",
+                headers=cache.headers, on_close=lambda: os.path.exists(input_path) and os.unlink(input_path),
+            )
         
-        # Save as text file
-        output_filename = f"ocr_text_{uuid.uuid4()}.txt"
+        # Save as text file, page by page
         output_path = f"downloads/{output_filename}"
         
         async with aiofiles.open(output_path, "w", encoding="utf-8") as f:
-            await f.write(extracted_text)
+            async for page_text in ocr.ocr_text(file.path, dpi, language):
+                await f.write(page_text)
+        
+        await cache.store(output_path, media_type="text/plain", filename=output_filename)
         
         return FileResponse(
             output_path,
             media_type="text/plain",
             filename=output_filename,
-            headers={"Content-Disposition": f"attachment; filename={output_filename}"}
+            headers={"Content-Disposition": f"attachment; filename={output_filename}", **cache.headers}
         )
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error performing OCR: {str(e)}")
 
-@router.post("/to-images")
-async def pdf_to_images(file: UploadFile = File(...), dpi: int = Form(200)):
+@router.post("/to-images", summary="PDF to Images")
+async def pdf_to_images(
+    file: SpooledUpload = Depends(spool_file),
+    image_format: str = Form("png"),
+    quality: int = Form(85),
+    dpi: int = Form(200),
+    pages: str = Form(""),
+    thumbnail: bool = Form(False),
+    thumbnail_size: int = Form(256),
+    cache: ToolCache = Depends(tool_cache("pdf_to_images")),
+    stream: bool = Depends(stream_requested),
+):
     """Convert PDF pages to images"""
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
-    if not HAS_OCR_SUPPORT:
-        raise HTTPException(status_code=500, detail="Image conversion not available. Please install pdf2image.")
+    if not HAS_RENDER_SUPPORT:
+        raise HTTPException(status_code=500, detail="Image conversion not available. Please install PyMuPDF or pdf2image.")
+    
+    image_format = image_format.lower()
+    if image_format not in raster.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported image format. Supported: {sorted(raster.FORMATS)}")
+    if not 1 <= quality <= 100:
+        raise HTTPException(status_code=400, detail="Quality must be between 1 and 100")
+    if not raster.MIN_DPI <= dpi <= raster.MAX_DPI:
+        raise HTTPException(status_code=400, detail=f"DPI must be between {raster.MIN_DPI} and {raster.MAX_DPI}")
+    if thumbnail and not 16 <= thumbnail_size <= raster.MAX_THUMBNAIL:
+        raise HTTPException(status_code=400, detail=f"Thumbnail size must be between 16 and {raster.MAX_THUMBNAIL}")
     
     try:
-        content = await file.read()
-        images = convert_from_bytes(content, dpi=dpi)
+        total_pages = await run_in_pool(CPU, engines.page_count, file.path)
+        page_indices = raster.parse_pages(pages, total_pages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read PDF: {str(e)}")
+    
+    options = {
+        "image_format": image_format,
+        "quality": quality,
+        "dpi": dpi,
+        "thumbnail": thumbnail_size if thumbnail else None,
+    }
+    
+    try:
+        cached = await cache.lookup(file, pages=page_indices, **options)
+        if cached:
+            return cached
         
         # Create a zip file containing all images
-        import zipfile
         output_filename = f"pdf_images_{uuid.uuid4()}.zip"
         output_path = f"downloads/{output_filename}"
         
-        with zipfile.ZipFile(output_path, 'w') as zipf:
-            for i, image in enumerate(images):
-                img_filename = f"page_{i+1}.png"
-                img_path = f"downloads/temp_{img_filename}"
-                image.save(img_path, "PNG")
-                zipf.write(img_path, img_filename)
-                os.remove(img_path)  # Clean up temp image
+        if stream:
+            # Pages are rendered while the archive goes out, after this handler's spool file is gone
+            input_path = file.detach()
+            chunks = stream_archive(lambda archive: raster.rasterize(input_path, archive, page_indices, **options))
+            return await stream_chunks(chunks, filename=output_filename, media_type="application/zip", headers=cache.headers,
+                                       on_close=lambda: os.path.exists(input_path) and os.unlink(input_path))
+        
+        with ArchiveWriter(output_path) as archive:
+            await raster.rasterize(file.path, archive, page_indices, **options)
+        
+        await cache.store(output_path, media_type="application/zip", filename=output_filename)
         
         return FileResponse(
             output_path,
             media_type="application/zip",
             filename=output_filename,
-            headers={"Content-Disposition": f"attachment; filename={output_filename}"}
+            headers={"Content-Disposition": f"attachment; filename={output_filename}", **cache.headers}
         )
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error converting PDF to images: {str(e)}")
 
-@router.post("/unlock")
-async def unlock_pdf(file: UploadFile = File(...), password: str = Form(...)):
+@router.post("/unlock", summary="PDF Unlock")
+async def unlock_pdf(file: SpooledUpload = Depends(spool_file), password: str = Form(...), stream: bool = Depends(stream_requested)):
     """Remove password protection from PDF"""
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
     try:
-        content = await file.read()
-        reader = PdfReader(io.BytesIO(content))
-        
-        if reader.is_encrypted:
-            if not reader.decrypt(password):
-                raise HTTPException(status_code=400, detail="Invalid password")
-        
-        writer = PdfWriter()
-        for page in reader.pages:
-            writer.add_page(page)
-        
         output_filename = f"unlocked_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
+        if stream:
+            return await stream_tool(_rewrite, file.path, STREAM_OUTPUT, decrypt_password=password,
+                                     filename=output_filename, media_type="application/pdf")
+        
+        await run_tool(_rewrite, file.path, output_path, decrypt_password=password)
         
         return FileResponse(
             output_path,
@@ -622,27 +741,21 @@ async def unlock_pdf(file: UploadFile = File(...), password: str = Form(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error unlocking PDF: {str(e)}")
 
-@router.post("/protect")
-async def protect_pdf(file: UploadFile = File(...), password: str = Form(...)):
+@router.post("/protect", summary="PDF Protect")
+async def protect_pdf(file: SpooledUpload = Depends(spool_file), password: str = Form(...), stream: bool = Depends(stream_requested)):
     """Add password protection to PDF"""
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
     try:
-        content = await file.read()
-        reader = PdfReader(io.BytesIO(content))
-        writer = PdfWriter()
-        
-        for page in reader.pages:
-            writer.add_page(page)
-        
-        writer.encrypt(password)
-        
         output_filename = f"protected_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
+        if stream:
+            return await stream_tool(_rewrite, file.path, STREAM_OUTPUT, encrypt_password=password,
+                                     filename=output_filename, media_type="application/pdf")
+        
+        await run_tool(_rewrite, file.path, output_path, encrypt_password=password)
         
         return FileResponse(
             output_path,
@@ -654,8 +767,8 @@ async def protect_pdf(file: UploadFile = File(...), password: str = Form(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error protecting PDF: {str(e)}")
 
-@router.post("/remove-background")
-async def remove_pdf_background(file: UploadFile = File(...)):
+@router.post("/remove-background", summary="PDF Background Remover")
+async def remove_pdf_background(file: SpooledUpload = Depends(spool_file), stream: bool = Depends(stream_requested)):
     """Remove background from PDF pages"""
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
@@ -664,19 +777,14 @@ async def remove_pdf_background(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail="PDF processing not available")
     
     try:
-        content = await file.read()
-        reader = PdfReader(io.BytesIO(content))
-        writer = PdfWriter()
-        
-        # For now, this is a placeholder - real background removal would require image processing
-        for page in reader.pages:
-            writer.add_page(page)
-        
         output_filename = f"bg_removed_{uuid.uuid4()}.pdf"
         output_path = f"downloads/{output_filename}"
         
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
+        # For now, this is a placeholder - real background removal would require image processing
+        if stream:
+            return await stream_tool(_rewrite, file.path, STREAM_OUTPUT, filename=output_filename, media_type="application/pdf")
+        
+        await run_tool(_rewrite, file.path, output_path)
         
         return FileResponse(
             output_path,
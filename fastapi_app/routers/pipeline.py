@@ -0,0 +1,365 @@
+"""Multi-step pipelines: several operations on one upload, decoded once and encoded once.
+
+``steps`` is a JSON list of operations applied in order, with the same
+parameter names as the single-tool routes, e.g. for ``/api/pipeline/image``::
+
+    [{"op": "resize", "width": 1200, "height": 800},
+     {"op": "sharpen"},
+     {"op": "convert", "output_format": "webp"},
+     {"op": "compress", "quality": 80}]
+
+Image steps run on one PIL image and PDF steps on one set of pypdf pages,
+in a single pool task.  Audio steps compile into one ffmpeg filtergraph and
+one ffmpeg run.  ``convert`` and ``compress`` only choose how the final
+encode is done, so there is exactly one lossy generation wherever they
+appear in the list.
+"""
+import json
+import os
+import uuid
+from typing import BinaryIO, List, Tuple, Union
+
+from fastapi import APIRouter, Depends, Form, HTTPException
+
+from core.cache import ToolCache, tool_cache
+from core.executor import cpu_bound, run_tool
+from core.timing import stage
+from core.streaming import STREAM_OUTPUT, stream_requested, stream_tool, streamable
+from core.uploads import SpooledUpload, spool_file
+from routers import audio_tools, image_tools, pdf_tools
+
+router = APIRouter()
+
+MAX_STEPS = int(os.getenv("PIPELINE_MAX_STEPS", "20"))
+MAX_UPSCALE = int(os.getenv("PIPELINE_MAX_UPSCALE", "4"))
+# Longest side any image step may produce, so one request cannot allocate an unbounded image
+MAX_IMAGE_SIDE = int(os.getenv("PIPELINE_MAX_IMAGE_SIDE", "16384"))
+
+# op -> (transform, {param: default}); parameter types follow the defaults.
+# A transform of None marks an encode option rather than an operation.
+IMAGE_STEPS = {
+    "resize": (image_tools.resize_op, {"width": 800, "height": 600}),
+    "rotate": (image_tools.rotate_op, {"angle": 90}),
+    "crop": (image_tools.crop_op, {"x": 0, "y": 0, "width": 400, "height": 400}),
+    "grayscale": (image_tools.grayscale_op, {}),
+    "sepia": (image_tools.sepia_op, {}),
+    "blur": (image_tools.blur_op, {"blur_radius": 2.0}),
+    "sharpen": (image_tools.sharpen_op, {}),
+    "vintage": (image_tools.vintage_op, {}),
+    "upscale": (image_tools.upscale_op, {"scale_factor": 2}),
+    "noise_reduction": (image_tools.noise_reduce_op, {}),
+    "convert": (None, {"output_format": "png"}),
+    "compress": (None, {"quality": 85}),
+}
+IMAGE_INPUTS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+IMAGE_OUTPUTS = ['png', 'jpg', 'jpeg', 'bmp', 'tiff', 'webp']
+
+PDF_STEPS = {
+    "unlock": {"password": ""},
+    "pages": {"start_page": 1, "end_page": None},
+    "rotate": {"rotation": 90},
+    "metadata": {"title": "", "author": "", "subject": ""},
+    "compress": {},
+    "protect": {"password": ""},
+}
+
+AUDIO_STEPS = {
+    "trim": (audio_tools.trim_filter, {"start_time": 0.0, "duration": 30.0}),
+    "enhance": (audio_tools.enhance_filter, {"noise_reduction": True}),
+    "speed": (audio_tools.speed_filter, {"speed_factor": 1.5}),
+    "equalizer": (audio_tools.equalizer_filter, {"bass": 0, "treble": 0}),
+    "reverb": (lambda: audio_tools.REVERB_FILTER, {}),
+    "fade": (audio_tools.fade_filter, {"fade_in": 2, "fade_out": 2}),
+    "normalize": (lambda: audio_tools.NORMALIZE_FILTER, {}),
+    "pitch_shift": (audio_tools.pitch_filter, {"semitones": 2}),
+    "voice": (audio_tools.voice_filter, {"effect": "robot"}),
+    "silence_remove": (lambda: audio_tools.SILENCE_REMOVE_FILTER, {}),
+    "loop": (audio_tools.loop_filter, {"loop_count": 3}),
+    "convert": (None, {"output_format": "mp3"}),
+}
+AUDIO_CODECS = {
+    "mp3": "libmp3lame",
+    "wav": "pcm_s16le",
+    "ogg": "libvorbis",
+    "flac": "flac",
+    "aac": "aac",
+    "m4a": "aac",
+}
+
+Plan = List[Tuple[str, dict]]
+
+
+def _coerce(value, default):
+    if value is None:
+        return None
+    if isinstance(default, bool):
+        if isinstance(value, str):
+            return value.lower() in ("1", "true", "yes", "on")
+        return bool(value)
+    if default is None or isinstance(default, int):
+        return int(value)
+    return type(default)(value)
+
+
+def parse_steps(steps: str, params_for: dict) -> Plan:
+    """Validate ``steps`` against ``{op: {param: default}}``; returns [(op, params)] with defaults filled in"""
+    try:
+        raw = json.loads(steps)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"steps is not valid JSON: {e}")
+    if not isinstance(raw, list) or not raw:
+        raise ValueError("steps must be a non-empty list")
+    if len(raw) > MAX_STEPS:
+        raise ValueError(f"At most {MAX_STEPS} steps are allowed")
+
+    plan = []
+    for index, step in enumerate(raw, 1):
+        if not isinstance(step, dict) or step.get("op") not in params_for:
+            raise ValueError(f"Step {index}: op must be one of {sorted(params_for)}")
+        op = step["op"]
+        defaults = params_for[op]
+        unknown = set(step) - set(defaults) - {"op"}
+        if unknown:
+            raise ValueError(f"Step {index} ({op}): unknown parameters {sorted(unknown)}")
+        try:
+            params = {name: _coerce(step.get(name, default), default) for name, default in defaults.items()}
+        except (TypeError, ValueError):
+            raise ValueError(f"Step {index} ({op}): invalid parameter value")
+        plan.append((op, params))
+    return plan
+
+
+def _last(plan: Plan, op: str, param: str, default):
+    """The value the last ``op`` step gives ``param``, or ``default``"""
+    for name, params in reversed(plan):
+        if name == op:
+            return params[param]
+    return default
+
+
+def check_image_plan(plan: Plan) -> None:
+    """Reject image step parameters that cannot produce a sensible image"""
+    for index, (op, params) in enumerate(plan, 1):
+        if op in ("resize", "crop") and not (1 <= params["width"] <= MAX_IMAGE_SIDE and 1 <= params["height"] <= MAX_IMAGE_SIDE):
+            raise ValueError(f"Step {index} ({op}): width and height must be between 1 and {MAX_IMAGE_SIDE}")
+        if op == "crop" and (params["x"] < 0 or params["y"] < 0):
+            raise ValueError(f"Step {index} (crop): x and y must not be negative")
+        if op == "upscale" and not 1 <= params["scale_factor"] <= MAX_UPSCALE:
+            raise ValueError(f"Step {index} (upscale): scale_factor must be between 1 and {MAX_UPSCALE}")
+
+
+# Pipeline work, executed on the CPU pool
+@cpu_bound
+def _run_image(input_path: str, output: Union[str, BinaryIO], plan: Plan, output_format: str):
+    image = image_tools.open_image(input_path)
+    for index, (op, params) in enumerate(plan, 1):
+        transform = IMAGE_STEPS[op][0]
+        if op == "upscale" and max(image.size) * params["scale_factor"] > MAX_IMAGE_SIDE:
+            raise ValueError(f"Step {index} (upscale): the result would be larger than {MAX_IMAGE_SIDE} pixels")
+        if transform is not None:
+            image = transform(image, **params)
+
+    quality = _last(plan, "compress", "quality", None)
+    pil_format = "JPEG" if output_format in ['jpg', 'jpeg'] else output_format.upper()
+    options = {}
+    if quality is not None:
+        # PNG, BMP and TIFF are lossless: compress only asks for a tighter encode
+        options = {"quality": quality, "optimize": True} if pil_format in ("JPEG", "WEBP") else {"optimize": True}
+    image_tools.save_image(image_tools.encodable(image, output_format), output, pil_format, **options)
+
+
+@cpu_bound
+def _run_pdf(input_path: str, output: Union[str, BinaryIO], plan: Plan):
+    with stage("decode"):
+        reader = pdf_tools.PdfReader(input_path)
+    if plan[0][0] == "unlock" and reader.is_encrypted:
+        if not reader.decrypt(plan[0][1]["password"]):
+            raise ValueError("Invalid password")
+
+    pages = list(reader.pages)
+    metadata = {}
+    for op, params in plan:
+        if op == "pages":
+            end_page = params["end_page"] if params["end_page"] is not None else len(pages)
+            if params["start_page"] < 1 or end_page > len(pages) or params["start_page"] > end_page:
+                raise ValueError(f"Invalid page range (the document has {len(pages)} pages)")
+            pages = pages[params["start_page"] - 1:end_page]
+        elif op == "rotate":
+            for page in pages:
+                page.rotate(params["rotation"])
+        elif op == "metadata":
+            metadata.update({f"/{name.title()}": value for name, value in params.items() if value})
+
+    writer = pdf_tools.PdfWriter()
+    for page in pages:
+        writer.add_page(page)
+    if any(op == "compress" for op, _ in plan):
+        for page in writer.pages:
+            page.compress_content_streams()
+        if hasattr(writer, "compress_identical_objects"):
+            writer.compress_identical_objects()
+    if metadata:
+        writer.add_metadata(metadata)
+    if plan[-1][0] == "protect":
+        writer.encrypt(plan[-1][1]["password"])
+    with stage("encode"):
+        writer.write(output)
+
+
+def _bad_request(e: ValueError):
+    return HTTPException(status_code=400, detail=f"Invalid pipeline: {str(e)}")
+
+
+@router.post("/image", summary="Image Pipeline")
+async def image_pipeline(
+    file: SpooledUpload = Depends(spool_file),
+    steps: str = Form(...),
+    cache: ToolCache = Depends(tool_cache("pipeline_image")),
+    stream: bool = Depends(stream_requested)
+):
+    """Run several image operations with a single decode and encode"""
+    if not image_tools.HAS_IMAGE_SUPPORT:
+        raise HTTPException(status_code=500, detail="Image processing not available")
+
+    if not file.filename.lower().endswith(IMAGE_INPUTS):
+        raise HTTPException(status_code=400, detail="Unsupported image format")
+
+    try:
+        plan = parse_steps(steps, {op: params for op, (_, params) in IMAGE_STEPS.items()})
+        check_image_plan(plan)
+        output_format = _last(plan, "convert", "output_format", file.filename.split('.')[-1]).lower()
+        if output_format not in IMAGE_OUTPUTS:
+            raise ValueError(f"Unsupported output format. Supported: {IMAGE_OUTPUTS}")
+    except ValueError as e:
+        raise _bad_request(e)
+
+    try:
+        cached = await cache.lookup(file, steps=plan, output_format=output_format)
+        if cached:
+            return cached
+
+        output_filename = f"pipeline_{uuid.uuid4()}.{output_format}"
+        output_path = f"downloads/{output_filename}"
+
+        if stream and streamable(output_filename):
+            return await stream_tool(_run_image, file.path, STREAM_OUTPUT, plan, output_format, filename=output_filename, headers=cache.headers)
+
+        await run_tool(_run_image, file.path, output_path, plan, output_format)
+
+        return await cache.store(output_path, {
+            "success": True,
+            "message": f"Image pipeline completed ({len(plan)} steps)",
+            "download_url": f"/downloads/{output_filename}",
+            "filename": output_filename,
+            "steps": [op for op, _ in plan]
+        })
+
+    except ValueError as e:
+        # Step parameters that only turn out wrong against the image itself
+        raise _bad_request(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running image pipeline: {str(e)}")
+
+
+@router.post("/pdf", summary="PDF Pipeline")
+async def pdf_pipeline(
+    file: SpooledUpload = Depends(spool_file),
+    steps: str = Form(...),
+    cache: ToolCache = Depends(tool_cache("pipeline_pdf")),
+    stream: bool = Depends(stream_requested)
+):
+    """Run several PDF operations with a single read and write"""
+    if not pdf_tools.HAS_PDF_SUPPORT:
+        raise HTTPException(status_code=500, detail="PDF processing not available")
+
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+    try:
+        plan = parse_steps(steps, PDF_STEPS)
+        ops = [op for op, _ in plan]
+        # The password is needed to read the pages, and encryption applies to the written file
+        if "unlock" in ops[1:]:
+            raise ValueError("unlock must be the first step")
+        if "protect" in ops[:-1]:
+            raise ValueError("protect must be the last step")
+        if any(op == "rotate" and params["rotation"] % 90 for op, params in plan):
+            raise ValueError("rotation must be a multiple of 90")
+        if any(op == "pages" and params["start_page"] < 1 for op, params in plan):
+            raise ValueError("start_page must be at least 1")
+    except ValueError as e:
+        raise _bad_request(e)
+
+    try:
+        cached = await cache.lookup(file, steps=plan)
+        if cached:
+            return cached
+
+        output_filename = f"pipeline_{uuid.uuid4()}.pdf"
+        output_path = f"downloads/{output_filename}"
+
+        if stream:
+            return await stream_tool(_run_pdf, file.path, STREAM_OUTPUT, plan, filename=output_filename, headers=cache.headers)
+
+        await run_tool(_run_pdf, file.path, output_path, plan)
+
+        return await cache.store(output_path, {
+            "success": True,
+            "message": f"PDF pipeline completed ({len(plan)} steps)",
+            "download_url": f"/downloads/{output_filename}",
+            "filename": output_filename,
+            "steps": ops
+        })
+
+    except ValueError as e:
+        # A page range past the end of the document, or a wrong password
+        raise _bad_request(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running PDF pipeline: {str(e)}")
+
+
+@router.post("/audio", summary="Audio Pipeline")
+async def audio_pipeline(
+    file: SpooledUpload = Depends(spool_file),
+    steps: str = Form(...),
+    cache: ToolCache = Depends(tool_cache("pipeline_audio")),
+    stream: bool = Depends(stream_requested)
+):
+    """Run several audio effects as one FFmpeg filtergraph"""
+    try:
+        plan = parse_steps(steps, {op: params for op, (_, params) in AUDIO_STEPS.items()})
+        output_format = _last(plan, "convert", "output_format", "mp3").lower()
+        if output_format not in AUDIO_CODECS:
+            raise ValueError(f"Unsupported format. Supported: {list(AUDIO_CODECS)}")
+    except ValueError as e:
+        raise _bad_request(e)
+
+    try:
+        cached = await cache.lookup(file, steps=plan)
+        if cached:
+            return cached
+
+        output_filename = f"pipeline_{uuid.uuid4()}.{output_format}"
+        temp_output = f"downloads/{output_filename}"
+
+        filters = [AUDIO_STEPS[op][0](**params) for op, params in plan if AUDIO_STEPS[op][0] is not None]
+        ffmpeg_args = (["-af", ",".join(filters)] if filters else []) + ["-c:a", AUDIO_CODECS[output_format]]
+
+        if stream and audio_tools.can_stream(output_filename):
+            return await audio_tools.stream_ffmpeg(file.path, output_filename, ffmpeg_args, cache.headers)
+
+        if not await run_tool(audio_tools.run_ffmpeg_command, file.path, temp_output, ffmpeg_args):
+            raise RuntimeError("FFmpeg failed to process the audio")
+
+        file_size_mb = round(os.path.getsize(temp_output) / (1024 * 1024), 1)
+        return await cache.store(temp_output, {
+            "success": True,
+            "message": f"Audio pipeline completed ({len(plan)} steps)",
+            "download_url": f"/downloads/{output_filename}",
+            "filename": output_filename,
+            "file_size": f"{file_size_mb} MB",
+            "steps": [op for op, _ in plan]
+        })
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running audio pipeline: {str(e)}")
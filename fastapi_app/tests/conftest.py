@@ -0,0 +1,39 @@
+import asyncio
+import os
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Run each test in a directory of its own: the app writes to ``uploads/`` and ``downloads/``"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def sqlite_url(workdir, monkeypatch):
+    """A SQLite file as ``DATABASE_URL``, with fresh engines"""
+    import database
+
+    url = f"sqlite:///{workdir / 'test.sqlite3'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.delenv("DATABASE_ASYNC_URL", raising=False)
+    for name in ("_engine", "_session_factory", "_async_engine", "_async_session_factory"):
+        monkeypatch.setattr(database, name, None)
+    yield url
+    asyncio.run(database.dispose())
+
+
+@pytest.fixture
+def client(workdir):
+    """HTTP client for the whole app, served in-process; startup tasks are not run"""
+    import httpx
+
+    import main
+    from core import executor
+
+    os.makedirs("uploads", exist_ok=True)
+    os.makedirs("downloads", exist_ok=True)
+    yield httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test", timeout=60)
+    executor.shutdown()
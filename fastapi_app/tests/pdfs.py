@@ -0,0 +1,89 @@
+"""Small hand-built PDFs with the structures merge and split must preserve.
+
+Every page of ``linked_pdf`` draws the same font and image, inherits its
+resources and media box from the page tree, and has a link annotation to
+the next page (the last links back to the first).
+"""
+from typing import List
+
+IMAGE_SIDE = 32
+
+
+def _pdf(objects: List[bytes]) -> bytes:
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def _stream(data: bytes, dictionary: bytes = b"") -> bytes:
+    return b"<< /Length %d%s >>\nstream\n" % (len(data), dictionary) + data + b"\nendstream"
+
+
+def linked_pdf(path: str, pages: int, label: str = "Doc") -> str:
+    # 1 catalog, 2 page tree, 3 font, 4 image, then (page, content, link) triples
+    image = bytes((x * 8 + y) % 256 for y in range(IMAGE_SIDE) for x in range(IMAGE_SIDE))
+    objects = [
+        b"",
+        b"",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        _stream(image, b" /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                       b"/BitsPerComponent 8" % (IMAGE_SIDE, IMAGE_SIDE)),
+    ]
+    first_page = len(objects) + 1
+    kids = []
+    for number in range(pages):
+        page_ref = len(objects) + 1
+        next_page = first_page + 3 * ((number + 1) % pages)
+        kids.append(b"%d 0 R" % page_ref)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /Contents %d 0 R /Annots [%d 0 R] >>"
+                       % (page_ref + 1, page_ref + 2))
+        text = f"BT /F1 18 Tf 72 700 Td ({label} page {number + 1}) Tj ET q 64 0 0 64 72 600 cm /Im1 Do Q"
+        objects.append(_stream(text.encode("latin-1")))
+        objects.append(b"<< /Type /Annot /Subtype /Link /Rect [72 600 136 664] /Border [0 0 0] "
+                       b"/Dest [%d 0 R /Fit] >>" % next_page)
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    # Resources and media box are inherited by every page
+    objects[1] = (b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d /MediaBox [0 0 612 792] "
+                  b"/Resources << /Font << /F1 3 0 R >> /XObject << /Im1 4 0 R >> >> >>" % pages)
+    with open(path, "wb") as f:
+        f.write(_pdf(objects))
+    return path
+
+
+def encrypted_copy(source: str, path: str, user_password: str = "") -> str:
+    """``source`` encrypted with RC4 (no extra packages needed)"""
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter(clone_from=PdfReader(source))
+    writer.encrypt(user_password=user_password, owner_password="owner", algorithm="RC4-128")
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def page_texts(path: str) -> List[str]:
+    from pypdf import PdfReader
+
+    return [page.extract_text().strip() for page in PdfReader(path, strict=True).pages]
+
+
+def link_targets(path: str) -> List[object]:
+    """For each page, the 0-based index of the page its link leads to (None when it leads nowhere)"""
+    from pypdf import PdfReader, generic
+
+    reader = PdfReader(path, strict=True)
+    numbers = {page.indirect_reference.idnum: index for index, page in enumerate(reader.pages)}
+    targets = []
+    for page in reader.pages:
+        annotation = page["/Annots"][0].get_object()
+        target = annotation["/Dest"][0]
+        targets.append(numbers.get(target.idnum) if isinstance(target, generic.IndirectObject) else None)
+    return targets
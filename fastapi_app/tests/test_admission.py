@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from core import admission
+from core.admission import AdmissionMiddleware, Rejected, ToolClass, cost_for
+
+
+def test_cost_for_picks_the_longest_prefix():
+    assert cost_for("/api/pdf/ocr") == (admission.HEAVY, 4)
+    assert cost_for("/api/pdf/split") == (admission.MODERATE, 1)
+    assert cost_for("/api/pdf/ocr-extra") == (admission.MODERATE, 1)
+    assert cost_for("/api/unknown") == (admission.MODERATE, 1)
+
+
+def test_requests_within_the_budget_are_admitted_at_once():
+    async def scenario():
+        tool_class = ToolClass("test", budget=3, max_queue=4, max_wait=1.0)
+        granted = [await tool_class.acquire(1), await tool_class.acquire(2)]
+        assert granted == [1, 2] and tool_class.in_use == 3
+        # Heavier than the whole budget: it gets the budget
+        for units in granted:
+            tool_class.release(units, 0.0)
+        assert await tool_class.acquire(10) == 3
+
+    asyncio.run(scenario())
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    async def scenario():
+        tool_class = ToolClass("test", budget=2, max_queue=4, max_wait=5.0)
+        held = await tool_class.acquire(1)
+        admitted = []
+
+        async def request(name, weight):
+            granted = await tool_class.acquire(weight)
+            admitted.append(name)
+            return granted
+
+        heavy = asyncio.create_task(request("heavy", 2))
+        await asyncio.sleep(0)
+        light = asyncio.create_task(request("light", 1))
+        # The light request would fit, but must not overtake the heavy one
+        await asyncio.sleep(0.01)
+        assert tool_class.stats()["queued"] == 2 and admitted == []
+
+        tool_class.release(held, 0.1)
+        await asyncio.sleep(0.01)
+        assert admitted == ["heavy"]
+        tool_class.release(await heavy, 0.1)
+        await light
+        assert admitted == ["heavy", "light"]
+
+    asyncio.run(scenario())
+
+
+def test_a_full_queue_is_rejected_with_a_retry_estimate():
+    async def scenario():
+        tool_class = ToolClass("test", budget=1, max_queue=1, max_wait=5.0)
+        await tool_class.acquire(1)
+        queued = asyncio.create_task(tool_class.acquire(1))
+        await asyncio.sleep(0)
+
+        with pytest.raises(Rejected) as rejected:
+            await tool_class.acquire(1)
+        assert rejected.value.reason == "queue_full"
+        assert 1 <= rejected.value.retry_after <= admission.RETRY_AFTER_MAX
+        assert tool_class.stats()["rejected"] == 1
+        queued.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_waiting_past_max_wait_is_rejected_and_leaves_the_queue():
+    async def scenario():
+        tool_class = ToolClass("test", budget=1, max_queue=4, max_wait=0.05)
+        await tool_class.acquire(1)
+
+        with pytest.raises(Rejected) as rejected:
+            await tool_class.acquire(1)
+        assert rejected.value.reason == "timeout"
+        assert tool_class.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_unbounded_waiters_are_never_rejected():
+    async def scenario():
+        tool_class = ToolClass("test", budget=1, max_queue=0, max_wait=0.01)
+        held = await tool_class.acquire(1)
+        waiter = asyncio.create_task(tool_class.acquire(1, bounded=False))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        tool_class.release(held, 0.0)
+        assert await waiter == 1
+
+    asyncio.run(scenario())
+
+
+def test_a_cancelled_waiter_gives_its_place_up():
+    async def scenario():
+        tool_class = ToolClass("test", budget=1, max_queue=4, max_wait=5.0)
+        held = await tool_class.acquire(1)
+        waiter = asyncio.create_task(tool_class.acquire(1))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert tool_class.stats()["queued"] == 0
+        tool_class.release(held, 0.0)
+        assert tool_class.in_use == 0
+
+    asyncio.run(scenario())
+
+
+def test_middleware_answers_429_when_the_class_is_full(monkeypatch):
+    tool_class = ToolClass(admission.MODERATE, budget=1, max_queue=0, max_wait=1.0)
+    monkeypatch.setitem(admission.tool_classes, admission.MODERATE, tool_class)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        middleware = AdmissionMiddleware(app)
+
+        async def call():
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {"type": "http", "method": "POST", "path": "/api/pdf/split", "headers": []}
+            await middleware(scope, None, send)
+            return messages
+
+        first = asyncio.create_task(call())
+        await asyncio.sleep(0)
+        assert tool_class.in_use == 1
+
+        rejected = await call()
+        assert rejected[0]["status"] == 429
+        assert dict(rejected[0]["headers"])[b"retry-after"].isdigit()
+        assert b"Server busy" in rejected[1]["body"]
+
+        release.set()
+        assert (await first)[0]["status"] == 200
+        assert tool_class.in_use == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.pool import StaticPool
+
+import database
+
+
+def test_no_database_url_disables_the_database(monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+
+    with pytest.raises(database.DatabaseNotConfigured):
+        database.database_url()
+    assert asyncio.run(database.health())["status"] == "disabled"
+
+
+def test_async_url_is_derived_from_database_url(monkeypatch):
+    monkeypatch.delenv("DATABASE_ASYNC_URL", raising=False)
+    monkeypatch.setenv("DATABASE_URL", "postgres://user:pw@db/app")
+    assert database.database_url() == "postgresql://user:pw@db/app"
+    assert database.async_database_url() == "postgresql+asyncpg://user:pw@db/app"
+
+    monkeypatch.setenv("DATABASE_URL", "oracle://db/app")
+    with pytest.raises(database.DatabaseNotConfigured):
+        database.async_database_url()
+
+
+def test_in_memory_sqlite_shares_one_connection():
+    options = database._engine_options("sqlite://", database.TimedQueuePool)
+    assert options["poolclass"] is StaticPool
+
+
+def test_sessions_use_the_timed_pool(sqlite_url):
+    with database.engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+        assert database.pool_status()["sync"]["checked_out"] == 1
+    assert database.pool_status()["sync"]["class"] == "TimedQueuePool"
+    assert database.pool_status()["sync"]["checked_out"] == 0
+
+    db = database.SessionLocal()
+    try:
+        database.Base.metadata.create_all(database.engine, tables=[database.Tool.__table__])
+        db.add(database.Tool(slug="pdf_merge", name="Pdf Merge", category="pdf"))
+        db.commit()
+        assert db.query(database.Tool).filter_by(slug="pdf_merge").one().category == "pdf"
+    finally:
+        db.close()
+
+
+def test_health_probes_the_database(sqlite_url):
+    health = asyncio.run(database.health())
+
+    assert health["status"] == "ok"
+    assert health["engine"] in ("async", "sync")
+    assert health["latency_ms"] >= 0
+
+
+def test_only_waiting_for_a_connection_counts_as_a_pool_timeout(sqlite_url, monkeypatch):
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 1)
+    monkeypatch.setattr(database, "DB_MAX_OVERFLOW", 0)
+    monkeypatch.setattr(database, "DB_POOL_TIMEOUT", 0.05)
+    before = database.POOL_TIMEOUTS._values.get(("sync",), 0)
+
+    with database.engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            database.engine.connect()
+    assert database.POOL_TIMEOUTS._values.get(("sync",), 0) == before + 1
+
+
+def test_a_failed_connection_is_not_a_pool_timeout(workdir, sqlite_url, monkeypatch):
+    # A database file in a directory that does not exist cannot be opened
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{workdir / 'missing' / 'test.sqlite3'}")
+    before = database.POOL_TIMEOUTS._values.get(("sync",), 0)
+
+    with pytest.raises(exc.OperationalError):
+        database.engine.connect()
+    assert database.POOL_TIMEOUTS._values.get(("sync",), 0) == before
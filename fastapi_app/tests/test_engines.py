@@ -0,0 +1,28 @@
+import pickle
+from types import SimpleNamespace
+
+import pytest
+
+from core import engines
+
+
+class _NotFoundError(Exception):
+    # Like pytesseract's TesseractNotFoundError: rebuilding it from its
+    # args fails, so it cannot cross back from a worker process
+    def __init__(self):
+        super().__init__("tesseract is not installed")
+
+
+def _raise(*args, **kwargs):
+    raise _NotFoundError()
+
+
+def test_engine_errors_leave_the_worker_picklable(monkeypatch):
+    monkeypatch.setattr(engines, "tesserocr", SimpleNamespace(available=False))
+    monkeypatch.setattr(engines, "pytesseract", SimpleNamespace(available=True, image_to_string=_raise))
+    with pytest.raises(TypeError):
+        pickle.loads(pickle.dumps(_NotFoundError()))
+
+    with pytest.raises(RuntimeError, match="tesseract is not installed") as raised:
+        engines.ocr(object())
+    assert str(pickle.loads(pickle.dumps(raised.value))) == "tesseract is not installed"
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from core import executor
+from core.executor import CPU
+
+
+@pytest.fixture
+def fork_pool(monkeypatch):
+    # No forkserver: workers inherit this module as it is
+    monkeypatch.setattr(executor, "WORKER_START_METHOD", "fork")
+    monkeypatch.setattr(executor, "CPU_WORKERS", 2)
+    created = []
+
+    class RecordedPool(ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(executor, "ProcessPoolExecutor", RecordedPool)
+    yield created
+    executor.shutdown()
+
+
+def _exit_worker_once(marker: str):
+    # The retry on the replacement pool finds the marker and succeeds
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return os.getpid()
+
+
+def test_jobs_of_a_broken_pool_are_retried_on_one_replacement(fork_pool, workdir):
+    async def scenario():
+        broken = executor._get_pool(CPU)
+        # Several jobs are in flight on the pool when one of its workers dies
+        jobs = [executor.run_in_pool(CPU, _exit_worker_once, str(workdir / "died"))]
+        jobs += [executor.run_in_pool(CPU, time.sleep, 0.2) for _ in range(4)]
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        return broken, results
+
+    broken, results = asyncio.run(scenario())
+
+    assert isinstance(results[0], int) and results[1:] == [None] * 4
+    assert fork_pool == [broken, executor._cpu_pool]
+    assert executor._cpu_pool.submit(os.getpid).result(timeout=10) > 0
+
+
+def test_resetting_a_replaced_pool_leaves_the_current_one_alone(fork_pool):
+    broken = executor._get_pool(CPU)
+    executor._reset_cpu_pool(broken)
+    replacement = executor._get_pool(CPU)
+
+    executor._reset_cpu_pool(broken)
+    assert executor._cpu_pool is replacement
+    assert replacement.submit(os.getpid).result(timeout=10) > 0
@@ -0,0 +1,51 @@
+import asyncio
+import io
+import random
+import zipfile
+
+from PIL import Image
+
+STREAM = {"response_mode": "stream"}
+BYPASS = {"X-Tool-Cache": "bypass"}
+
+
+def _png(seed: int, side: int = 1200) -> bytes:
+    # Noise keeps the PNG large enough to fill several stream chunks
+    image = Image.frombytes("RGB", (side, side), random.Random(seed).randbytes(side * side * 3))
+    output = io.BytesIO()
+    image.save(output, "PNG", compress_level=1)
+    return output.getvalue()
+
+
+def _batch_resize(client, names, params=None, headers=None):
+    files = [("files", (name, _png(index), "image/png")) for index, name in enumerate(names)]
+    return client.post("/api/image/batch-resize", params=params, headers=headers, files=files,
+                       data={"width": "320", "height": "200"})
+
+
+def test_streamed_batch_resize_reads_every_input(client):
+    async def scenario():
+        async with client:
+            return await _batch_resize(client, [f"image_{n}.png" for n in range(6)], STREAM, BYPASS)
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.namelist() == [f"image_{n}.png" for n in range(6)]
+    for name in archive.namelist():
+        assert Image.open(archive.open(name)).size == (320, 200)
+
+
+def test_batch_resize_cache_is_keyed_on_the_entry_names(client):
+    async def scenario():
+        async with client:
+            first = await _batch_resize(client, ["alpha.png", "beta.png"])
+            renamed = await _batch_resize(client, ["gamma.png", "delta.png"])
+            again = await _batch_resize(client, ["gamma.png", "delta.png"])
+            return first, renamed, again, await client.get(again.json()["download_url"])
+
+    first, renamed, again, download = asyncio.run(scenario())
+
+    assert [response.headers["X-Tool-Cache"] for response in (first, renamed, again)] == ["MISS", "MISS", "HIT"]
+    assert zipfile.ZipFile(io.BytesIO(download.content)).namelist() == ["gamma.png", "delta.png"]
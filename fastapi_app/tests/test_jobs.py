@@ -0,0 +1,231 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+from core import jobs
+from core.jobs import Job, JobManager, MemoryJobBackend, QueueFull, SQLiteJobBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, workdir):
+    if request.param == "memory":
+        return MemoryJobBackend(max_queued=2)
+    return SQLiteJobBackend(str(workdir / "jobs.sqlite3"), max_queued=2)
+
+
+def _job(job_id: str, priority: int = 0) -> Job:
+    return Job(id=job_id, route="/api/pdf/test", priority=priority)
+
+
+def test_jobs_are_taken_by_priority_then_arrival(backend):
+    async def scenario():
+        backend.max_queued = 10
+        for job_id, priority in (("late", 5), ("first", -1), ("second", 0), ("third", 0)):
+            await backend.put(_job(job_id, priority))
+        taken = [await backend.take() for _ in range(4)]
+        assert [job.id for job in taken] == ["first", "second", "third", "late"]
+        assert all(job.state == jobs.RUNNING for job in taken)
+        assert await backend.queued_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_a_full_queue_rejects_jobs_and_cancelled_jobs_free_their_place(backend):
+    async def scenario():
+        await backend.put(_job("a"))
+        await backend.put(_job("b"))
+        with pytest.raises(QueueFull):
+            await backend.put(_job("c"))
+
+        cancelled = await backend.get("a")
+        cancelled.state = jobs.CANCELLED
+        await backend.save(cancelled)
+        assert await backend.queued_count() == 1
+
+        await backend.put(_job("c"))
+        # The cancelled job is never handed to a worker
+        assert [(await backend.take()).id for _ in range(2)] == ["b", "c"]
+
+    asyncio.run(scenario())
+
+
+def test_only_a_queued_job_is_cancelled(backend):
+    async def scenario():
+        await backend.put(_job("running"))
+        await backend.put(_job("waiting"))
+        await backend.take()
+
+        assert (await backend.cancel("running")).state == jobs.RUNNING
+        cancelled = await backend.cancel("waiting")
+        assert cancelled.state == jobs.CANCELLED and cancelled.finished_at is not None
+        assert (await backend.get("waiting")).state == jobs.CANCELLED
+        assert await backend.queued_count() == 0
+        assert await backend.cancel("missing") is None
+
+    asyncio.run(scenario())
+
+
+def test_progress_is_saved_only_while_a_job_runs(backend):
+    async def scenario():
+        await backend.put(_job("a"))
+        await backend.save_progress("a", 0.3)
+        assert (await backend.get("a")).progress == 0.0
+
+        job = await backend.take()
+        await backend.save_progress("a", 0.4)
+        assert (await backend.get("a")).progress == 0.4
+
+        job.state, job.progress = jobs.SUCCEEDED, 1.0
+        await backend.save(job)
+        # A late update leaves the finished job alone
+        await backend.save_progress("a", 0.6)
+        assert (await backend.get("a")).progress == 1.0
+
+    asyncio.run(scenario())
+
+
+def test_expire_forgets_only_jobs_finished_before_the_cutoff(backend):
+    async def scenario():
+        backend.max_queued = 10
+        now = time.time()
+        for job_id in ("old", "recent", "waiting"):
+            await backend.put(_job(job_id))
+        for job_id, finished_at in (("old", now - 100), ("recent", now - 1)):
+            job = await backend.get(job_id)
+            job.state, job.finished_at = jobs.SUCCEEDED, finished_at
+            await backend.save(job)
+
+        expired = await backend.expire(now - 10)
+        assert [job.id for job in expired] == ["old"]
+        assert await backend.get("old") is None
+        assert (await backend.get("recent")).state == jobs.SUCCEEDED
+        assert (await backend.get("waiting")).state == jobs.QUEUED
+
+    asyncio.run(scenario())
+
+
+async def _tool_app(scope, receive, send):
+    """Stands in for the application: echoes the body, or fails on /fail"""
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    jobs.report_progress(0.5)
+    seen = jobs.current_job().progress
+    if scope["path"].endswith("/fail"):
+        status, content_type, body = 400, b"application/json", json.dumps({"detail": "Bad input"}).encode()
+    else:
+        status, content_type, body = 200, b"application/pdf", b"result:%s:%.1f" % (body, seen)
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", content_type)]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _submit(manager: JobManager, route: str, body: bytes = b"input") -> Job:
+    job = manager.new_job(route)
+    with open(job.request_path, "wb") as f:
+        f.write(body)
+    return await manager.submit(job)
+
+
+async def _finished(manager: JobManager, job_id: str) -> Job:
+    for _ in range(200):
+        job = await manager.get(job_id)
+        if job.state in jobs.FINISHED_STATES:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_lifecycle(workdir):
+    async def scenario():
+        manager = JobManager(MemoryJobBackend(), workers=1)
+        await manager.start(_tool_app)
+        try:
+            submitted = await _submit(manager, "/api/pdf/echo")
+            job = await _finished(manager, submitted.id)
+            assert job.state == jobs.SUCCEEDED and job.status_code == 200
+            assert job.progress == 1.0
+            assert ["content-type", "application/pdf"] in job.result_headers
+            with open(job.result_path, "rb") as f:
+                assert f.read() == b"result:input:0.5"
+            assert not os.path.exists(job.request_path)
+            assert job.public()["result_url"] == f"/api/jobs/{job.id}/result"
+
+            failed = await _finished(manager, (await _submit(manager, "/api/pdf/fail")).id)
+            assert failed.state == jobs.FAILED and failed.error == "Bad input"
+            assert failed.public()["result_url"] is None
+        finally:
+            await manager.stop()
+
+        # Results go with their jobs once the result TTL has passed
+        assert await manager.expire(now=time.time() + jobs.JOB_RESULT_TTL + 1) == 2
+        assert await manager.get(job.id) is None
+        assert not os.path.exists(job.result_path)
+
+    asyncio.run(scenario())
+
+
+def test_only_queued_jobs_can_be_cancelled(workdir):
+    async def scenario():
+        # Not started: the job stays queued
+        manager = JobManager(MemoryJobBackend(max_queued=1), workers=1)
+        os.makedirs(jobs.JOBS_UPLOAD_DIR, exist_ok=True)
+        job = await _submit(manager, "/api/pdf/echo")
+        with pytest.raises(QueueFull):
+            await _submit(manager, "/api/pdf/echo")
+
+        cancelled = await manager.cancel(job.id)
+        assert cancelled.state == jobs.CANCELLED and cancelled.finished_at is not None
+        assert not os.path.exists(job.request_path)
+        assert await manager.backend.queued_count() == 0
+        assert await manager.cancel("missing") is None
+
+        await manager.start(_tool_app)
+        try:
+            done = await _finished(manager, (await _submit(manager, "/api/pdf/echo")).id)
+            assert (await manager.cancel(done.id)).state == jobs.SUCCEEDED
+            assert (await manager.get(job.id)).state == jobs.CANCELLED
+        finally:
+            await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_running_jobs_report_their_progress_through_the_backend(workdir):
+    gate = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        while (await receive()).get("more_body"):
+            pass
+        jobs.report_progress(0.25)
+        await gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"done"})
+
+    async def scenario():
+        manager = JobManager(SQLiteJobBackend(str(workdir / "jobs.sqlite3")), workers=1)
+        await manager.start(slow_app)
+        try:
+            job = await _submit(manager, "/api/pdf/slow")
+            for _ in range(200):
+                seen = await manager.get(job.id)
+                if seen.progress:
+                    break
+                await asyncio.sleep(0.01)
+            assert seen.state == jobs.RUNNING and seen.progress == 0.25
+            gate.set()
+            assert (await _finished(manager, job.id)).progress == 1.0
+        finally:
+            await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_progress_outside_a_job_is_ignored():
+    jobs.report_progress(0.5)
+    assert jobs.current_job() is None
@@ -0,0 +1,71 @@
+import io
+
+import pytest
+from pypdf import PdfReader
+
+from core.merge import merge
+from pdfs import encrypted_copy, link_targets, linked_pdf, page_texts
+
+
+def test_merge_keeps_every_page_in_order(workdir):
+    first, second = linked_pdf("a.pdf", 3, "A"), linked_pdf("b.pdf", 4, "B")
+
+    result = merge([first, second], "out.pdf")
+
+    assert result["pages"] == 7
+    assert page_texts("out.pdf") == [f"A page {n}" for n in range(1, 4)] + [f"B page {n}" for n in range(1, 5)]
+
+
+def test_merge_writes_identical_objects_once(workdir):
+    source = linked_pdf("a.pdf", 3)
+
+    result = merge([source, source], "out.pdf")
+
+    # The font and the image of the second copy are the first copy's
+    assert result["deduplicated_objects"] >= 2
+    reader = PdfReader("out.pdf", strict=True)
+    images = {page["/Resources"]["/XObject"].raw_get("/Im1").idnum for page in reader.pages}
+    fonts = {page["/Resources"]["/Font"].raw_get("/F1").idnum for page in reader.pages}
+    assert len(images) == 1 and len(fonts) == 1
+
+
+def test_merge_keeps_links_within_each_input(workdir):
+    first, second = linked_pdf("a.pdf", 3), linked_pdf("b.pdf", 2)
+
+    merge([first, second], "out.pdf")
+
+    # Each input's pages link round its own pages, now at their merged positions
+    assert link_targets("out.pdf") == [1, 2, 0, 4, 3]
+
+
+def test_merge_inherited_attributes_reach_the_pages(workdir):
+    merge([linked_pdf("a.pdf", 2)], "out.pdf")
+
+    for page in PdfReader("out.pdf", strict=True).pages:
+        assert [float(value) for value in page.mediabox] == [0, 0, 612, 792]
+        assert "/Im1" in page["/Resources"]["/XObject"]
+
+
+def test_merge_to_a_stream(workdir):
+    output = io.BytesIO()
+
+    merge([linked_pdf("a.pdf", 2), linked_pdf("b.pdf", 1)], output)
+
+    assert len(PdfReader(io.BytesIO(output.getvalue()), strict=True).pages) == 3
+
+
+def test_merge_decrypts_inputs_without_a_user_password(workdir):
+    source = linked_pdf("a.pdf", 2, "Locked")
+    locked = encrypted_copy(source, "locked.pdf")
+
+    merge([locked, linked_pdf("b.pdf", 1, "Open")], "out.pdf")
+
+    assert not PdfReader("out.pdf").is_encrypted
+    assert page_texts("out.pdf") == ["Locked page 1", "Locked page 2", "Open page 1"]
+
+
+def test_merge_rejects_password_protected_inputs(workdir):
+    locked = encrypted_copy(linked_pdf("a.pdf", 1), "locked.pdf", user_password="secret")
+
+    with pytest.raises(ValueError, match="Password-protected"):
+        merge([locked], "out.pdf")
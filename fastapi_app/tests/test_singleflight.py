@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from fastapi import Response
+
+from core import cache
+from core.singleflight import SingleFlight
+from core.uploads import SpooledUpload
+
+
+def test_followers_share_the_leaders_result():
+    async def scenario():
+        flights = SingleFlight()
+        flight, leader = flights.join("key")
+        followers = [flights.join("key") for _ in range(2)]
+        assert leader and not any(lead for _, lead in followers)
+
+        waiting = [asyncio.create_task(flights.wait(flight)) for flight, _ in followers]
+        await asyncio.sleep(0)
+        assert flights.stats()["waiting"] == 2
+
+        flights.complete(flight, {"path": "out.pdf"})
+        assert await asyncio.gather(*waiting) == [{"path": "out.pdf"}] * 2
+        assert flights.stats() == {"in_flight": 0, "waiting": 0, "led": 1, "shared": 2, "failed_leaders": 0}
+
+    asyncio.run(scenario())
+
+
+def test_a_failed_leader_resolves_its_followers_with_none():
+    async def scenario():
+        flights = SingleFlight()
+        flight, _ = flights.join("key")
+        follower = asyncio.create_task(flights.wait(flights.join("key")[0]))
+        await asyncio.sleep(0)
+
+        flights.fail(flight)
+        assert await follower is None
+        assert flights.failed == 1 and flights.in_flight == 0
+        # The key is free again: the next caller leads
+        assert flights.join("key")[1]
+
+    asyncio.run(scenario())
+
+
+def test_a_cancelled_follower_leaves_the_others_waiting():
+    async def scenario():
+        flights = SingleFlight()
+        flight, _ = flights.join("key")
+        cancelled = asyncio.create_task(flights.wait(flights.join("key")[0]))
+        other = asyncio.create_task(flights.wait(flights.join("key")[0]))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert not flight.future.cancelled()
+
+        flights.complete(flight, {"path": "out.pdf"})
+        assert await other == {"path": "out.pdf"}
+
+    asyncio.run(scenario())
+
+
+def _upload(workdir) -> SpooledUpload:
+    path = workdir / "in.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    return SpooledUpload(str(path), "in.pdf", 8, "0" * 64)
+
+
+def _tool_cache() -> cache.ToolCache:
+    # Result cache off: only single-flight is in play
+    return cache.ToolCache("test_tool", False, Response(), single_flight=True)
+
+
+def test_when_the_leader_fails_a_follower_takes_over(workdir, monkeypatch):
+    monkeypatch.setattr(cache, "flights", SingleFlight())
+    upload = _upload(workdir)
+
+    async def scenario():
+        leader = _tool_cache()
+        assert await leader.lookup(upload, quality=80) is None
+
+        followers = [_tool_cache() for _ in range(3)]
+        lookups = [asyncio.create_task(follower.lookup(upload, quality=80)) for follower in followers]
+        await asyncio.sleep(0)
+        assert not any(lookup.done() for lookup in lookups)
+
+        # The leader's request ends without storing a result
+        leader.release()
+        await asyncio.sleep(0.01)
+        done = [lookup for lookup in lookups if lookup.done()]
+        assert len(done) == 1 and done[0].result() is None
+        successor = followers[lookups.index(done[0])]
+        assert successor.status == cache.BYPASS
+
+        output = workdir / "out.pdf"
+        output.write_bytes(b"%PDF-1.4 result")
+        await successor.store(str(output), {"success": True, "download_url": "/downloads/out.pdf"})
+
+        results = await asyncio.gather(*(lookup for lookup in lookups if lookup is not done[0]))
+        assert results == [{"success": True, "download_url": "/downloads/out.pdf"}] * 2
+        assert [follower.status for follower in followers].count(cache.SHARED) == 2
+        assert cache.flights.stats()["failed_leaders"] == 1 and cache.flights.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_a_streaming_request_never_leads(workdir, monkeypatch):
+    monkeypatch.setattr(cache, "flights", SingleFlight())
+    upload = _upload(workdir)
+
+    async def scenario():
+        streaming = cache.ToolCache("test_tool", False, Response(), stream=True, single_flight=True)
+        assert await streaming.lookup(upload) is None
+        assert cache.flights.in_flight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,93 @@
+import io
+import zipfile
+
+import pytest
+from pypdf import PdfReader
+
+from core.split import every_n_pages, part_name, split_parts, split_range
+from pdfs import encrypted_copy, link_targets, linked_pdf, page_texts
+
+
+def _split_all(source: str, parts):
+    names = [part_name("doc", first, last) for first, last in parts]
+    output = io.BytesIO()
+    result = split_parts(source, output, parts, names)
+    archive = zipfile.ZipFile(io.BytesIO(output.getvalue()))
+    return result, archive
+
+
+def test_every_n_pages():
+    assert every_n_pages(2, 5) == [(1, 2), (3, 4), (5, 5)]
+    with pytest.raises(ValueError):
+        every_n_pages(0, 5)
+
+
+def test_split_range_writes_the_requested_pages(workdir):
+    source = linked_pdf("in.pdf", 6)
+
+    assert split_range(source, "out.pdf", 2, 4) == 4
+    assert page_texts("out.pdf") == ["Doc page 2", "Doc page 3", "Doc page 4"]
+
+    assert split_range(source, "tail.pdf", 5) == 6
+    assert page_texts("tail.pdf") == ["Doc page 5", "Doc page 6"]
+
+
+@pytest.mark.parametrize("first,last", [(0, 2), (3, 7), (4, 2)])
+def test_split_range_rejects_pages_outside_the_document(workdir, first, last):
+    source = linked_pdf("in.pdf", 6)
+
+    with pytest.raises(ValueError, match="the document has 6 pages"):
+        split_range(source, "out.pdf", first, last)
+
+
+def test_split_parts_writes_one_pdf_per_range(workdir):
+    source = linked_pdf("in.pdf", 5)
+
+    result, archive = _split_all(source, every_n_pages(2, 5))
+
+    assert result["parts"] == 3
+    assert archive.namelist() == ["doc_pages_1-2.pdf", "doc_pages_3-4.pdf", "doc_page_5.pdf"]
+    texts = []
+    for name in archive.namelist():
+        reader = PdfReader(io.BytesIO(archive.read(name)), strict=True)
+        texts.extend(page.extract_text().strip() for page in reader.pages)
+    assert texts == [f"Doc page {n}" for n in range(1, 6)]
+
+
+def test_split_parts_reuse_objects_shared_between_parts(workdir):
+    source = linked_pdf("in.pdf", 4)
+
+    result, archive = _split_all(source, every_n_pages(1, 4))
+
+    # The font and image are serialised for the first part and reused by the rest
+    assert result["shared_objects"] >= 2 * 3
+    for name in archive.namelist():
+        page = PdfReader(io.BytesIO(archive.read(name)), strict=True).pages[0]
+        assert [float(value) for value in page.mediabox] == [0, 0, 612, 792]
+        assert page["/Resources"]["/XObject"]["/Im1"]["/Width"] == 32
+
+
+def test_split_links_to_other_parts_lead_nowhere(workdir):
+    source = linked_pdf("in.pdf", 4)
+
+    split_range(source, "out.pdf", 2, 3)
+
+    # Page 2 links to page 3, in the part; page 3 links to page 4, which is not
+    assert link_targets("out.pdf") == [1, None]
+    assert len(PdfReader("out.pdf", strict=True).pages) == 2
+
+
+def test_split_decrypts_input_without_a_user_password(workdir):
+    locked = encrypted_copy(linked_pdf("in.pdf", 3), "locked.pdf")
+
+    split_range(locked, "out.pdf", 2, 3)
+
+    assert not PdfReader("out.pdf").is_encrypted
+    assert page_texts("out.pdf") == ["Doc page 2", "Doc page 3"]
+
+
+def test_split_rejects_password_protected_input(workdir):
+    locked = encrypted_copy(linked_pdf("in.pdf", 2), "locked.pdf", user_password="secret")
+
+    with pytest.raises(ValueError, match="Password-protected"):
+        split_range(locked, "out.pdf", 1, 1)
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+from core import executor, jobs, storage
+from core.jobs import JobManager, MemoryJobBackend
+from core.storage import LocalStore, MemoryStore, PublishMiddleware, S3Store
+
+
+@pytest.fixture(params=["local", "memory"])
+def store(request, workdir):
+    return LocalStore(str(workdir / "store")) if request.param == "local" else MemoryStore()
+
+
+async def _read(store, key, start=0, end=None) -> bytes:
+    return b"".join([chunk async for chunk in store.get(key, start, end)])
+
+
+def test_store_round_trip(store, workdir):
+    source = workdir / "artifact.bin"
+    source.write_bytes(bytes(range(256)) * 10)
+
+    async def scenario():
+        assert await store.size("tool/artifact.bin") is None
+        assert await store.put_file("tool/artifact.bin", str(source)) == 2560
+        assert await store.size("tool/artifact.bin") == 2560
+        assert await _read(store, "tool/artifact.bin") == source.read_bytes()
+        assert await _read(store, "tool/artifact.bin", 10, 20) == source.read_bytes()[10:20]
+
+        async def chunks():
+            yield b"abc"
+            yield b"def"
+
+        assert await store.put_stream("streamed.txt", chunks()) == 6
+        assert await _read(store, "streamed.txt") == b"abcdef"
+
+        await store.delete("tool/artifact.bin")
+        await store.delete("tool/artifact.bin")
+        assert await store.size("tool/artifact.bin") is None
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def s3_store(monkeypatch):
+    pytest.importorskip("boto3")
+    moto_server = pytest.importorskip("moto.server")
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+
+    # A local S3 stand-in, spoken to over HTTP like the real thing
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    try:
+        host, port = server.get_host_and_port()
+        store = S3Store("artifacts", prefix="test/", endpoint_url=f"http://{host}:{port}")
+        store.client.create_bucket(Bucket="artifacts")
+        yield store
+    finally:
+        server.stop()
+        executor.shutdown()
+
+
+def test_s3_store_uploads_in_parts_and_reads_ranges(s3_store, workdir, monkeypatch):
+    # The smallest part S3 accepts, so the stream below goes up in three parts
+    monkeypatch.setattr(storage, "S3_PART_SIZE", 5 * 1024 * 1024)
+    block = bytes(range(256)) * 4096
+
+    async def chunks():
+        for _ in range(11):
+            yield block
+
+    async def scenario():
+        assert await s3_store.put_stream("tool/big.bin", chunks()) == 11 * len(block)
+        assert await s3_store.size("tool/big.bin") == 11 * len(block)
+        head = s3_store.client.head_object(Bucket="artifacts", Key="test/tool/big.bin", PartNumber=1)
+        assert head["PartsCount"] == 3
+
+        assert await _read(s3_store, "tool/big.bin", 1000, 1010) == block[1000:1010]
+        assert await _read(s3_store, "tool/big.bin", 11 * len(block) - 5) == block[-5:]
+
+        source = workdir / "small.bin"
+        source.write_bytes(b"small artifact")
+        assert await s3_store.put_file("tool/small.bin", str(source)) == 14
+        assert await _read(s3_store, "tool/small.bin") == b"small artifact"
+
+        await s3_store.delete("tool/big.bin")
+        assert await s3_store.size("tool/big.bin") is None
+        assert await s3_store.size("tool/small.bin") == 14
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("key", ["", "/etc/passwd", "../outside", "a//b", "a/./b"])
+def test_store_rejects_keys_outside_its_root(store, workdir, key):
+    source = workdir / "artifact.bin"
+    source.write_bytes(b"x")
+
+    with pytest.raises(ValueError, match="Invalid artifact key"):
+        asyncio.run(store.put_file(key, str(source)))
+
+
+def test_parse_range():
+    assert storage.parse_range("bytes=0-99", 1000) == (0, 100)
+    assert storage.parse_range("bytes=900-", 1000) == (900, 1000)
+    assert storage.parse_range("bytes=-100", 1000) == (900, 1000)
+    assert storage.parse_range("bytes=990-2000", 1000) == (990, 1000)
+    for header in ("bytes=1000-", "items=0-1", "bytes=0-1,5-6"):
+        with pytest.raises(ValueError):
+            storage.parse_range(header, 1000)
+
+
+def test_signed_download_urls(monkeypatch):
+    monkeypatch.setattr(storage, "SIGNING_KEY", "secret")
+
+    url = storage.download_url("tool/out.pdf")
+    path, _, token = url.partition("?token=")
+    assert path == "/downloads/tool/out.pdf"
+    assert storage.verify("tool/out.pdf", token)
+    assert not storage.verify("tool/other.pdf", token)
+    assert not storage.verify("tool/out.pdf", storage.sign("tool/out.pdf", ttl=-1))
+    assert not storage.verify("tool/out.pdf", None)
+
+
+def _json_app(payload: dict, status: int = 200):
+    async def app(scope, receive, send):
+        body = json.dumps(payload).encode()
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+async def _call(app, path: str = "/api/pdf/compress"):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await app({"type": "http", "method": "POST", "path": path, "headers": []}, None, send)
+    return messages[0]["status"], json.loads(b"".join(m.get("body", b"") for m in messages[1:]))
+
+
+def test_publish_copies_the_download_into_a_remote_store(workdir, monkeypatch):
+    remote = MemoryStore()
+    monkeypatch.setattr(storage, "store", remote)
+    os.makedirs("downloads", exist_ok=True)
+    with open("downloads/out.pdf", "wb") as f:
+        f.write(b"%PDF-1.4 output")
+
+    app = PublishMiddleware(_json_app({"success": True, "download_url": "/downloads/out.pdf"}))
+    status, payload = asyncio.run(_call(app))
+
+    assert status == 200 and payload["download_url"] == "/downloads/out.pdf"
+    assert remote.objects["out.pdf"] == b"%PDF-1.4 output"
+
+
+def test_publish_signs_urls_and_leaves_errors_alone(workdir, monkeypatch):
+    monkeypatch.setattr(storage, "store", LocalStore(str(workdir / "downloads")))
+    monkeypatch.setattr(storage, "SIGNING_KEY", "secret")
+
+    status, payload = asyncio.run(_call(PublishMiddleware(_json_app({"download_url": "/downloads/out.pdf"}))))
+    assert status == 200
+    assert storage.verify("out.pdf", payload["download_url"].partition("?token=")[2])
+
+    error = {"detail": "Bad input", "download_url": "/downloads/out.pdf"}
+    assert asyncio.run(_call(PublishMiddleware(_json_app(error, 400)))) == (400, error)
+
+
+def test_job_results_are_published_to_a_remote_store(workdir, monkeypatch):
+    remote = MemoryStore()
+    monkeypatch.setattr(storage, "store", remote)
+
+    async def app(scope, receive, send):
+        while (await receive()).get("more_body"):
+            pass
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"job output"})
+
+    async def scenario():
+        manager = JobManager(MemoryJobBackend(), workers=1)
+        await manager.start(app)
+        try:
+            job = manager.new_job("/api/pdf/echo")
+            with open(job.request_path, "wb") as f:
+                f.write(b"input")
+            await manager.submit(job)
+            while (await manager.get(job.id)).state not in jobs.FINISHED_STATES:
+                await asyncio.sleep(0.01)
+        finally:
+            await manager.stop()
+
+        assert (await manager.get(job.id)).state == jobs.SUCCEEDED
+        assert remote.objects[jobs.result_key(job)] == b"job output"
+        await manager.expire(now=time.time() + jobs.JOB_RESULT_TTL + 1)
+        assert jobs.result_key(job) not in remote.objects
+
+    asyncio.run(scenario())
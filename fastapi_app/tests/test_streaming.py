@@ -0,0 +1,39 @@
+import asyncio
+import os
+import time
+
+from core import executor
+from core.executor import io_bound
+from core.streaming import STREAM_OUTPUT, stream_tool
+
+
+@io_bound
+def _copy_slowly(input_path: str, output):
+    for _ in range(3):
+        with open(input_path, "rb") as source:
+            output.write(source.read())
+        output.flush()
+        time.sleep(0.02)
+
+
+def test_streamed_tool_output_closes_after_the_worker(workdir):
+    (workdir / "in.bin").write_bytes(b"chunk")
+    closed = []
+
+    def on_close():
+        # The worker reopened the input every time, so it must be done with it by now
+        closed.append(os.path.exists("in.bin"))
+        os.unlink("in.bin")
+
+    async def scenario():
+        response = await stream_tool(_copy_slowly, "in.bin", STREAM_OUTPUT, filename="out.bin", on_close=on_close)
+        assert not closed
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        await response.background()
+        return body
+
+    try:
+        assert asyncio.run(scenario()) == b"chunk" * 3
+    finally:
+        executor.shutdown()
+    assert closed == [True] and not os.path.exists("in.bin")
@@ -0,0 +1,123 @@
+import asyncio
+import os
+
+import pytest
+
+import database
+from core import usage
+from core.executor import io_bound
+from core.metrics import ToolRequest
+from core.usage import UsageWriter
+
+
+@pytest.fixture(autouse=True)
+def fresh_tool_ids(monkeypatch):
+    monkeypatch.setattr(usage, "_tool_ids", {})
+
+
+def _request(tool: str = "pdf_merge", status: int = 200) -> ToolRequest:
+    return ToolRequest(tool, status, duration=0.25, input_bytes=2 * 1024 * 1024, output_bytes=1024)
+
+
+def _writer(workdir, **options) -> UsageWriter:
+    options = {"batch_size": 3, "flush_interval": 0.02, "spill_path": str(workdir / "spill.jsonl"), **options}
+    return UsageWriter(**options)
+
+
+async def _until(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+def _rows():
+    db = database.SessionLocal()
+    try:
+        query = (db.query(database.Tool.slug, database.ToolUsage.success, database.ToolUsage.file_size)
+                 .select_from(database.ToolUsage).join(database.Tool, database.ToolUsage.tool_id == database.Tool.id))
+        return [tuple(row) for row in query]
+    finally:
+        db.close()
+
+
+def test_events_are_inserted_in_batches(workdir, sqlite_url):
+    writer = _writer(workdir)
+
+    async def scenario():
+        await writer.start()
+        try:
+            for index in range(7):
+                writer.record(_request("pdf_merge" if index % 2 else "image_resize", 200 if index else 500))
+            await _until(lambda: writer.inserted == 7)
+        finally:
+            await writer.stop()
+
+    asyncio.run(scenario())
+
+    assert writer.batches >= 3 and writer.failures == 0
+    rows = _rows()
+    assert len(rows) == 7
+    assert sorted({slug for slug, _, _ in rows}) == ["image_resize", "pdf_merge"]
+    assert [success for _, success, _ in rows].count(False) == 1
+    assert all(size == 2.0 for _, _, size in rows)
+
+
+def test_nothing_is_recorded_without_a_database(workdir, monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setattr(database, "_engine", None)
+    writer = _writer(workdir)
+
+    async def scenario():
+        await writer.start()
+        writer.record(_request())
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert not writer.enabled and writer.recorded == 0
+
+
+def test_overflow_is_dropped_when_asked(workdir):
+    writer = _writer(workdir, batch_size=100, max_queued=2, overflow=usage.DROP)
+
+    async def scenario():
+        # Recording without the background task: events only pile up
+        writer.enabled, writer._wakeup = True, asyncio.Event()
+        for _ in range(5):
+            writer.record(_request())
+
+    asyncio.run(scenario())
+    assert writer.stats()["queued"] == 2 and writer.dropped == 3
+    assert not os.path.exists(writer.spill_path)
+
+
+def test_failed_batches_are_spilled_and_replayed(workdir, sqlite_url, monkeypatch):
+    @io_bound
+    def unavailable(events):
+        raise OSError("database unavailable")
+
+    insert_batch = usage._insert_batch
+    monkeypatch.setattr(usage, "_insert_batch", unavailable)
+    writer = _writer(workdir, batch_size=2)
+
+    async def scenario():
+        await writer.start()
+        try:
+            for _ in range(4):
+                writer.record(_request())
+            await _until(lambda: writer.spilled == 4 and not writer._spill_tasks)
+            assert writer.inserted == 0 and os.path.exists(writer.spill_path)
+
+            # The database is back: the next flush replays the spill file
+            monkeypatch.setattr(usage, "_insert_batch", insert_batch)
+            writer.record(_request("image_resize"))
+            await _until(lambda: writer.inserted == 5)
+        finally:
+            await writer.stop()
+
+    asyncio.run(scenario())
+
+    assert writer.replayed == 4 and writer.failures >= 2
+    assert not os.path.exists(writer.spill_path)
+    assert len(_rows()) == 5